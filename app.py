@@ -1,4 +1,5 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, session
+import io
 import os
 import json
 import uuid
@@ -7,16 +8,37 @@ import re
 import logging
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from utils.pdf_generator import generate_pdf
-from utils.pdf_preview import generate_pdf_preview
+from werkzeug.exceptions import HTTPException
+from utils.pdf_generator import generate_pdf, render_offer_bytes, get_offer_pdf_path, offer_page_layout, PRODUCT_IMAGE_BOX
+from utils.image_pipeline import prepare_image
+from utils.upload_staging import STAGING_FOLDER, stage_upload, save_upload
+from utils import pdf_cache, text_layout, preview_cache
 from auth import init_auth, login_required
 from utils.format_utils import format_price
+from models.offerta import Offerta
+from models.offer_schema import OFFER_SCHEMA_VERSION, upgrade_offer, upgrade_folder
+from models.store import OfferStore, STORE_FILENAME
+from models.catalog import OfferCatalog
+from models.offer_index import OfferIndex
+from models.aggregates import OfferTotals, GROUP_BY
+from models.pdf_queue import PdfJobQueue
+from models.preview_sweeper import PreviewSweeper
 
 app = Flask(__name__)
 app.secret_key = 'valtservice_secret_key'  # Assicurati sia una stringa sicura in produzione
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
 app.config['DATA_FOLDER'] = os.path.join(app.root_path, 'data')
+app.config['STAGING_FOLDER'] = os.path.join(app.config['DATA_FOLDER'], STAGING_FOLDER)
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+app.config['OFFERS_PER_PAGE'] = 20
+app.config['API_MAX_PAGE_SIZE'] = 100
+app.config['SEARCH_MAX_RESULTS'] = 100
+app.config['PDF_WORKERS'] = 2
+app.config['PDF_IMMUTABLE_MAX_AGE'] = 365 * 24 * 3600
+app.config['PREVIEW_MAX_AGE'] = 3600
+app.config['PREVIEW_SWEEP_INTERVAL'] = 300
+app.config['PREVIEW_QUOTA_BYTES'] = 64 * 1024 * 1024
+app.config['PREVIEW_SESSION_QUOTA_BYTES'] = 16 * 1024 * 1024
 
 # Inizializza l'autenticazione
 app = init_auth(app)
@@ -25,6 +47,30 @@ app = init_auth(app)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['DATA_FOLDER'], exist_ok=True)
 
+# Archivio SQLite delle offerte (migrazione una tantum dai file dati_offerta.json)
+store = OfferStore(os.path.join(app.config['DATA_FOLDER'], STORE_FILENAME))
+
+# Aggiornamento una tantum dei dati_offerta.json all'ultimo schema: da qui in poi
+# i lettori si fidano dei campi salvati (stato, schede, totali)
+if store.get_meta('offer_schema_version') != str(OFFER_SCHEMA_VERSION):
+    upgraded_offers = upgrade_folder(app.config['DATA_FOLDER'])
+    if store.is_migrated():
+        store.save_offers(upgraded_offers)
+    store.set_meta('offer_schema_version', OFFER_SCHEMA_VERSION)
+
+if not store.is_migrated():
+    store.migrate_from_json(app.config['DATA_FOLDER'])
+
+# Indice hash ID -> posizione dell'offerta (persistito in offerte_index.json)
+offer_index = OfferIndex(app.config['DATA_FOLDER'])
+
+# Catalogo in memoria delle offerte, aggiornato in scrittura dalle route; le
+# modifiche fatte a mano nella cartella dati aggiornano anche archivio e indice
+catalog = OfferCatalog(store, app.config['DATA_FOLDER'], index=offer_index)
+
+# Colonne dei totali per le aggregazioni per mese/cliente/stato
+offer_totals = OfferTotals(store)
+
 def allowed_file(filename):
     """Controlla se l'estensione del file è consentita"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -38,174 +84,164 @@ def inject_now():
 def utility_processor():
     return dict(format_price=format_price)
 
+@app.context_processor
+def inject_status_counts():
+    """Inietta nei template i conteggi per stato (solo per utenti autenticati)"""
+    if not session.get('logged_in'):
+        return {}
+    try:
+        return {'status_counts': store.status_counts()}
+    except Exception as e:
+        logging.info(f"Errore nel caricamento dei conteggi per stato: {str(e)}")
+        return {}
+
 def get_next_offer_number():
     """Genera il prossimo numero di offerta nel formato YYYY-XXXX"""
-    counter_file = os.path.join(app.config['DATA_FOLDER'], "counter.json")
-    
-    # Inizializza il contatore se non esiste
-    if not os.path.exists(counter_file):
-        current_year = str(datetime.now().year)
-        counter = {current_year: 0}
-        with open(counter_file, 'w') as f:
-            json.dump(counter, f)
-    
-    # Carica il contatore
-    with open(counter_file, 'r') as f:
-        counter = json.load(f)
-    
-    current_year = str(datetime.now().year)
-    if current_year not in counter:
-        counter[current_year] = 0
-    
-    counter[current_year] += 1
-    
-    # Salva il contatore aggiornato
-    with open(counter_file, 'w') as f:
-        json.dump(counter, f)
-    
-    return f"{current_year}-{counter[current_year]:04d}"
+    return store.next_offer_number()
+
+def save_offerta_json(data, json_path):
+    """Scrive dati_offerta.json e aggiorna l'offerta nell'archivio"""
+    # Totali calcolati una volta al salvataggio, con le regole del PDF
+    data['totals'] = Offerta(tabs=data['tabs']).get_totals()
+    data['schema_version'] = OFFER_SCHEMA_VERSION
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    store.save_offer(data)
+    catalog.put(data, json_path)
 
 def update_offerte_index(data, data_folder):
     """Aggiorna il file di indice delle offerte"""
     try:
-        index_file = os.path.join(data_folder, "offerte_index.json")
-        
-        # Carica l'indice esistente
-        if os.path.exists(index_file):
-            with open(index_file, 'r', encoding='utf-8') as f:
-                index = json.load(f)
-        else:
-            index = []
-        
-        # Verifica se l'offerta è già presente nell'indice
-        for i, entry in enumerate(index):
-            if entry.get('id') == data['id']:
-                # Aggiorna la voce esistente
-                index[i] = {
-                    'id': data['id'],
-                    'offer_number': data['offer_number'],
-                    'date': data['date'],
-                    'customer': data['customer'],
-                    'customer_email': data['customer_email'],
-                    'description': data['offer_description'][:100] + '...' if len(data['offer_description']) > 100 else data['offer_description']
-                }
-                break
-        else:
-            # Aggiungi una nuova voce
-            index.append({
-                'id': data['id'],
-                'offer_number': data['offer_number'],
-                'date': data['date'],
-                'customer': data['customer'],
-                'customer_email': data['customer_email'],
-                'description': data['offer_description'][:100] + '...' if len(data['offer_description']) > 100 else data['offer_description']
-            })
-        
-        # Salva l'indice aggiornato
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, indent=4, ensure_ascii=False)
-        
+        offer_index.upsert(data)
     except Exception as e:
         logging.info(f"ERRORE nell'aggiornamento dell'indice: {e}")
 
 def get_offerta_direct(offerta_id, data_folder):
-    """Ottiene direttamente un'offerta dal file JSON usando l'ID"""
+    """Ottiene direttamente un'offerta dal catalogo o, se assente, dal file JSON usando l'ID"""
     try:
-        # Carica l'indice
-        index_file = os.path.join(data_folder, "offerte_index.json")
-        if not os.path.exists(index_file):
-            logging.info(f"ERRORE: File indice non trovato: {index_file}")
+        data = catalog.get(offerta_id)
+        if data is not None:
+            return data
+        
+        # Trova l'offerta nell'indice
+        location = offer_index.lookup(offerta_id)
+        if location is None:
+            logging.info(f"ERRORE: Offerta con ID {offerta_id} non trovata nell'indice")
+            return None
+        
+        _, _, json_path = location
+        if not os.path.exists(json_path):
+            logging.info(f"ERRORE: File JSON non trovato: {json_path}")
             return None
             
-        with open(index_file, 'r', encoding='utf-8') as f:
-            index = json.load(f)
+        # Carica i dati completi
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
             
-        # Trova l'offerta nell'indice
-        for entry in index:
-            if entry.get('id') == offerta_id:
-                # Costruisci il percorso del file JSON
-                customer_folder = os.path.join(data_folder, entry['customer'].upper())
-                offer_folder = os.path.join(customer_folder, entry['offer_number'])
-                json_path = os.path.join(offer_folder, "dati_offerta.json")
-                
-                if not os.path.exists(json_path):
-                    logging.info(f"ERRORE: File JSON non trovato: {json_path}")
-                    return None
-                    
-                # Carica i dati completi
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                # Assicurati che tabs esista
-                if 'tabs' not in data or not isinstance(data['tabs'], list):
-                    data['tabs'] = []
-                    
-                return data
-                
-        logging.info(f"ERRORE: Offerta con ID {offerta_id} non trovata nell'indice")
-        return None
+        # Offerta presente su disco ma non ancora nel catalogo (può essere in un formato vecchio)
+        upgrade_offer(data)
+        store.save_offer(data)
+        catalog.put(data, json_path)
+            
+        return data
         
     except Exception as e:
         logging.info(f"ERRORE in get_offerta_direct: {e}")
         return None
 
-def get_all_offerte():
-    """Restituisce tutte le offerte dalla repository data"""
-    offers = []  # Inizializza offers come lista vuota
-    data_folder = app.config['DATA_FOLDER']
-    
-    try:
-        # Scansiona tutte le cartelle dei clienti
-        for customer_folder in os.listdir(data_folder):
-            # Salta i file e considera solo le directory
-            customer_path = os.path.join(data_folder, customer_folder)
-            if not os.path.isdir(customer_path) or customer_folder in ["__pycache__"]:
-                continue
-                
-            # Scansiona tutte le cartelle delle offerte
-            for offer_folder in os.listdir(customer_path):
-                offer_path = os.path.join(customer_path, offer_folder)
-                if os.path.isdir(offer_path):
-                    json_path = os.path.join(offer_path, "dati_offerta.json")
-                    if os.path.exists(json_path):
-                        try:
-                            with open(json_path, 'r', encoding='utf-8') as f:
-                                offer_data = json.load(f)
-                                # Migra gli stati vecchi al nuovo formato
-                                if 'status' not in offer_data:
-                                    offer_data['status'] = 'in_attesa'
-                                elif offer_data['status'] == 'pending':
-                                    offer_data['status'] = 'in_attesa'
-                                elif offer_data['status'] == 'accepted':
-                                    offer_data['status'] = 'accettata'
-                                offers.append(offer_data)
-                        except Exception as e:
-                            logging.info(f"Errore nel caricamento dell'offerta {offer_folder}: {str(e)}")
-                            continue
-        
-        # Ordina le offerte per numero d'offerta (più recenti prima)
-        # Solo se la lista non è vuota
-        if offers:
-            def sort_key(offer):
-                offer_number = offer.get('offer_number', '')
-                try:
-                    if '-' in offer_number:
-                        year, number = offer_number.split('-')
-                        return (year, int(number))
-                    return offer_number
-                except:
-                    return offer_number
+def render_offer_pdf(offerta_id):
+    """Genera il PDF di un'offerta (eseguita dai worker della coda PDF)"""
+    data = get_offerta_direct(offerta_id, app.config['DATA_FOLDER'])
+    if not data:
+        raise ValueError("Offerta non trovata")
+    # Saltata se il PDF esistente corrisponde già ai dati (cache per impronta)
+    generate_pdf(data, app.root_path)
 
-            offers.sort(key=sort_key, reverse=True)
-        
-        return offers
+# Coda persistente della generazione PDF: le route accodano e rispondono subito
+pdf_queue = PdfJobQueue(store, render_offer_pdf, workers=app.config['PDF_WORKERS'])
+
+# Pulizia in background dell'area anteprime (memoria, immagini in staging e
+# vecchia cartella data/_previews)
+preview_sweeper = PreviewSweeper(
+    [app.config['STAGING_FOLDER'], os.path.join(app.config['DATA_FOLDER'], '_previews')],
+    interval=app.config['PREVIEW_SWEEP_INTERVAL'],
+    max_age=app.config['PREVIEW_MAX_AGE'],
+    quota_bytes=app.config['PREVIEW_QUOTA_BYTES'],
+    session_quota_bytes=app.config['PREVIEW_SESSION_QUOTA_BYTES'],
+)
+
+def start_background_workers():
+    """
+    Avvia i worker della coda PDF e la pulizia delle anteprime
+
+    Da chiamare all'avvio del server (wsgi.py, __main__), non all'import del
+    modulo: chi importa app (strumenti, test) non avvia thread che scrivono in data/.
+    """
+    pdf_queue.start()
+    preview_sweeper.start()
+
+def get_offerte_page(args, status=None, limit=None):
+    """
+    Restituisce una pagina di riepiloghi per le pagine elenco e per l'API
+
+    La posizione arriva dai parametri after/after_id (offerte meno recenti) o
+    before/before_id (offerte più recenti), dove after/before è un numero offerta.
+    Con il parametro q la pagina contiene invece i risultati della ricerca,
+    ordinati per rilevanza.
+
+    Returns:
+        dict: offerte della pagina e parametri per i link alla pagina precedente/successiva
+    """
+    limit = limit or app.config['OFFERS_PER_PAGE']
+    query = (args.get('q') or '').strip()
+    if query:
+        try:
+            catalog.refresh()
+            offers = store.search(query, status=status, limit=app.config['SEARCH_MAX_RESULTS'])
+        except Exception as e:
+            logging.info(f"Errore nella ricerca delle offerte: {str(e)}")
+            offers = []
+        return {'offers': offers, 'query': query, 'has_next': False, 'has_prev': False,
+                'next_args': {}, 'prev_args': {}}
+
+    after = (args['after'], args.get('after_id')) if args.get('after') else None
+    before = (args['before'], args.get('before_id')) if args.get('before') and not after else None
+
+    try:
+        catalog.refresh()
+        offers, has_more = store.list_summaries_page(status=status, after=after,
+                                                     before=before, limit=limit)
     except Exception as e:
-        logging.info(f"Errore nel caricamento delle offerte: {str(e)}")
-        return []  # Restituisci una lista vuota invece di None
+        logging.info(f"Errore nel caricamento della pagina di offerte: {str(e)}")
+        offers, has_more = [], False
 
-def process_form_final(form, files):
+    page = {
+        'offers': offers,
+        'query': '',
+        'has_next': has_more if not before else True,
+        'has_prev': has_more if before else after is not None,
+        'next_args': {},
+        'prev_args': {},
+    }
+    if offers:
+        page['next_args'] = {'after': offers[-1]['offer_number'], 'after_id': offers[-1]['id']}
+        page['prev_args'] = {'before': offers[0]['offer_number'], 'before_id': offers[0]['id']}
+    else:
+        # Pagina vuota (cursore oltre la fine): si torna all'inizio
+        page['has_next'] = False
+    return page
+
+def process_form_final(form, files, preview=False, tab_positions=None):
     """
     Versione semplificata e robusta della funzione di processo dei form
+    
+    Con preview=True le immagini caricate finiscono nello staging della sessione
+    (data/_staging) e non in static/uploads: diventano definitive solo al
+    salvataggio dell'offerta.
+    
+    Se tab_positions è un dict viene riempito con indice della scheda nel modulo
+    (tab_N) -> posizione nella lista restituita: le schede incomplete vengono
+    saltate, quindi le due numerazioni possono differire.
     """
     import logging
     import re
@@ -326,11 +362,21 @@ def process_form_final(form, files):
 
             if product_image_key and files[product_image_key] and files[product_image_key].filename and allowed_file(files[product_image_key].filename):
                 product_image = files[product_image_key]
-                filename = secure_filename(f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{product_image.filename}")
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                product_image.save(file_path)
-                image_path = '/static/uploads/' + filename
-                logging.info(f"Salvata nuova immagine in {image_path} per tab {idx}")
+                if preview:
+                    file_path = stage_upload(product_image, app.config['STAGING_FOLDER'], preview_session_id())
+                    image_path = file_path
+                else:
+                    filename = secure_filename(f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{product_image.filename}")
+                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                    save_upload(product_image, file_path, app.config['STAGING_FOLDER'], session.get('preview_session'))
+                    image_path = '/static/uploads/' + filename
+                    logging.info(f"Salvata nuova immagine in {image_path} per tab {idx}")
+                
+                # Variante di stampa creata subito, così il PDF non decodifica l'originale
+                try:
+                    prepare_image(file_path, *PRODUCT_IMAGE_BOX)
+                except Exception as e:
+                    logging.info(f"Variante di stampa non creata per {image_path}: {e}")
 
             logging.info(f"Valore finale di image_path per tab {idx}: {image_path}")
             
@@ -365,6 +411,8 @@ def process_form_final(form, files):
                 }
                 
                 logging.info(f"Aggiunto prodotto singolo: {product_name}")
+                if tab_positions is not None:
+                    tab_positions[idx] = len(tabs)
                 tabs.append(single_product_tab)
             else:
                 logging.warning(f"Saltato prodotto singolo per tab {idx} - nome prodotto mancante")
@@ -407,6 +455,8 @@ def process_form_final(form, files):
             }
             
             logging.info(f"Aggiunta scheda multiprodotto con {len(products)} prodotti")
+            if tab_positions is not None:
+                tab_positions[idx] = len(tabs)
             tabs.append(multi_product_tab)
     
     # Se non abbiamo trovato nessuna scheda, proviamo un approccio diverso
@@ -492,28 +542,10 @@ def get_form_value(form, possible_keys, default=''):
 @app.route('/')
 @login_required
 def index():
-    try:
-        # Carica tutte le offerte dalla repository
-        offers = get_all_offerte()
-        
-        # Assicurati che offers non sia None
-        if offers is None:
-            offers = []
-        
-        # Dividi le offerte per stato
-        pending_offers = [offer for offer in offers if offer.get('status', 'in_attesa') == 'in_attesa']
-        accepted_offers = [offer for offer in offers if offer.get('status', 'in_attesa') == 'accettata']
-        
-        return render_template('index.html', 
-                            all_offers=offers,
-                            pending_offers=pending_offers,
-                            accepted_offers=accepted_offers)
-    except Exception as e:
-        flash(f'Errore durante il caricamento delle offerte: {str(e)}', 'error')
-        return render_template('index.html', 
-                            all_offers=[],
-                            pending_offers=[],
-                            accepted_offers=[])
+    page = get_offerte_page(request.args)
+    return render_template('index.html', 
+                        all_offers=page['offers'],
+                        page=page)
 
 @app.route('/nuova-offerta', methods=['GET', 'POST'])
 @login_required
@@ -543,6 +575,9 @@ def nuova_offerta():
             
             logging.info(f"DEBUG - Dati offerta preparati - {len(data['tabs'])} tabs")
             
+            # Percorso del PDF, generato in background dalla coda
+            data['pdf_path'] = os.path.basename(get_offer_pdf_path(data, app.root_path))
+            
             # Salva direttamente i dati in un file JSON
             customer_folder = os.path.join(app.config['DATA_FOLDER'], data['customer'].upper())
             offer_folder = os.path.join(customer_folder, data['offer_number'])
@@ -552,21 +587,15 @@ def nuova_offerta():
             
             logging.info(f"DEBUG - Salvataggio JSON in: {json_path}")
             
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            save_offerta_json(data, json_path)
             
             logging.info(f"DEBUG - JSON salvato con successo")
             
             # Aggiorna indice offerte
             update_offerte_index(data, app.config['DATA_FOLDER'])
             
-            # Genera il PDF
-            pdf_path = generate_pdf(data, app.root_path)
-            
-            # Aggiorna il percorso del PDF
-            data['pdf_path'] = os.path.basename(pdf_path)
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            # Accoda la generazione del PDF
+            pdf_queue.enqueue(data['id'])
             
             flash('Offerta creata con successo!', 'success alert-permanent')
             return redirect(url_for('view_offerta', offerta_id=data['id']))
@@ -645,14 +674,14 @@ def edit_offerta(offerta_id):
                 'offer_description': request.form.get('offer_description'),
                 'offer_number': request.form.get('offer_number'),
                 'id': offerta_id,  # Mantieni l'ID originale
-                'tabs': process_form_final(request.form, request.files)
+                'tabs': process_form_final(request.form, request.files),
+                'status': original_offerta['status']
             }
             
             logging.info(f"DEBUG - Dati offerta preparati per modifica - {len(data['tabs'])} tabs")
             
-            # Mantieni il percorso PDF esistente
-            if original_offerta and 'pdf_path' in original_offerta:
-                data['pdf_path'] = original_offerta['pdf_path']
+            # Percorso del PDF, rigenerato in background dalla coda
+            data['pdf_path'] = os.path.basename(get_offer_pdf_path(data, app.root_path))
             
             # Gestisci il caso in cui il cliente o il numero offerta sono cambiati
             old_customer = original_offerta.get('customer', '').upper()
@@ -670,8 +699,7 @@ def edit_offerta(offerta_id):
             
             # Salva i dati aggiornati
             json_path = os.path.join(new_folder, "dati_offerta.json")
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            save_offerta_json(data, json_path)
             
             # Se la posizione è cambiata, copia i file necessari
             if old_folder != new_folder and os.path.exists(old_folder):
@@ -694,13 +722,8 @@ def edit_offerta(offerta_id):
             # Aggiorna l'indice
             update_offerte_index(data, app.config['DATA_FOLDER'])
             
-            # Rigenera il PDF
-            pdf_path = generate_pdf(data, app.root_path)
-            data['pdf_path'] = os.path.basename(pdf_path)
-            
-            # Salva di nuovo con il percorso PDF aggiornato
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            # Accoda la rigenerazione del PDF
+            pdf_queue.enqueue(offerta_id)
             
             flash('Offerta aggiornata con successo!', 'success')
             return redirect(url_for('view_offerta', offerta_id=offerta_id))
@@ -717,18 +740,98 @@ def edit_offerta(offerta_id):
 def download_pdf(offerta_id):
     try:
         offerta = get_offerta_direct(offerta_id, app.config['DATA_FOLDER'])
-        if not offerta or not offerta.get('pdf_path'):
+        if not offerta:
             flash('PDF non trovato', 'danger')
             return redirect(url_for('view_offerta', offerta_id=offerta_id))
         
-        pdf_path = os.path.join(app.config['DATA_FOLDER'], offerta['customer'].upper(), 
-                               offerta['offer_number'], offerta['pdf_path'])
+        job = pdf_queue.status(offerta_id)
+        if job and job['status'] in ('queued', 'running'):
+            flash('Il PDF è in preparazione, riprova tra qualche secondo', 'info')
+            return redirect(url_for('view_offerta', offerta_id=offerta_id))
+        
+        pdf_path = get_offer_pdf_path(offerta, app.root_path)
+        if not os.path.exists(pdf_path):
+            if job and job['status'] == 'failed':
+                flash(f"Generazione del PDF non riuscita: {job['error']}", 'danger')
+            else:
+                # PDF mai generato (o rimosso): lo accoda ora
+                pdf_queue.enqueue(offerta_id)
+                flash('Il PDF è in preparazione, riprova tra qualche secondo', 'info')
+            return redirect(url_for('view_offerta', offerta_id=offerta_id))
         
-        return send_file(pdf_path, as_attachment=True)
+        return send_offer_pdf(pdf_path)
+    except HTTPException:
+        raise
     except Exception as e:
         flash(f'Errore nel download del PDF: {str(e)}', 'danger')
         return redirect(url_for('view_offerta', offerta_id=offerta_id))
 
+@app.route('/offerta/<offerta_id>/pdf/<digest>')
+@login_required
+def download_pdf_version(offerta_id, digest):
+    """
+    PDF a indirizzo versionato (hash del contenuto): il browser lo tiene in cache
+    senza riconvalidarlo; una versione superata rimanda al download normale
+    """
+    offerta = get_offerta_direct(offerta_id, app.config['DATA_FOLDER'])
+    if offerta:
+        pdf_path = get_offer_pdf_path(offerta, app.root_path)
+        job = pdf_queue.status(offerta_id)
+        pending = job and job['status'] in ('queued', 'running')
+        if not pending and os.path.exists(pdf_path) and pdf_cache.content_hash(pdf_path) == digest:
+            return send_offer_pdf(pdf_path, immutable=True)
+    return redirect(url_for('download_pdf', offerta_id=offerta_id))
+
+def send_offer_pdf(pdf_path, immutable=False):
+    """
+    Invia il PDF con ETag (hash del contenuto) e Last-Modified
+
+    send_file risponde 304 alle richieste condizionali e gestisce le richieste
+    Range dei visualizzatori PDF del browser.
+
+    Args:
+        pdf_path (str): Percorso del PDF
+        immutable (bool): True per gli URL versionati, che non cambiano mai
+            contenuto; altrimenti il browser riconvalida a ogni richiesta
+    """
+    response = send_file(pdf_path, as_attachment=True, etag=pdf_cache.content_hash(pdf_path),
+                         conditional=True)
+    # Contenuto riservato (login): mai nelle cache condivise
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = app.config['PDF_IMMUTABLE_MAX_AGE']
+        response.cache_control.immutable = True
+    return response
+
+def pdf_download_url(offerta):
+    """URL versionato del PDF se è pronto, altrimenti quello del download normale"""
+    pdf_path = get_offer_pdf_path(offerta, app.root_path)
+    try:
+        digest = pdf_cache.content_hash(pdf_path)
+    except OSError:
+        return url_for('download_pdf', offerta_id=offerta['id'])
+    return url_for('download_pdf_version', offerta_id=offerta['id'], digest=digest)
+
+@app.route('/offerta/<offerta_id>/pdf/stato', methods=['GET'])
+@login_required
+def pdf_status(offerta_id):
+    """Stato della generazione del PDF, interrogato da vista_offerta.html"""
+    offerta = get_offerta_direct(offerta_id, app.config['DATA_FOLDER'])
+    if not offerta:
+        return jsonify({'error': 'Offerta non trovata'}), 404
+    
+    job = pdf_queue.status(offerta_id)
+    if job:
+        status = job['status']
+    else:
+        status = 'done' if os.path.exists(get_offer_pdf_path(offerta, app.root_path)) else 'missing'
+    return jsonify({
+        'status': status,
+        'error': job['error'] if job else None,
+        'download_url': pdf_download_url(offerta) if status == 'done' else url_for('download_pdf', offerta_id=offerta_id)
+    })
+
 @app.route('/offerta/<offerta_id>/elimina', methods=['POST'])
 @login_required
 def delete_offerta(offerta_id):
@@ -741,15 +844,11 @@ def delete_offerta(offerta_id):
             return redirect(url_for('index'))
         
         # Rimuovi dall'indice
-        index_file = os.path.join(app.config['DATA_FOLDER'], "offerte_index.json")
-        if os.path.exists(index_file):
-            with open(index_file, 'r', encoding='utf-8') as f:
-                index = json.load(f)
-            
-            index = [entry for entry in index if entry.get('id') != offerta_id]
-            
-            with open(index_file, 'w', encoding='utf-8') as f:
-                json.dump(index, f, indent=4, ensure_ascii=False)
+        offer_index.remove(offerta_id)
+        
+        # Rimuovi dall'archivio e dal catalogo
+        store.delete_offer(offerta_id)
+        catalog.remove(offerta_id)
         
         # Rimuovi i file
         customer_folder = os.path.join(app.config['DATA_FOLDER'], offerta['customer'].upper())
@@ -778,6 +877,59 @@ def api_next_offer_number():
     next_number = get_next_offer_number()
     return jsonify({'next_number': next_number})
 
+@app.route('/api/offerte', methods=['GET'])
+@login_required
+def api_offerte():
+    """Elenco paginato (keyset) dei riepiloghi: ?after=<numero offerta>&after_id=&limit=&status=&q="""
+    try:
+        limit = int(request.args.get('limit', app.config['OFFERS_PER_PAGE']))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Parametro limit non valido'}), 400
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+    status = request.args.get('status') or None
+    if status not in (None, 'in_attesa', 'accettata'):
+        return jsonify({'success': False, 'error': 'Stato non valido'}), 400
+
+    page = get_offerte_page(request.args, status=status, limit=limit)
+    return jsonify({
+        'success': True,
+        'offers': page['offers'],
+        'has_more': page['has_next'],
+        'next': page['next_args'] if page['has_next'] else None,
+    })
+
+@app.route('/api/offerte/conteggi', methods=['GET'])
+@login_required
+def api_offerte_conteggi():
+    """Numero di offerte e valore totale per stato"""
+    catalog.refresh()
+    return jsonify({'success': True, 'counts': store.status_counts()})
+
+@app.route('/api/offerte/totali', methods=['GET'])
+@login_required
+def api_offerte_totali():
+    """Totali delle offerte raggruppati: ?by=month|customer|status&status=&year="""
+    by = request.args.get('by', 'month')
+    if by not in GROUP_BY:
+        return jsonify({'success': False, 'error': f"Parametro by non valido (valori ammessi: {', '.join(GROUP_BY)})"}), 400
+    catalog.refresh()
+    groups = offer_totals.aggregate(by, status=request.args.get('status') or None,
+                                    year=request.args.get('year') or None)
+    return jsonify({
+        'success': True,
+        'by': by,
+        'groups': groups,
+        'count': sum(group['count'] for group in groups),
+        'total': round(sum(group['total'] for group in groups), 2),
+    })
+
+@app.route('/api/pdf/cache', methods=['GET'])
+@login_required
+def api_pdf_cache():
+    """Riscontri e mancati delle cache dei PDF, dei frammenti, dell'impaginazione e delle anteprime"""
+    return jsonify(dict(pdf_cache.stats(), layouts=text_layout.stats(), previews=preview_cache.stats()))
+
 @app.route('/update_offer_status/<offer_id>', methods=['POST'])
 @login_required
 def update_offer_status(offer_id):
@@ -808,8 +960,7 @@ def update_offer_status(offer_id):
         os.makedirs(offer_folder, exist_ok=True)
         
         json_path = os.path.join(offer_folder, "dati_offerta.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(offerta_data, f, indent=4, ensure_ascii=False)
+        save_offerta_json(offerta_data, json_path)
         
         # Aggiorna l'indice
         update_offerte_index(offerta_data, app.config['DATA_FOLDER'])
@@ -830,10 +981,6 @@ def save_offerta(offerta_id):
         if not offerta_data:
             return jsonify({'success': False, 'error': 'Offerta non trovata'}), 404
         
-        # Assicurati che l'offerta abbia uno stato
-        if 'status' not in offerta_data:
-            offerta_data['status'] = 'pending'
-        
         # Aggiorna l'indice delle offerte
         update_offerte_index(offerta_data, app.config['DATA_FOLDER'])
         
@@ -843,8 +990,7 @@ def save_offerta(offerta_id):
         os.makedirs(offer_folder, exist_ok=True)
         
         json_path = os.path.join(offer_folder, "dati_offerta.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(offerta_data, f, indent=4, ensure_ascii=False)
+        save_offerta_json(offerta_data, json_path)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -854,43 +1000,48 @@ def save_offerta(offerta_id):
 @app.route('/offerte-in-attesa')
 @login_required
 def offerte_in_attesa():
-    offers = get_all_offerte()
-    pending_offers = [offer for offer in offers if offer.get('status') == 'in_attesa']
+    page = get_offerte_page(request.args, status='in_attesa')
     return render_template('filtered_offers.html', 
+                         status='in_attesa',
                          title='Offerte in Attesa',
                          icon='fa-clock',
-                         offers=pending_offers)
+                         offers=page['offers'],
+                         page=page)
 
 @app.route('/offerte-accettate')
 @login_required
 def offerte_accettate():
-    offers = get_all_offerte()
-    accepted_offers = [offer for offer in offers if offer.get('status') == 'accettata']
+    page = get_offerte_page(request.args, status='accettata')
     return render_template('filtered_offers.html',
+                         status='accettata',
                          title='Offerte Accettate',
                          icon='fa-check-circle',
-                         offers=accepted_offers)
+                         offers=page['offers'],
+                         page=page)
 
 @app.route('/preview_pdf', methods=['POST'])
 @login_required
 def preview_pdf():
     """Generates a temporary PDF preview based on current form data"""
     try:
-        # Create a temporary folder for previews if it doesn't exist
-        preview_folder = os.path.join(app.config['DATA_FOLDER'], '_previews')
-        os.makedirs(preview_folder, exist_ok=True)
-        
-        # Clean up old preview files (older than 1 hour)
-        current_time = datetime.now().timestamp()
-        for filename in os.listdir(preview_folder):
-            file_path = os.path.join(preview_folder, filename)
-            if os.path.isfile(file_path) and (current_time - os.path.getmtime(file_path)) > 3600:
-                os.remove(file_path)
+        # Modulo identico all'ultima anteprima (aggiornamento automatico senza
+        # modifiche): nessuna nuova impaginazione, il client tiene l'iframe
+        fingerprint = preview_cache.form_fingerprint(request.form, request.files)
+        token = preview_cache.find_preview(preview_session_id(), preview_page_id(), fingerprint)
+        if token:
+            return jsonify({
+                'success': True,
+                'unchanged': True,
+                'preview_url': url_for('serve_preview', token=token)
+            })
         
         # Process form data like in the regular form submission
         form_data = request.form.to_dict()
         files_data = request.files.to_dict()
         
+        # Indice della scheda nel modulo -> posizione in tabs (anteprima parziale)
+        tab_positions = {}
+        
         # Create temporary data for PDF generation
         temp_data = {
             'date': form_data.get('date', datetime.now().strftime('%Y-%m-%d')),
@@ -900,22 +1051,23 @@ def preview_pdf():
             'offer_description': form_data.get('offer_description', 'Descrizione Temporanea'),
             'offer_number': form_data.get('offer_number', 'TEMP-0001'),
             'id': 'preview-' + str(uuid.uuid4()),
-            'tabs': process_form_final(form_data, files_data),
-            'status': 'pending'
+            'tabs': process_form_final(form_data, files_data, preview=True, tab_positions=tab_positions),
+            'status': 'in_attesa'
         }
         
-        # Generate a unique filename for this preview
-        preview_filename = f"preview_{uuid.uuid4()}.pdf"
-        preview_path = os.path.join(preview_folder, preview_filename)
+        # Anteprima parziale (solo la scheda o le pagine in modifica) se richiesta
+        total = Offerta(tabs=temp_data['tabs']).get_totals()['total_offer_price']
+        pages = preview_page_selection(form_data, temp_data['tabs'], tab_positions,
+                                       total != preview_cache.last_total(preview_session_id(), preview_page_id()))
         
-        # Generate the PDF directly to the preview location
-        from utils.pdf_generator import generate_pdf_preview
-        generate_pdf_preview(temp_data, app.root_path, preview_path)
+        # Anteprima impaginata in memoria: nessun file su disco
+        pdf_data = render_offer_bytes(temp_data, app.root_path, pages=pages)
+        token = preview_cache.store_preview(preview_session_id(), preview_page_id(), pdf_data, fingerprint, total)
         
-        # Return the URL to the preview PDF
         return jsonify({
             'success': True,
-            'preview_url': url_for('serve_preview', filename=preview_filename)
+            'preview_url': url_for('serve_preview', token=token),
+            'pages': sorted(pages) if pages else None
         })
         
     except Exception as e:
@@ -927,12 +1079,69 @@ def preview_pdf():
             'error': str(e)
         }), 500
 
-@app.route('/preview/<filename>')
+@app.route('/preview/<token>')
+@login_required
+def serve_preview(token):
+    """Invia un'anteprima dalla memoria (solo alla sessione che l'ha generata)"""
+    data = preview_cache.load_preview(token, session.get('preview_session'))
+    if data is None:
+        return jsonify({'error': 'Anteprima scaduta'}), 404
+    response = send_file(io.BytesIO(data), mimetype='application/pdf', download_name='anteprima.pdf',
+                         etag=token, conditional=True)
+    response.cache_control.private = True
+    return response
+
+@app.route('/preview/rilascia', methods=['POST'])
 @login_required
-def serve_preview(filename):
-    """Serves a preview PDF file"""
-    preview_folder = os.path.join(app.config['DATA_FOLDER'], '_previews')
-    return send_file(os.path.join(preview_folder, filename))
+def release_previews():
+    """Scarta le anteprime della pagina del modulo (chiamata alla sua chiusura)"""
+    preview_cache.discard_previews(session.get('preview_session'), preview_page_id())
+    return '', 204
+
+def preview_page_selection(form_data, tabs, tab_positions, total_changed):
+    """
+    Pagine da impaginare in un'anteprima parziale (None = documento completo)
+
+    Il modulo può indicare preview_tab (indice N della scheda nel modulo, tab_N,
+    tradotto in posizione con tab_positions di process_form_final) oppure
+    preview_pages (es. "3" o "3-5", numerazione del documento completo). La
+    pagina delle condizioni viene aggiunta se il prezzo totale è cambiato
+    rispetto all'anteprima precedente.
+    """
+    tab_pages, conditions_page = offer_page_layout(tabs)
+    pages = set()
+    try:
+        if form_data.get('preview_tab', '').strip():
+            position = tab_positions.get(int(form_data['preview_tab']))
+            if position is None:
+                # Scheda saltata (incompleta) o inesistente
+                return None
+            first_page, count = tab_pages[position]
+            pages.update(range(first_page, first_page + count))
+        elif form_data.get('preview_pages', '').strip():
+            start, _, end = form_data['preview_pages'].partition('-')
+            pages.update(range(max(int(start), 1), min(int(end or start), conditions_page) + 1))
+        else:
+            return None
+    except ValueError:
+        return None
+
+    if total_changed:
+        pages.add(conditions_page)
+    return pages or None
+
+def preview_page_id():
+    """Identificativo della pagina del modulo che chiede l'anteprima (campo preview_page)"""
+    return request.form.get('preview_page', '')[:64]
+
+def preview_session_id():
+    """Identificativo della sessione a cui appartengono le anteprime (creato al primo uso)"""
+    if 'preview_session' not in session:
+        session['preview_session'] = uuid.uuid4().hex
+    return session['preview_session']
 
 if __name__ == '__main__':
+    # Con il reloader di Flask le richieste le serve solo il processo figlio
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -2,6 +2,7 @@ from flask import request, redirect, url_for, session, flash, render_template
 from functools import wraps
 import hashlib
 import os
+from utils import preview_cache
 
 # Credenziali utente (modifica con le tue credenziali)
 USERS = {
@@ -40,6 +41,8 @@ def init_auth(app):
     def logout():
         session.pop('logged_in', None)
         session.pop('username', None)
+        # Le anteprime PDF della sessione non servono più
+        preview_cache.discard_previews(session.pop('preview_session', None))
         flash('Logout effettuato con successo', 'success')
         return redirect(url_for('login'))
     
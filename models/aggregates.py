@@ -0,0 +1,108 @@
+import logging
+import threading
+from array import array
+
+# Raggruppamenti supportati dall'endpoint di aggregazione
+GROUP_BY = ('month', 'customer', 'status')
+
+
+class _Dimension:
+    """Colonna categorica: ogni riga contiene l'indice del valore nella lista labels"""
+
+    def __init__(self):
+        self.labels = []
+        self.codes = array('I')
+        self._index = {}
+
+    def append(self, label):
+        code = self._index.get(label)
+        if code is None:
+            code = self._index[label] = len(self.labels)
+            self.labels.append(label)
+        self.codes.append(code)
+
+    def code_of(self, label):
+        return self._index.get(label)
+
+
+class OfferTotals:
+    """
+    Totali delle offerte in colonne compatte (array) per le aggregazioni.
+
+    Le colonne vengono costruite con una sola query sull'archivio e ricostruite
+    solo quando l'archivio ha registrato una scrittura (OfferStore.generation),
+    così le aggregazioni non rileggono né deserializzano le offerte.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._generation = None
+        self.totals = array('d')
+        self.months = _Dimension()
+        self.customers = _Dimension()
+        self.statuses = _Dimension()
+
+    def _ensure_current(self):
+        if self._generation == self.store.generation:
+            return
+        with self._lock:
+            generation = self.store.generation
+            if self._generation == generation:
+                return
+            totals, months, customers, statuses = array('d'), _Dimension(), _Dimension(), _Dimension()
+            for row in self.store.totals_columns():
+                totals.append(row['total_price'] or 0.0)
+                months.append((row['date'] or '')[:7])
+                customers.append((row['customer'] or '').strip().upper())
+                statuses.append(row['status'] or '')
+            self.totals, self.months, self.customers, self.statuses = totals, months, customers, statuses
+            self._generation = generation
+            logging.info(f"Colonne dei totali ricostruite: {len(totals)} offerte")
+
+    def aggregate(self, by='month', status=None, year=None):
+        """
+        Somma i totali delle offerte raggruppandoli per mese, cliente o stato
+
+        Args:
+            by (str): 'month', 'customer' o 'status'
+            status (str): Considera solo le offerte con questo stato
+            year (str): Considera solo le offerte di questo anno (dalla data)
+
+        Returns:
+            list: Gruppi {'key', 'count', 'total'}; per mese in ordine cronologico,
+            altrimenti dal totale più alto
+        """
+        if by not in GROUP_BY:
+            raise ValueError(f"Raggruppamento non valido: {by}")
+        self._ensure_current()
+
+        with self._lock:
+            totals, months, statuses = self.totals, self.months, self.statuses
+            dimension = {'month': months, 'customer': self.customers, 'status': statuses}[by]
+
+        status_code = statuses.code_of(status) if status else None
+        if status and status_code is None:
+            return []
+        year_codes = None
+        if year:
+            year_codes = {code for code, label in enumerate(months.labels) if label.startswith(f"{year}-")}
+
+        sums = [0.0] * len(dimension.labels)
+        counts = [0] * len(dimension.labels)
+        codes = dimension.codes
+        for i, total in enumerate(totals):
+            if status_code is not None and statuses.codes[i] != status_code:
+                continue
+            if year_codes is not None and months.codes[i] not in year_codes:
+                continue
+            sums[codes[i]] += total
+            counts[codes[i]] += 1
+
+        groups = [{'key': label, 'count': counts[code], 'total': round(sums[code], 2)}
+                  for code, label in enumerate(dimension.labels) if counts[code]]
+        if by == 'month':
+            groups.sort(key=lambda group: group['key'])
+        else:
+            groups.sort(key=lambda group: group['total'], reverse=True)
+        return groups
@@ -0,0 +1,313 @@
+import os
+import copy
+import json
+import time
+import logging
+import threading
+
+from models.offer_schema import upgrade_offer
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # inotify non disponibile (Windows, macOS o pacchetto non installato)
+    INotify = None
+
+OFFER_FILENAME = "dati_offerta.json"
+
+
+class _Entry:
+    """Offerta in memoria con il percorso e l'mtime del file da cui proviene"""
+
+    __slots__ = ('offer', 'json_path', 'mtime')
+
+    def __init__(self, offer, json_path, mtime):
+        self.offer = offer
+        self.json_path = json_path
+        self.mtime = mtime
+
+
+class OfferCatalog:
+    """
+    Catalogo in memoria di tutte le offerte.
+
+    Viene caricato una volta dall'archivio e aggiornato in scrittura (write-through)
+    dalle route di app.py. Le modifiche fatte a mano nella cartella dati vengono
+    rilevate per singola offerta confrontando gli mtime di file e cartelle, oppure
+    tramite inotify quando disponibile, e riportate nell'archivio e nell'indice
+    delle offerte come le modifiche fatte dall'app.
+    """
+
+    def __init__(self, store, data_folder, check_interval=5, index=None):
+        self.store = store
+        self.index = index      # OfferIndex da tenere allineato (opzionale)
+        self.data_folder = data_folder
+        self.check_interval = check_interval
+
+        self._lock = threading.RLock()
+        self._entries = {}      # id -> _Entry
+        self._by_path = {}      # percorso dati_offerta.json -> id
+        self._dir_mtimes = {}   # cartella -> mtime
+        self._loaded = False
+        self._last_check = 0.0
+
+        self._dirty_paths = set()
+        self._dirty_dirs = set()
+        self._watcher = None
+
+    # ------------------------------------------------------------------
+    # Percorsi
+    # ------------------------------------------------------------------
+
+    def json_path_for(self, offer):
+        """Percorso di dati_offerta.json per un'offerta"""
+        return os.path.join(self.data_folder, (offer.get('customer') or '').upper(),
+                            offer.get('offer_number') or '', OFFER_FILENAME)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _customer_dirs(self):
+        try:
+            names = os.listdir(self.data_folder)
+        except OSError:
+            return []
+        return [os.path.join(self.data_folder, name) for name in names
+                if not name.startswith(('_', '.'))
+                and os.path.isdir(os.path.join(self.data_folder, name))]
+
+    # ------------------------------------------------------------------
+    # Caricamento e aggiornamento
+    # ------------------------------------------------------------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for offer in self.store.load_all_offers():
+                json_path = self.json_path_for(offer)
+                self._set(offer, json_path, self._mtime(json_path))
+
+            self._dir_mtimes[self.data_folder] = self._mtime(self.data_folder)
+            for customer_dir in self._customer_dirs():
+                self._dir_mtimes[customer_dir] = self._mtime(customer_dir)
+
+            self._start_watcher()
+            self._last_check = time.monotonic()
+            self._loaded = True
+            logging.info(f"Catalogo offerte caricato: {len(self._entries)} offerte"
+                         f" ({'inotify' if self._watcher else 'controllo mtime'})")
+
+    def _set(self, offer, json_path, mtime):
+        old = self._entries.get(offer['id'])
+        if old is not None and old.json_path != json_path:
+            self._by_path.pop(old.json_path, None)
+        self._entries[offer['id']] = _Entry(offer, json_path, mtime)
+        self._by_path[json_path] = offer['id']
+
+    def _drop(self, offer_id):
+        entry = self._entries.pop(offer_id, None)
+        if entry is not None:
+            self._by_path.pop(entry.json_path, None)
+
+    def _forget(self, offer_id):
+        """Rimuove un'offerta sparita dal disco da catalogo, archivio e indice (come l'eliminazione dall'app)"""
+        if self.index is not None:
+            self.index.remove(offer_id)
+        self.store.delete_offer(offer_id)
+        self._drop(offer_id)
+
+    def _reload_path(self, json_path):
+        """Rilegge un singolo dati_offerta.json modificato fuori dall'app e sincronizza l'archivio"""
+        offer_id = self._by_path.get(json_path)
+        mtime = self._mtime(json_path)
+
+        if mtime is None:
+            if offer_id is not None:
+                logging.info(f"Catalogo: file rimosso, offerta {offer_id} eliminata")
+                self._forget(offer_id)
+            return
+
+        if offer_id is not None and self._entries[offer_id].mtime == mtime:
+            return
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                offer = json.load(f)
+        except Exception as e:
+            logging.info(f"Catalogo: impossibile leggere {json_path}: {e}")
+            return
+        if not offer.get('id'):
+            return
+        # File modificato a mano: può arrivare in un formato precedente dello schema
+        upgrade_offer(offer)
+
+        if offer_id is not None and offer_id != offer['id']:
+            self._forget(offer_id)
+        self._set(offer, json_path, mtime)
+        self.store.save_offer(offer)
+        if self.index is not None:
+            try:
+                self.index.upsert(offer)
+            except Exception as e:
+                logging.info(f"Catalogo: indice non aggiornato per l'offerta {offer['id']}: {e}")
+        logging.info(f"Catalogo: offerta {offer['id']} ricaricata da {json_path}")
+
+    def _rescan_dir(self, folder):
+        """Cerca offerte aggiunte o rimosse sotto una cartella cliente (o l'intera cartella dati)"""
+        if folder == self.data_folder:
+            customer_dirs = self._customer_dirs()
+            for customer_dir in [d for d in self._dir_mtimes if d != folder and d not in customer_dirs]:
+                del self._dir_mtimes[customer_dir]
+        elif os.path.isdir(folder):
+            customer_dirs = [folder]
+        else:
+            customer_dirs = []
+            self._dir_mtimes.pop(folder, None)
+
+        found = set()
+        for customer_dir in customer_dirs:
+            self._dir_mtimes[customer_dir] = self._mtime(customer_dir)
+            try:
+                offer_dirs = os.listdir(customer_dir)
+            except OSError:
+                continue
+            for offer_dir in offer_dirs:
+                json_path = os.path.join(customer_dir, offer_dir, OFFER_FILENAME)
+                if os.path.isfile(json_path):
+                    found.add(json_path)
+                    self._reload_path(json_path)
+
+        # Offerte sparite dalla cartella esaminata
+        prefix = os.path.join(folder, '')
+        for json_path in [p for p in self._by_path if p.startswith(prefix) and p not in found]:
+            self._reload_path(json_path)
+
+    def refresh(self, force=False):
+        """Applica le modifiche esterne rilevate da inotify o dal confronto degli mtime"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._watcher is not None:
+                self._drain_watcher()
+                dirty_dirs, self._dirty_dirs = self._dirty_dirs, set()
+                dirty_paths, self._dirty_paths = self._dirty_paths, set()
+                for folder in dirty_dirs:
+                    self._rescan_dir(folder)
+                for json_path in dirty_paths:
+                    self._reload_path(json_path)
+                return
+
+            now = time.monotonic()
+            if not force and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+
+            # Cartelle cliente nuove o con offerte aggiunte/rimosse
+            if self._mtime(self.data_folder) != self._dir_mtimes.get(self.data_folder):
+                self._dir_mtimes[self.data_folder] = self._mtime(self.data_folder)
+                self._rescan_dir(self.data_folder)
+            else:
+                for customer_dir in list(self._dir_mtimes):
+                    if customer_dir != self.data_folder and \
+                            self._mtime(customer_dir) != self._dir_mtimes[customer_dir]:
+                        self._rescan_dir(customer_dir)
+
+            # File delle singole offerte modificati
+            for entry in list(self._entries.values()):
+                if self._mtime(entry.json_path) != entry.mtime:
+                    self._reload_path(entry.json_path)
+
+    # ------------------------------------------------------------------
+    # Watcher inotify
+    # ------------------------------------------------------------------
+
+    def _start_watcher(self):
+        if INotify is None:
+            return
+        try:
+            self._watcher = INotify()
+            self._watches = {}
+            self._add_watch(self.data_folder)
+            for customer_dir in self._customer_dirs():
+                self._add_watch(customer_dir)
+                for offer_dir in os.listdir(customer_dir):
+                    if os.path.isdir(os.path.join(customer_dir, offer_dir)):
+                        self._add_watch(os.path.join(customer_dir, offer_dir))
+        except Exception as e:
+            logging.info(f"Catalogo: inotify non disponibile, uso gli mtime: {e}")
+            self._watcher = None
+
+    def _add_watch(self, folder):
+        mask = (inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.CLOSE_WRITE |
+                inotify_flags.MOVED_FROM | inotify_flags.MOVED_TO)
+        self._watches[self._watcher.add_watch(folder, mask)] = folder
+
+    def _drain_watcher(self):
+        """Legge gli eventi inotify in sospeso (senza bloccare) e segna cosa ricontrollare"""
+        for event in self._watcher.read(timeout=0):
+            if event.mask & inotify_flags.Q_OVERFLOW:
+                # Coda eventi piena: si ricontrolla tutta la cartella dati
+                self._dirty_dirs.add(self.data_folder)
+                continue
+            folder = self._watches.get(event.wd)
+            if folder is None or not event.name:
+                continue
+            path = os.path.join(folder, event.name)
+            depth = os.path.relpath(path, self.data_folder).count(os.sep)
+
+            if event.mask & inotify_flags.ISDIR:
+                if event.mask & (inotify_flags.CREATE | inotify_flags.MOVED_TO) and depth <= 1:
+                    try:
+                        self._add_watch(path)
+                        if depth == 0:
+                            for offer_dir in os.listdir(path):
+                                self._add_watch(os.path.join(path, offer_dir))
+                    except OSError:
+                        pass
+                self._dirty_dirs.add(path if depth == 0 else folder)
+            elif event.name == OFFER_FILENAME:
+                self._dirty_paths.add(path)
+
+    # ------------------------------------------------------------------
+    # Letture
+    # ------------------------------------------------------------------
+
+    def get(self, offer_id):
+        """
+        Restituisce una copia di un'offerta, ricaricandola se il file è cambiato
+
+        Returns:
+            dict: Dati completi dell'offerta o None se non è nel catalogo
+        """
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(offer_id)
+            if entry is None:
+                return None
+            if self._mtime(entry.json_path) != entry.mtime:
+                self._reload_path(entry.json_path)
+                entry = self._entries.get(offer_id)
+                if entry is None:
+                    return None
+            return copy.deepcopy(entry.offer)
+
+    # ------------------------------------------------------------------
+    # Scritture (write-through)
+    # ------------------------------------------------------------------
+
+    def put(self, offer, json_path):
+        """Aggiorna il catalogo dopo che l'app ha scritto dati_offerta.json"""
+        self._ensure_loaded()
+        with self._lock:
+            self._set(copy.deepcopy(offer), json_path, self._mtime(json_path))
+
+    def remove(self, offer_id):
+        """Rimuove un'offerta eliminata dall'app"""
+        self._ensure_loaded()
+        with self._lock:
+            self._drop(offer_id)
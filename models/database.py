@@ -4,6 +4,8 @@ import datetime
 import uuid
 import shutil
 
+from models.offer_index import OfferIndex
+
 class Database:
     def __init__(self, data_folder):
         self.data_folder = data_folder
@@ -12,6 +14,9 @@ class Database:
         
         # Assicurati che i file di database esistano
         self._initialize_database()
+        
+        # Indice hash ID/numero offerta -> posizione, caricato una sola volta
+        self.index = OfferIndex(data_folder, self.index_file)
     
     def _initialize_database(self):
         """Inizializza i file di database se non esistono"""
@@ -72,51 +77,41 @@ class Database:
     
     def get_all_offerte(self):
         """Restituisce tutte le offerte dall'indice"""
-        try:
-            with open(self.index_file, 'r') as f:
-                return json.load(f)
-        except:
-            return []
+        return self.index.entries()
     
     def get_offerta(self, offerta_id):
         """Ottiene una singola offerta dall'ID"""
         print(f"DEBUG get_offerta: Caricamento offerta {offerta_id}")
-        index = self.get_all_offerte()
-        
-        for offerta in index:
-            if offerta.get('id') == offerta_id:
-                # Carica il file JSON completo dell'offerta
-                json_path = os.path.join(self.data_folder, offerta['customer'].upper(), 
-                                        offerta['offer_number'], "dati_offerta.json")
-                print(f"DEBUG: Tentativo di caricamento da {json_path}")
-                
-                try:
-                    if os.path.exists(json_path):
-                        with open(json_path, 'r', encoding='utf-8') as f:
-                            offerta_completa = json.load(f)
-                            
-                            # Assicurati che l'ID sia incluso
-                            offerta_completa['id'] = offerta_id
-                            
-                            # Assicurati che tabs esista e sia una lista
-                            if 'tabs' not in offerta_completa or not isinstance(offerta_completa['tabs'], list):
-                                print(f"ATTENZIONE: 'tabs' mancante o non valido in {json_path}, inizializzato come lista vuota")
-                                offerta_completa['tabs'] = []
-                            
-                            print(f"DEBUG: Caricato JSON con {len(offerta_completa['tabs'])} tabs")
-                            return offerta_completa
-                    else:
-                        print(f"ERRORE: File JSON non trovato: {json_path}")
-                except Exception as e:
-                    print(f"ERRORE nel caricamento dell'offerta da {json_path}: {e}")
-                
-                # Se c'è un errore, restituisci l'oggetto di indice con tabs vuoto
-                offerta['tabs'] = []
-                return offerta
-        
-        print(f"ERRORE: Offerta {offerta_id} non trovata nell'indice")
-        return {'id': offerta_id, 'tabs': []}
+        location = self.index.lookup(offerta_id)
+        
+        if location is None:
+            print(f"ERRORE: Offerta {offerta_id} non trovata nell'indice")
+            return {'id': offerta_id, 'tabs': []}
         
+        # Carica il file JSON completo dell'offerta
+        _, _, json_path = location
+        print(f"DEBUG: Tentativo di caricamento da {json_path}")
+        
+        try:
+            if os.path.exists(json_path):
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    offerta_completa = json.load(f)
+                    
+                    # Assicurati che l'ID sia incluso
+                    offerta_completa['id'] = offerta_id
+                    
+                    print(f"DEBUG: Caricato JSON con {len(offerta_completa['tabs'])} tabs")
+                    return offerta_completa
+            else:
+                print(f"ERRORE: File JSON non trovato: {json_path}")
+        except Exception as e:
+            print(f"ERRORE nel caricamento dell'offerta da {json_path}: {e}")
+        
+        # Se c'è un errore, restituisci l'oggetto di indice con tabs vuoto
+        offerta = dict(self.index.get(offerta_id))
+        offerta['tabs'] = []
+        return offerta
+    
     def save_offerta(self, data):
         """Salva una nuova offerta e restituisce l'ID"""
         # Debug log dei dati ricevuti
@@ -175,20 +170,8 @@ class Database:
             print(f"ERRORE nella verifica del JSON: {e}")
         
         # Aggiorna l'indice
-        index = self.get_all_offerte()
-        index_entry = {
-            'id': offerta_id,
-            'offer_number': data['offer_number'],
-            'date': data['date'],
-            'customer': data['customer'],
-            'customer_email': data['customer_email'],
-            'description': data['offer_description'][:100] + '...' if len(data['offer_description']) > 100 else data['offer_description']
-        }
-        index.append(index_entry)
-        
         try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(index, f, indent=2, ensure_ascii=False)
+            self.index.upsert(data)
             print(f"DEBUG: Indice aggiornato con successo")
         except Exception as e:
             print(f"ERRORE nell'aggiornamento dell'indice: {e}")
@@ -261,21 +244,7 @@ class Database:
                 pass  # Ignora errori nella pulizia delle cartelle
         
         # Aggiorna l'indice
-        index = self.get_all_offerte()
-        for i, entry in enumerate(index):
-            if entry.get('id') == offerta_id:
-                index[i] = {
-                    'id': offerta_id,
-                    'offer_number': new_offer_number,
-                    'date': data['date'],
-                    'customer': new_customer,
-                    'customer_email': data['customer_email'],
-                    'description': data['offer_description'][:100] + '...' if len(data['offer_description']) > 100 else data['offer_description']
-                }
-                break
-        
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, indent=4, ensure_ascii=False)
+        self.index.upsert(data)
         
         return True
     
@@ -295,10 +264,7 @@ class Database:
             return False
         
         # Rimuovi dall'indice
-        index = self.get_all_offerte()
-        index = [entry for entry in index if entry.get('id') != offerta_id]
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, indent=4, ensure_ascii=False)
+        self.index.remove(offerta_id)
         
         # Rimuovi i file
         customer_folder = os.path.join(self.data_folder, offerta['customer'].upper())
@@ -0,0 +1,213 @@
+import os
+import json
+import logging
+import threading
+
+OFFER_FILENAME = "dati_offerta.json"
+
+# Dimensione del journal oltre la quale viene compattato nello snapshot (64 KB)
+JOURNAL_COMPACT_THRESHOLD = 64 * 1024
+
+
+def make_index_entry(data):
+    """
+    Costruisce la voce di offerte_index.json per un'offerta
+
+    Args:
+        data (dict): Dati completi dell'offerta
+
+    Returns:
+        dict: Voce dell'indice
+    """
+    description = data.get('offer_description') or ''
+    return {
+        'id': data['id'],
+        'offer_number': data['offer_number'],
+        'date': data.get('date'),
+        'customer': data['customer'],
+        'customer_email': data.get('customer_email'),
+        'description': description[:100] + '...' if len(description) > 100 else description
+    }
+
+
+def _apply_record(by_id, by_number, record):
+    """Applica un record del journal ai dizionari dell'indice (id -> voce, numero -> id)"""
+    if record.get('op') == 'upsert':
+        entry = record['entry']
+        old = by_id.get(entry['id'])
+        by_id[entry['id']] = entry
+        by_number[entry.get('offer_number')] = entry['id']
+        # Il vecchio numero si toglie solo dopo aver registrato il nuovo
+        if old is not None and old.get('offer_number') != entry.get('offer_number') \
+                and by_number.get(old.get('offer_number')) == entry['id']:
+            del by_number[old.get('offer_number')]
+    elif record.get('op') == 'delete':
+        old = by_id.pop(record.get('id'), None)
+        if old is not None and by_number.get(old.get('offer_number')) == record['id']:
+            del by_number[old.get('offer_number')]
+
+
+class OfferIndex:
+    """
+    Indice hash delle offerte persistito in offerte_index.json.
+
+    Il file viene letto una sola volta; le ricerche per ID e per numero offerta
+    avvengono su dizionari in memoria. Ogni modifica viene aggiunta come record
+    al journal offerte_index.journal, rigiocato all'avvio sopra lo snapshot e
+    compattato in background quando supera la soglia.
+    """
+
+    def __init__(self, data_folder, index_file=None, journal_threshold=JOURNAL_COMPACT_THRESHOLD):
+        self.data_folder = data_folder
+        self.index_file = index_file or os.path.join(data_folder, "offerte_index.json")
+        self.journal_file = os.path.splitext(self.index_file)[0] + ".journal"
+        self.journal_threshold = journal_threshold
+        self._lock = threading.RLock()
+        self._by_id = None      # id -> voce dell'indice (ordine di inserimento preservato)
+        self._by_number = {}    # numero offerta -> id
+        self._compacting = False
+
+    def _ensure_loaded(self):
+        if self._by_id is not None:
+            return
+        with self._lock:
+            if self._by_id is not None:
+                return
+            entries = []
+            if os.path.exists(self.index_file):
+                try:
+                    with open(self.index_file, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+                except Exception as e:
+                    logging.info(f"ERRORE nel caricamento dell'indice {self.index_file}: {e}")
+
+            # Costruito in dizionari locali e pubblicato alla fine: get() e
+            # id_for_number() leggono senza lock e non devono vedere un indice a metà
+            by_id, by_number = {}, {}
+            for entry in entries:
+                if entry.get('id'):
+                    _apply_record(by_id, by_number, {'op': 'upsert', 'entry': entry})
+
+            replayed = 0
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Record troncato da un'interruzione durante la scrittura
+                            continue
+                        _apply_record(by_id, by_number, record)
+                        replayed += 1
+
+            self._by_number = by_number
+            self._by_id = by_id
+            if replayed:
+                logging.info(f"Indice offerte: {replayed} modifiche rigiocate dal journal")
+                self._maybe_compact()
+
+    def _append(self, record):
+        """Applica una modifica e la aggiunge in coda al journal"""
+        with self._lock:
+            _apply_record(self._by_id, self._by_number, record)
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._maybe_compact()
+
+    # ------------------------------------------------------------------
+    # Compattazione
+    # ------------------------------------------------------------------
+
+    def _journal_size(self):
+        try:
+            return os.path.getsize(self.journal_file)
+        except OSError:
+            return 0
+
+    def _maybe_compact(self):
+        """Avvia la compattazione in background se il journal ha superato la soglia"""
+        if self._compacting or self._journal_size() < self.journal_threshold:
+            return
+        self._compacting = True
+        threading.Thread(target=self.compact, name="offer-index-compaction", daemon=True).start()
+
+    def compact(self):
+        """Scrive lo snapshot completo e tronca il journal ai soli record successivi"""
+        self._ensure_loaded()
+        try:
+            with self._lock:
+                entries = list(self._by_id.values())
+                offset = self._journal_size()
+
+            # Lo snapshot viene scritto fuori dal lock: le scritture proseguono sul journal
+            tmp_file = self.index_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+
+            with self._lock:
+                tail = b''
+                if os.path.exists(self.journal_file):
+                    with open(self.journal_file, 'rb') as f:
+                        f.seek(offset)
+                        tail = f.read()
+                tmp_journal = self.journal_file + ".tmp"
+                with open(tmp_journal, 'wb') as f:
+                    f.write(tail)
+                os.replace(tmp_journal, self.journal_file)
+            logging.info(f"Indice offerte compattato: {len(entries)} voci")
+        except Exception as e:
+            logging.info(f"ERRORE nella compattazione dell'indice: {e}")
+        finally:
+            self._compacting = False
+
+    # ------------------------------------------------------------------
+    # Letture
+    # ------------------------------------------------------------------
+
+    def entries(self):
+        """Restituisce tutte le voci dell'indice"""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._by_id.values())
+
+    def get(self, offer_id):
+        """Restituisce la voce dell'indice per un ID o None"""
+        self._ensure_loaded()
+        return self._by_id.get(offer_id)
+
+    def lookup(self, offer_id):
+        """
+        Risolve un ID nella posizione dell'offerta su disco
+
+        Returns:
+            tuple: (cliente, numero offerta, percorso dati_offerta.json) o None
+        """
+        entry = self.get(offer_id)
+        if entry is None:
+            return None
+        json_path = os.path.join(self.data_folder, entry['customer'].upper(),
+                                 entry['offer_number'], OFFER_FILENAME)
+        return entry['customer'], entry['offer_number'], json_path
+
+    def id_for_number(self, offer_number):
+        """Restituisce l'ID dell'offerta con il numero indicato o None"""
+        self._ensure_loaded()
+        return self._by_number.get(offer_number)
+
+    # ------------------------------------------------------------------
+    # Scritture
+    # ------------------------------------------------------------------
+
+    def upsert(self, data):
+        """Inserisce o aggiorna la voce di un'offerta"""
+        self._ensure_loaded()
+        self._append({'op': 'upsert', 'entry': make_index_entry(data)})
+
+    def remove(self, offer_id):
+        """Rimuove la voce di un'offerta"""
+        self._ensure_loaded()
+        with self._lock:
+            if offer_id not in self._by_id:
+                return
+            self._append({'op': 'delete', 'id': offer_id})
@@ -0,0 +1,130 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from models.offerta import Offerta
+
+OFFER_FILENAME = "dati_offerta.json"
+
+# Versione dello schema di dati_offerta.json (campo schema_version)
+OFFER_SCHEMA_VERSION = 1
+
+# Stati ammessi dallo schema
+STATUSES = ('in_attesa', 'accettata')
+
+
+def _upgrade_to_v1(data):
+    """Stati in_attesa/accettata, schede sempre in lista e totali presenti"""
+    status = data.get('status')
+    if status == 'accepted':
+        data['status'] = 'accettata'
+    elif status not in STATUSES:
+        data['status'] = 'in_attesa'
+
+    if not isinstance(data.get('tabs'), list):
+        data['tabs'] = []
+    data['tabs'] = [tab for tab in data['tabs'] if isinstance(tab, dict)]
+
+    data['totals'] = Offerta(tabs=data['tabs']).get_totals()
+
+
+# Passi di aggiornamento: versione di arrivo -> funzione che modifica i dati
+UPGRADES = (
+    (1, _upgrade_to_v1),
+)
+
+
+def upgrade_offer(data):
+    """
+    Porta i dati di un'offerta all'ultima versione dello schema
+
+    Args:
+        data (dict): Dati dell'offerta, modificati sul posto
+
+    Returns:
+        bool: True se i dati sono stati modificati
+    """
+    version = data.get('schema_version', 0)
+    if version >= OFFER_SCHEMA_VERSION:
+        return False
+    for target, upgrade in UPGRADES:
+        if version < target:
+            upgrade(data)
+    data['schema_version'] = OFFER_SCHEMA_VERSION
+    return True
+
+
+def upgrade_file(json_path):
+    """
+    Aggiorna un singolo dati_offerta.json, riscrivendolo solo se necessario
+
+    Returns:
+        dict: Dati aggiornati se il file è stato riscritto, altrimenti None
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        logging.info(f"Schema offerte: impossibile leggere {json_path}: {e}")
+        return None
+    if not data.get('id') or not upgrade_offer(data):
+        return None
+
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, json_path)
+    return data
+
+
+def find_offer_files(data_folder):
+    """Restituisce i percorsi di tutti i dati_offerta.json nella cartella dati"""
+    paths = []
+    for customer_folder in sorted(os.listdir(data_folder)):
+        customer_path = os.path.join(data_folder, customer_folder)
+        if not os.path.isdir(customer_path) or customer_folder.startswith(('_', '.')):
+            continue
+        for offer_folder in sorted(os.listdir(customer_path)):
+            json_path = os.path.join(customer_path, offer_folder, OFFER_FILENAME)
+            if os.path.isfile(json_path):
+                paths.append(json_path)
+    return paths
+
+
+def upgrade_folder(data_folder, workers=None, processes=False):
+    """
+    Aggiorna in parallelo tutte le offerte della cartella dati all'ultimo schema
+
+    Args:
+        data_folder (str): Cartella dati con il layout <CLIENTE>/<NUMERO>/dati_offerta.json
+        workers (int): Numero di worker (default: numero di CPU)
+        processes (bool): Usa processi invece di thread (solo da riga di comando)
+
+    Returns:
+        list: Dati delle offerte effettivamente aggiornate
+    """
+    paths = find_offer_files(data_folder)
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers or os.cpu_count()) as executor:
+        results = list(executor.map(upgrade_file, paths, chunksize=16 if processes else 1))
+
+    upgraded = [data for data in results if data is not None]
+    logging.info(f"Schema offerte v{OFFER_SCHEMA_VERSION}: {len(upgraded)} offerte aggiornate"
+                 f" su {len(paths)}")
+    return upgraded
+
+
+if __name__ == '__main__':
+    # Aggiornamento manuale: python -m models.offer_schema [cartella_dati] [worker]
+    import sys
+    from models.store import OfferStore, STORE_FILENAME
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    upgraded = upgrade_folder(folder, workers=workers, processes=True)
+    store = OfferStore(os.path.join(folder, STORE_FILENAME))
+    store.save_offers(upgraded)
+    store.set_meta('offer_schema_version', OFFER_SCHEMA_VERSION)
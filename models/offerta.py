@@ -1,8 +1,13 @@
+def round_offer_total(total):
+    """Arrotonda il totale dell'offerta alla decina, come nel PDF"""
+    return float(round(total / 10) * 10)
+
+
 class Offerta:
     """Classe che rappresenta un'offerta commerciale."""
     
     def __init__(self, id=None, offer_number=None, date=None, customer=None, customer_email=None, 
-                 address=None, offer_description=None, tabs=None, status='pending'):
+                 address=None, offer_description=None, tabs=None, status='in_attesa'):
         """
         Inizializza un'offerta con i dati forniti
         
@@ -15,7 +20,7 @@ class Offerta:
             address (str): Indirizzo del cliente
             offer_description (str): Descrizione dell'offerta
             tabs (list): Lista di tabulazioni dell'offerta
-            status (str): Stato dell'offerta ('pending' o 'accepted')
+            status (str): Stato dell'offerta ('in_attesa' o 'accettata')
         """
         self.id = id
         self.offer_number = offer_number
@@ -55,36 +60,56 @@ class Offerta:
         Returns:
             float: Prezzo totale dell'offerta
         """
+        return sum(self.get_tab_total(tab) for tab in self.tabs)
+    
+    def get_tab_total(self, tab):
+        """
+        Calcola il totale di una singola scheda con le stesse regole del PDF
+
+        Args:
+            tab (dict): Scheda prodotto singolo o multiprodotto
+
+        Returns:
+            float: Totale della scheda (IVA esclusa)
+        """
         total = 0.0
-        
-        for tab in self.tabs:
-            if tab.get('type') == 'single_product':
+        if tab.get('type') == 'single_product':
+            try:
+                total = float(tab.get('unit_price', 0)) * float(tab.get('quantity', 0))
+            except (ValueError, TypeError):
+                return 0.0
+            if tab.get('discount_flag'):
                 try:
-                    price = float(tab.get('unit_price', 0))
-                    quantity = float(tab.get('quantity', 0))
-                    discount = float(tab.get('discount', 0)) if tab.get('discount_flag') else 0
-                    
-                    # Applica lo sconto se necessario
-                    if discount > 0:
-                        price = price * (1 - discount / 100)
-                    
-                    total += price * quantity
+                    discount = float(tab.get('discount', 0))
                 except (ValueError, TypeError):
+                    discount = 0
+                total -= (discount / 100) * total
+
+        elif tab.get('type') == 'multi_product':
+            for product in tab.get('products', []):
+                try:
+                    total += float(product[2]) * float(product[3])
+                except (ValueError, TypeError, IndexError):
                     pass
-            
-            elif tab.get('type') == 'multi_product':
-                products = tab.get('products', [])
-                for product in products:
-                    try:
-                        if len(product) >= 4:  # Nome, modello, prezzo, quantità
-                            price = float(product[2])
-                            quantity = float(product[3])
-                            total += price * quantity
-                    except (ValueError, TypeError, IndexError):
-                        pass
-        
+
         return total
     
+    def get_totals(self):
+        """
+        Calcola i totali dell'offerta come vengono stampati nel PDF
+
+        Il totale dell'offerta è arrotondato alla decina, come nella riga
+        "PREZZO TOTALE OFFERTA" del PDF.
+
+        Returns:
+            dict: {'tab_totals': {'tab_0': ...}, 'total_offer_price': totale arrotondato}
+        """
+        tab_totals = {f"tab_{i}": self.get_tab_total(tab) for i, tab in enumerate(self.tabs)}
+        return {
+            'tab_totals': tab_totals,
+            'total_offer_price': round_offer_total(sum(tab_totals.values()))
+        }
+    
     def get_product_count(self):
         """
         Restituisce il numero totale di prodotti nell'offerta
@@ -0,0 +1,88 @@
+import logging
+import threading
+
+
+class PdfJobQueue:
+    """
+    Pool di worker che generano i PDF accodati nella tabella pdf_jobs.
+
+    Le route salvano l'offerta, accodano il lavoro e rispondono subito; i worker
+    (thread daemon) prendono in carico i lavori dall'archivio SQLite, quindi i
+    lavori non completati vengono ripresi al riavvio dell'applicazione.
+    """
+
+    def __init__(self, store, render, workers=2, max_attempts=3, poll_interval=5):
+        """
+        Args:
+            store (OfferStore): Archivio con la tabella pdf_jobs
+            render (callable): Funzione render(offer_id) che genera il PDF;
+                un'eccezione segna il lavoro come fallito
+            workers (int): Numero di thread di generazione
+            max_attempts (int): Tentativi massimi per i lavori interrotti da un riavvio
+            poll_interval (int): Secondi tra due controlli della coda senza notifiche
+                (lavori accodati da un altro processo)
+        """
+        self.store = store
+        self.render = render
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Riprende i lavori interrotti e avvia i worker"""
+        if self._threads:
+            return
+        requeued = self.store.requeue_pdf_jobs(self.max_attempts)
+        if requeued:
+            logging.info(f"Coda PDF: {requeued} lavori interrotti rimessi in coda")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pdf-worker-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._wakeup.set()
+
+    def enqueue(self, offer_id):
+        """
+        Accoda la generazione del PDF di un'offerta e sveglia i worker
+
+        Returns:
+            int: ID del lavoro
+        """
+        job_id = self.store.enqueue_pdf_job(offer_id)
+        self._wakeup.set()
+        return job_id
+
+    def status(self, offer_id):
+        """Ultimo lavoro dell'offerta (dict con status ed eventuale error) o None"""
+        return self.store.get_pdf_job(offer_id)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            while self._process_next():
+                pass
+
+    def _process_next(self):
+        """Genera il prossimo lavoro in coda; restituisce False se la coda è vuota"""
+        try:
+            job = self.store.claim_pdf_job()
+        except Exception as e:
+            logging.info(f"Coda PDF: errore nella lettura della coda: {e}")
+            return False
+        if job is None:
+            return False
+
+        try:
+            self.render(job['offer_id'])
+        except Exception as e:
+            logging.info(f"Coda PDF: generazione fallita per l'offerta {job['offer_id']}: {e}")
+            self.store.finish_pdf_job(job['id'], error=str(e) or e.__class__.__name__)
+        else:
+            self.store.finish_pdf_job(job['id'])
+            logging.info(f"Coda PDF: PDF generato per l'offerta {job['offer_id']}")
+        # Un altro lavoro della stessa offerta può essere rimasto in attesa di questo
+        self._wakeup.set()
+        return True
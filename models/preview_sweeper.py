@@ -0,0 +1,111 @@
+import os
+import time
+import logging
+import threading
+
+from utils import preview_cache
+
+
+class PreviewSweeper:
+    """
+    Pulizia periodica dell'area delle anteprime, in un thread daemon.
+
+    Scarta le anteprime in memoria inutilizzate da più di max_age secondi e i
+    file più vecchi nelle cartelle indicate, poi applica le quote (totale e per
+    sessione) partendo dai meno recenti. Le route non fanno mai pulizia.
+    Nelle cartelle ogni sottocartella di primo livello è una sessione.
+
+    Le stesse quote valgono per le anteprime in memoria (preview_cache.set_limits),
+    che le rispetta già al salvataggio di ogni anteprima.
+    """
+
+    def __init__(self, folders=(), interval=300, max_age=3600,
+                 quota_bytes=64 * 1024 * 1024, session_quota_bytes=16 * 1024 * 1024):
+        """
+        Args:
+            folders (iterable): Cartelle su disco dell'area anteprime
+            interval (int): Secondi tra due passaggi
+            max_age (int): Secondi dopo i quali un'anteprima o un file inutilizzato scade
+            quota_bytes (int): Spazio massimo complessivo (in memoria e, a parte, su disco)
+            session_quota_bytes (int): Spazio massimo di una singola sessione
+        """
+        self.folders = list(folders)
+        self.interval = interval
+        self.max_age = max_age
+        self.quota_bytes = quota_bytes
+        self.session_quota_bytes = session_quota_bytes
+        self._thread = None
+        preview_cache.set_limits(quota_bytes, session_quota_bytes)
+
+    def start(self):
+        """Avvia il thread di pulizia"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="preview-sweeper", daemon=True)
+        self._thread.start()
+
+    def sweep(self):
+        """
+        Esegue un passaggio di pulizia
+
+        Returns:
+            int: Byte liberati (memoria e disco)
+        """
+        removed, reclaimed = preview_cache.sweep(self.max_age)
+        for folder in self.folders:
+            files, freed = self._sweep_folder(folder)
+            removed += files
+            reclaimed += freed
+        if removed:
+            logging.info(f"Pulizia anteprime: {removed} elementi rimossi, {reclaimed / 1024:.0f} KB liberati")
+        return reclaimed
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.info(f"Pulizia anteprime: errore: {e}")
+
+    def _sweep_folder(self, folder):
+        """Applica scadenza e quote ai file di una cartella; restituisce (file rimossi, byte liberati)"""
+        entries = []   # (ultimo uso, dimensione, percorso, sessione)
+        for root, _, filenames in os.walk(folder):
+            relative = os.path.relpath(root, folder)
+            session_id = '' if relative == os.curdir else relative.split(os.sep)[0]
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((max(st.st_mtime, st.st_atime), st.st_size, path, session_id))
+
+        # Dal più recente: si tiene ciò che rientra nella scadenza e nelle quote
+        expired_before = time.time() - self.max_age
+        total = 0
+        session_bytes = {}
+        removed = reclaimed = 0
+        for used, size, path, session_id in sorted(entries, reverse=True):
+            used_by_session = session_bytes.get(session_id, 0)
+            if (used >= expired_before and total + size <= self.quota_bytes
+                    and used_by_session + size <= self.session_quota_bytes):
+                total += size
+                session_bytes[session_id] = used_by_session + size
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            reclaimed += size
+
+        # Cartelle di sessione rimaste vuote
+        for root, _, _ in os.walk(folder, topdown=False):
+            if root != folder and not os.listdir(root):
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+        return removed, reclaimed
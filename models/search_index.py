@@ -0,0 +1,128 @@
+import re
+import math
+import unicodedata
+
+# Peso dei campi nel punteggio: un riscontro sul cliente o sul codice prodotto
+# conta più di uno nella descrizione
+FIELD_WEIGHTS = {
+    'offer_number': 5.0,
+    'customer': 4.0,
+    'product_code': 3.0,
+    'product_name': 3.0,
+    'offer_description': 2.0,
+    'customer_email': 2.0,
+    'address': 1.5,
+    'description': 1.0,
+}
+
+# Bonus per il termine esatto rispetto al solo prefisso
+EXACT_MATCH_BONUS = 1.5
+
+MAX_TERM_LENGTH = 40
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """
+    Divide un testo in termini normalizzati (minuscolo, senza accenti)
+
+    Args:
+        text: Testo da indicizzare (non stringa viene convertito)
+
+    Returns:
+        list: Termini nell'ordine in cui compaiono
+    """
+    if text is None:
+        return []
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(text)]
+
+
+def _field_texts(data):
+    """Restituisce le coppie (campo, testo) indicizzate di un'offerta"""
+    for field in ('offer_number', 'customer', 'customer_email', 'address', 'offer_description'):
+        yield field, data.get(field)
+
+    tabs = data.get('tabs') if isinstance(data.get('tabs'), list) else []
+    for tab in tabs:
+        if not isinstance(tab, dict):
+            continue
+        if tab.get('type') == 'multi_product':
+            # Righe nel formato [nome, modello, prezzo, quantità, descrizione]
+            for row in tab.get('products') or []:
+                if not isinstance(row, (list, tuple)):
+                    continue
+                if len(row) > 0:
+                    yield 'product_name', row[0]
+                if len(row) > 1:
+                    yield 'product_code', row[1]
+                if len(row) > 4:
+                    yield 'description', row[4]
+        else:
+            yield 'product_name', tab.get('product_name')
+            yield 'product_code', tab.get('product_code')
+            yield 'description', tab.get('description')
+
+
+def extract_postings(data):
+    """
+    Calcola le occorrenze dei termini di un'offerta per l'indice invertito
+
+    Args:
+        data (dict): Dati completi dell'offerta (con le schede)
+
+    Returns:
+        dict: (termine, campo) -> frequenza
+    """
+    postings = {}
+    for field, text in _field_texts(data):
+        for term in tokenize(text):
+            postings[(term, field)] = postings.get((term, field), 0) + 1
+    return postings
+
+
+def prefix_upper_bound(prefix):
+    """Limite superiore (escluso) dei termini che iniziano con il prefisso"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def score_postings(query_terms, postings_by_term, total_offers):
+    """
+    Combina le occorrenze dei termini cercati in un punteggio per offerta
+
+    Ogni termine della ricerca è trattato come prefisso e deve essere presente
+    nell'offerta; il punteggio è una somma tf-idf pesata per campo.
+
+    Args:
+        query_terms (list): Termini della ricerca
+        postings_by_term (dict): termine cercato -> lista di (termine, id offerta, campo, tf)
+        total_offers (int): Numero di offerte indicizzate
+
+    Returns:
+        dict: id offerta -> punteggio, solo per le offerte che contengono tutti i termini
+    """
+    scores = None
+    for query_term in query_terms:
+        rows = postings_by_term.get(query_term, [])
+        document_frequency = len({offer_id for _, offer_id, _, _ in rows})
+        if not document_frequency:
+            return {}
+        idf = math.log(1 + total_offers / document_frequency)
+
+        term_scores = {}
+        for term, offer_id, field, tf in rows:
+            weight = FIELD_WEIGHTS.get(field, 1.0) * (1 + math.log(tf)) * idf
+            if term == query_term:
+                weight *= EXACT_MATCH_BONUS
+            term_scores[offer_id] = term_scores.get(offer_id, 0.0) + weight
+
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {offer_id: score + term_scores[offer_id]
+                      for offer_id, score in scores.items() if offer_id in term_scores}
+        if not scores:
+            return {}
+    return scores or {}
@@ -0,0 +1,737 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from models.offerta import Offerta
+from models.offer_schema import upgrade_offer
+from models.search_index import tokenize, extract_postings, prefix_upper_bound, score_postings
+
+# Nome del file database all'interno della cartella dati
+STORE_FILENAME = "offerte.db"
+
+# Versione dello schema (PRAGMA user_version)
+SCHEMA_VERSION = 7
+
+# Colonne del riepilogo usato dalle pagine elenco
+SUMMARY_COLUMNS = ('id', 'offer_number', 'customer', 'date', 'status',
+                   'description', 'total_price', 'product_count')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offers (
+    id TEXT PRIMARY KEY,
+    offer_number TEXT NOT NULL,
+    year TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT,
+    customer TEXT,
+    customer_email TEXT,
+    status TEXT,
+    description TEXT,
+    total_price REAL,
+    product_count INTEGER,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_offers_order ON offers(year, seq, id);
+CREATE INDEX IF NOT EXISTS idx_offers_number ON offers(offer_number);
+
+CREATE TABLE IF NOT EXISTS tabs (
+    offer_id TEXT NOT NULL REFERENCES offers(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    type TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (offer_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS counter (
+    year TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Indice invertito: termine -> offerte e campi in cui compare, con la frequenza
+SEARCH_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS search_terms (
+        term TEXT NOT NULL,
+        offer_id TEXT NOT NULL REFERENCES offers(id) ON DELETE CASCADE,
+        field TEXT NOT NULL,
+        tf INTEGER NOT NULL,
+        PRIMARY KEY (term, offer_id, field)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_search_terms_offer ON search_terms(offer_id)",
+)
+
+# Indice secondario per stato e contatori per stato mantenuti dai trigger,
+# così le pagine filtrate e i conteggi non scorrono tutte le offerte
+STATUS_SCHEMA = (
+    "CREATE INDEX IF NOT EXISTS idx_offers_status_order ON offers(status, year, seq, id)",
+    """CREATE TABLE IF NOT EXISTS status_counts (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0,
+        total REAL NOT NULL DEFAULT 0
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS trg_status_counts_insert AFTER INSERT ON offers
+    BEGIN
+        INSERT INTO status_counts (status, count, total)
+        VALUES (NEW.status, 1, COALESCE(NEW.total_price, 0))
+        ON CONFLICT(status) DO UPDATE SET count = count + 1, total = total + excluded.total;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_status_counts_delete AFTER DELETE ON offers
+    BEGIN
+        UPDATE status_counts SET count = count - 1, total = total - COALESCE(OLD.total_price, 0)
+        WHERE status = OLD.status;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_status_counts_update AFTER UPDATE OF status, total_price ON offers
+    BEGIN
+        UPDATE status_counts SET count = count - 1, total = total - COALESCE(OLD.total_price, 0)
+        WHERE status = OLD.status;
+        INSERT INTO status_counts (status, count, total)
+        VALUES (NEW.status, 1, COALESCE(NEW.total_price, 0))
+        ON CONFLICT(status) DO UPDATE SET count = count + 1, total = total + excluded.total;
+    END""",
+)
+
+# Coda persistente dei lavori di generazione PDF (sopravvive ai riavvii)
+PDF_JOBS_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS pdf_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        offer_id TEXT NOT NULL REFERENCES offers(id) ON DELETE CASCADE,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_pdf_jobs_status ON pdf_jobs(status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_pdf_jobs_offer ON pdf_jobs(offer_id, id)",
+)
+
+
+
+def split_offer_number(offer_number):
+    """
+    Scompone un numero offerta YYYY-XXXX in (anno, progressivo) per l'ordinamento
+
+    Args:
+        offer_number (str): Numero dell'offerta
+
+    Returns:
+        tuple: (anno, progressivo); i numeri non standard hanno progressivo 0
+    """
+    offer_number = offer_number or ''
+    match = re.match(r'^([^-]+)-(\d+)$', offer_number)
+    if match:
+        return match.group(1), int(match.group(2))
+    return offer_number, 0
+
+
+def build_summary(data):
+    """
+    Calcola il riepilogo di un'offerta mostrato nelle pagine elenco
+
+    Args:
+        data (dict): Dati completi dell'offerta
+
+    Returns:
+        dict: Riepilogo con descrizione breve, totale dell'offerta (arrotondato
+        come nel PDF) e numero di prodotti
+    """
+    offerta = Offerta(tabs=data['tabs'])
+    description = data.get('offer_description') or ''
+    return {
+        'id': data['id'],
+        'offer_number': data.get('offer_number') or '',
+        'customer': data.get('customer'),
+        'date': data.get('date'),
+        'status': data.get('status'),
+        'description': description[:100] + '...' if len(description) > 100 else description,
+        'total_price': offerta.get_totals()['total_offer_price'],
+        'product_count': offerta.get_product_count()
+    }
+
+
+class OfferStore:
+    """Archivio SQLite (WAL) di offerte, schede e contatore."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        # Incrementato a ogni scrittura, per invalidare le strutture derivate in memoria
+        self.generation = 0
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0 and conn.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'offers'").fetchone():
+            version = 1  # archivio creato prima del versionamento dello schema
+        if version < SCHEMA_VERSION:
+            self._upgrade_schema(conn, version)
+
+    def _upgrade_schema(self, conn, version):
+        """Crea lo schema o aggiorna un archivio esistente all'ultima versione"""
+        if version == 0:
+            conn.executescript(SCHEMA)
+            with _Transaction(conn):
+                for statement in SEARCH_SCHEMA + STATUS_SCHEMA + PDF_JOBS_SCHEMA:
+                    conn.execute(statement)
+        else:
+            with _Transaction(conn):
+                if version < 2:
+                    # Riepilogo per le pagine elenco, ricalcolato dalle offerte esistenti
+                    for column, kind in (('description', 'TEXT'), ('total_price', 'REAL'),
+                                         ('product_count', 'INTEGER')):
+                        conn.execute(f"ALTER TABLE offers ADD COLUMN {column} {kind}")
+                    for data in self._upgrade_candidates(conn):
+                        self._write_summary(conn, data)
+                if version < 3:
+                    # L'ID entra nell'ordinamento per la paginazione keyset a parità di numero
+                    conn.execute("DROP INDEX IF EXISTS idx_offers_order")
+                    conn.execute("CREATE INDEX idx_offers_order ON offers(year, seq, id)")
+                if version < 4:
+                    # Indice invertito per la ricerca, costruito dalle offerte esistenti
+                    for statement in SEARCH_SCHEMA:
+                        conn.execute(statement)
+                    for data in self._upgrade_candidates(conn):
+                        self._write_terms(conn, data)
+                if version < 5:
+                    # Contatori per stato ricalcolati una volta, poi aggiornati dai trigger
+                    for statement in STATUS_SCHEMA:
+                        conn.execute(statement)
+                    conn.execute("DELETE FROM status_counts")
+                    conn.execute(
+                        """INSERT INTO status_counts (status, count, total)
+                           SELECT status, COUNT(*), COALESCE(SUM(total_price), 0)
+                           FROM offers GROUP BY status"""
+                    )
+                if version < 6:
+                    # Totali ricalcolati con le regole del PDF (i trigger aggiornano status_counts)
+                    for data in self._upgrade_candidates(conn):
+                        self._write_summary(conn, data)
+                if version < 7:
+                    for statement in PDF_JOBS_SCHEMA:
+                        conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _upgrade_candidates(self, conn):
+        """Offerte già presenti, portate all'ultimo schema di dati_offerta.json"""
+        for row in conn.execute("SELECT id FROM offers").fetchall():
+            data = self._read_offer(conn, row['id'])
+            upgrade_offer(data)
+            yield data
+
+    def _connect(self):
+        """Restituisce la connessione del thread corrente (una per thread di waitress)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """Apre una transazione in scrittura (BEGIN IMMEDIATE)"""
+        return _Transaction(self._connect())
+
+    # ------------------------------------------------------------------
+    # Offerte
+    # ------------------------------------------------------------------
+
+    def _write_offer(self, conn, data):
+        """Inserisce o aggiorna un'offerta e le sue schede nella transazione corrente"""
+        year, seq = split_offer_number(data.get('offer_number'))
+        header = {k: v for k, v in data.items() if k != 'tabs'}
+        summary = build_summary(data)
+
+        conn.execute(
+            """INSERT INTO offers (id, offer_number, year, seq, date, customer, customer_email,
+                                   status, description, total_price, product_count,
+                                   data, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET
+                   offer_number = excluded.offer_number,
+                   year = excluded.year,
+                   seq = excluded.seq,
+                   date = excluded.date,
+                   customer = excluded.customer,
+                   customer_email = excluded.customer_email,
+                   status = excluded.status,
+                   description = excluded.description,
+                   total_price = excluded.total_price,
+                   product_count = excluded.product_count,
+                   data = excluded.data,
+                   updated_at = excluded.updated_at""",
+            (data['id'], summary['offer_number'], year, seq, summary['date'], summary['customer'],
+             data.get('customer_email'), summary['status'], summary['description'],
+             summary['total_price'], summary['product_count'],
+             json.dumps(header, ensure_ascii=False), datetime.now().isoformat())
+        )
+
+        conn.execute("DELETE FROM tabs WHERE offer_id = ?", (data['id'],))
+        conn.executemany(
+            "INSERT INTO tabs (offer_id, position, type, data) VALUES (?, ?, ?, ?)",
+            [(data['id'], position, tab.get('type'), json.dumps(tab, ensure_ascii=False))
+             for position, tab in enumerate(data['tabs'])]
+        )
+        self._write_terms(conn, data)
+
+    def _write_terms(self, conn, data):
+        """Sostituisce le voci dell'offerta nell'indice invertito di ricerca"""
+        conn.execute("DELETE FROM search_terms WHERE offer_id = ?", (data['id'],))
+        conn.executemany(
+            "INSERT INTO search_terms (term, offer_id, field, tf) VALUES (?, ?, ?, ?)",
+            [(term, data['id'], field, tf)
+             for (term, field), tf in extract_postings(data).items()]
+        )
+
+    def _write_summary(self, conn, data):
+        """Ricalcola le colonne di riepilogo di un'offerta già presente"""
+        summary = build_summary(data)
+        conn.execute(
+            """UPDATE offers SET customer = ?, date = ?, status = ?, description = ?,
+                                 total_price = ?, product_count = ?
+               WHERE id = ?""",
+            (summary['customer'], summary['date'], summary['status'], summary['description'],
+             summary['total_price'], summary['product_count'], summary['id'])
+        )
+
+    def save_offer(self, data):
+        """Salva (inserisce o aggiorna) un'offerta completa in modo transazionale"""
+        with self._transaction() as conn:
+            self._write_offer(conn, data)
+        self.generation += 1
+
+    def save_offers(self, offers):
+        """Salva più offerte complete in un'unica transazione"""
+        if not offers:
+            return
+        with self._transaction() as conn:
+            for data in offers:
+                self._write_offer(conn, data)
+        self.generation += 1
+
+    def delete_offer(self, offer_id):
+        """Elimina un'offerta e le sue schede"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM offers WHERE id = ?", (offer_id,))
+        self.generation += 1
+
+    def get_offer(self, offer_id):
+        """
+        Restituisce un'offerta completa con le schede
+
+        Returns:
+            dict: Dati dell'offerta o None se non esiste
+        """
+        return self._read_offer(self._connect(), offer_id)
+
+    def _read_offer(self, conn, offer_id):
+        row = conn.execute("SELECT data FROM offers WHERE id = ?", (offer_id,)).fetchone()
+        if row is None:
+            return None
+
+        offer = json.loads(row['data'])
+        offer['tabs'] = [
+            json.loads(tab['data']) for tab in conn.execute(
+                "SELECT data FROM tabs WHERE offer_id = ? ORDER BY position", (offer_id,))
+        ]
+        return offer
+
+    def offer_ids(self, year=None, status=None, customer=None):
+        """
+        Restituisce gli ID delle offerte che rispettano i filtri, dalla più vecchia
+
+        Args:
+            year (str): Anno del numero offerta (YYYY-XXXX)
+            status (str): Stato dell'offerta
+            customer (str): Parte del nome del cliente (senza distinzione maiuscole/minuscole)
+
+        Returns:
+            list: ID delle offerte
+        """
+        clauses, params = [], []
+        if year:
+            clauses.append("year = ?")
+            params.append(str(year))
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if customer:
+            clauses.append("customer LIKE ?")
+            params.append(f"%{customer}%")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT id FROM offers {where} ORDER BY year, seq, id", params
+        )
+        return [row['id'] for row in rows]
+
+    def list_summaries_page(self, status=None, after=None, before=None, limit=20):
+        """
+        Restituisce una pagina di riepiloghi con paginazione keyset
+
+        Il costo non dipende dalla profondità della pagina: la posizione viene
+        cercata sull'indice (anno, progressivo, id) invece di saltare le righe.
+
+        Args:
+            status (str): Filtra per stato (in_attesa/accettata), None per tutte
+            after (tuple): Cursore (numero offerta, id) - restituisce le offerte meno recenti
+            before (tuple): Cursore (numero offerta, id) - restituisce le offerte più recenti
+            limit (int): Numero massimo di offerte
+
+        Returns:
+            tuple: (riepiloghi dal più recente, True se oltre la pagina ci sono altre offerte)
+        """
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+
+        cursor = after or before
+        if cursor:
+            offer_number, offer_id = cursor
+            year, seq = split_offer_number(offer_number)
+            # Senza id il cursore esclude tutte le offerte con lo stesso numero
+            if offer_id is None:
+                offer_id = '' if after else '\uffff'
+            # Confronto tra tuple: SQLite lo risolve con una ricerca sull'indice
+            op = '<' if after else '>'
+            where.append(f"(year, seq, id) {op} (?, ?, ?)")
+            params += [year, seq, offer_id]
+
+        direction = 'ASC' if before and not after else 'DESC'
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM offers"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY year {direction}, seq {direction}, id {direction} LIMIT ?"
+        params.append(limit + 1)
+
+        rows = [dict(row) for row in self._connect().execute(sql, params)]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'ASC':
+            rows.reverse()
+        return rows, has_more
+
+    def totals_columns(self):
+        """
+        Restituisce le colonne usate per le aggregazioni dei totali
+
+        Returns:
+            list: Righe (date, customer, status, total_price) di tutte le offerte
+        """
+        return self._connect().execute(
+            "SELECT date, customer, status, total_price FROM offers"
+        ).fetchall()
+
+    def status_counts(self):
+        """
+        Restituisce numero di offerte e valore totale per stato
+
+        Legge la tabella status_counts mantenuta dai trigger, senza scorrere le offerte.
+
+        Returns:
+            dict: stato -> {'count': int, 'total': float}
+        """
+        return {
+            row['status']: {'count': row['count'], 'total': round(row['total'], 2)}
+            for row in self._connect().execute(
+                "SELECT status, count, total FROM status_counts WHERE count > 0")
+        }
+
+    def search(self, query, status=None, limit=50):
+        """
+        Ricerca a testo libero sull'indice invertito
+
+        Ogni parola della ricerca vale come prefisso ("lava" trova "lavastoviglie")
+        e deve comparire nell'offerta; i risultati sono ordinati per rilevanza.
+
+        Args:
+            query (str): Testo cercato
+            status (str): Filtra per stato, None per tutte
+            limit (int): Numero massimo di risultati
+
+        Returns:
+            list: Riepiloghi (colonne di SUMMARY_COLUMNS) con il campo score
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+
+        conn = self._connect()
+        total_offers = conn.execute("SELECT COUNT(*) FROM offers").fetchone()[0]
+        postings_by_term = {
+            query_term: conn.execute(
+                "SELECT term, offer_id, field, tf FROM search_terms WHERE term >= ? AND term < ?",
+                (query_term, prefix_upper_bound(query_term))
+            ).fetchall()
+            for query_term in query_terms
+        }
+        scores = score_postings(query_terms, postings_by_term, total_offers)
+        if not scores:
+            return []
+
+        placeholders = ', '.join('?' * len(scores))
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)}, year, seq FROM offers WHERE id IN ({placeholders})"
+        params = list(scores)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        rows = [dict(row) for row in conn.execute(sql, params)]
+
+        # A parità di punteggio prima le offerte più recenti
+        rows.sort(key=lambda row: (scores[row['id']], row['year'], row['seq']), reverse=True)
+        results = []
+        for row in rows[:limit]:
+            del row['year'], row['seq']
+            row['score'] = round(scores[row['id']], 3)
+            results.append(row)
+        return results
+
+    def load_all_offers(self):
+        """
+        Restituisce tutte le offerte complete di schede con due sole query
+
+        Returns:
+            list: Lista di dizionari con i dati completi delle offerte
+        """
+        conn = self._connect()
+        offers = {}
+        for row in conn.execute("SELECT id, data FROM offers"):
+            offer = json.loads(row['data'])
+            offer['tabs'] = []
+            offers[row['id']] = offer
+
+        for row in conn.execute("SELECT offer_id, data FROM tabs ORDER BY offer_id, position"):
+            if row['offer_id'] in offers:
+                offers[row['offer_id']]['tabs'].append(json.loads(row['data']))
+
+        return list(offers.values())
+
+    # ------------------------------------------------------------------
+    # Coda dei lavori PDF
+    # ------------------------------------------------------------------
+
+    def enqueue_pdf_job(self, offer_id):
+        """
+        Accoda la generazione del PDF di un'offerta
+
+        Se per l'offerta c'è già un lavoro in coda non ancora iniziato viene
+        riusato: il worker legge comunque i dati più recenti.
+
+        Returns:
+            int: ID del lavoro
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM pdf_jobs WHERE offer_id = ? AND status = 'queued'", (offer_id,)
+            ).fetchone()
+            if row:
+                return row['id']
+            cursor = conn.execute(
+                "INSERT INTO pdf_jobs (offer_id, status, created_at) VALUES (?, 'queued', ?)",
+                (offer_id, datetime.now().isoformat())
+            )
+            return cursor.lastrowid
+
+    def claim_pdf_job(self):
+        """
+        Prende in carico il lavoro in coda più vecchio
+
+        Sono esclusi i lavori di offerte con un PDF già in generazione, così due
+        worker non scrivono mai lo stesso file.
+
+        Returns:
+            dict: Lavoro (id, offer_id, attempts) oppure None se la coda è vuota
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                """SELECT id, offer_id, attempts FROM pdf_jobs
+                   WHERE status = 'queued' AND offer_id NOT IN
+                       (SELECT offer_id FROM pdf_jobs WHERE status = 'running')
+                   ORDER BY id LIMIT 1"""
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """UPDATE pdf_jobs SET status = 'running', attempts = attempts + 1,
+                   started_at = ?, error = NULL WHERE id = ?""",
+                (datetime.now().isoformat(), row['id'])
+            )
+            return {'id': row['id'], 'offer_id': row['offer_id'], 'attempts': row['attempts'] + 1}
+
+    def finish_pdf_job(self, job_id, error=None):
+        """Chiude un lavoro (done o failed) ed elimina i lavori conclusi precedenti della stessa offerta"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE pdf_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                ('failed' if error else 'done', error, datetime.now().isoformat(), job_id)
+            )
+            conn.execute(
+                """DELETE FROM pdf_jobs WHERE status IN ('done', 'failed') AND id < ?
+                   AND offer_id = (SELECT offer_id FROM pdf_jobs WHERE id = ?)""",
+                (job_id, job_id)
+            )
+
+    def requeue_pdf_jobs(self, max_attempts):
+        """
+        Rimette in coda i lavori rimasti 'running' (processo interrotto durante la generazione)
+
+        I lavori che hanno già esaurito i tentativi vengono segnati come falliti.
+
+        Returns:
+            int: Numero di lavori rimessi in coda
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                """UPDATE pdf_jobs SET status = 'failed', finished_at = ?,
+                   error = 'Generazione interrotta troppe volte'
+                   WHERE status = 'running' AND attempts >= ?""",
+                (datetime.now().isoformat(), max_attempts)
+            )
+            return conn.execute(
+                "UPDATE pdf_jobs SET status = 'queued' WHERE status = 'running'"
+            ).rowcount
+
+    def get_pdf_job(self, offer_id):
+        """Restituisce l'ultimo lavoro PDF di un'offerta (o None)"""
+        row = self._connect().execute(
+            """SELECT id, offer_id, status, attempts, error, created_at, started_at, finished_at
+               FROM pdf_jobs WHERE offer_id = ? ORDER BY id DESC LIMIT 1""",
+            (offer_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    # ------------------------------------------------------------------
+    # Contatore
+    # ------------------------------------------------------------------
+
+    def next_offer_number(self, year=None):
+        """Incrementa atomicamente il contatore e restituisce il numero YYYY-XXXX"""
+        year = year or str(datetime.now().year)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM counter WHERE year = ?", (year,)).fetchone()
+            value = (row['value'] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO counter (year, value) VALUES (?, ?)", (year, value)
+            )
+        return f"{year}-{value:04d}"
+
+    # ------------------------------------------------------------------
+    # Migrazione dal layout data/<CLIENTE>/<NUMERO>/dati_offerta.json
+    # ------------------------------------------------------------------
+
+    def get_meta(self, key, default=None):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def is_migrated(self):
+        """Indica se la migrazione dai file JSON è già stata eseguita"""
+        return self.get_meta('json_migrated_at') is not None
+
+    def migrate_from_json(self, data_folder):
+        """
+        Importa in un'unica transazione tutte le offerte e il contatore dai file JSON
+
+        Args:
+            data_folder (str): Cartella dati con il layout <CLIENTE>/<NUMERO>/dati_offerta.json
+
+        Returns:
+            int: Numero di offerte importate
+        """
+        offers = []
+        for customer_folder in sorted(os.listdir(data_folder)):
+            customer_path = os.path.join(data_folder, customer_folder)
+            if not os.path.isdir(customer_path) or customer_folder.startswith(('_', '.')):
+                continue
+
+            for offer_folder in sorted(os.listdir(customer_path)):
+                json_path = os.path.join(customer_path, offer_folder, "dati_offerta.json")
+                if not os.path.isfile(json_path):
+                    continue
+                try:
+                    with open(json_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception as e:
+                    logging.info(f"Migrazione: impossibile leggere {json_path}: {e}")
+                    continue
+                if not data.get('id'):
+                    logging.info(f"Migrazione: offerta senza ID saltata: {json_path}")
+                    continue
+                upgrade_offer(data)
+                offers.append(data)
+
+        # Il contatore riparte dal valore più alto tra counter.json e le offerte presenti
+        counter = {}
+        counter_file = os.path.join(data_folder, "counter.json")
+        if os.path.exists(counter_file):
+            try:
+                with open(counter_file, 'r') as f:
+                    counter = {str(k): int(v) for k, v in json.load(f).items()}
+            except Exception as e:
+                logging.info(f"Migrazione: contatore non leggibile: {e}")
+        for data in offers:
+            year, seq = split_offer_number(data.get('offer_number'))
+            if year.isdigit():
+                counter[year] = max(counter.get(year, 0), seq)
+
+        with self._transaction() as conn:
+            for data in offers:
+                self._write_offer(conn, data)
+            for year, value in counter.items():
+                conn.execute(
+                    """INSERT INTO counter (year, value) VALUES (?, ?)
+                       ON CONFLICT(year) DO UPDATE SET value = MAX(value, excluded.value)""",
+                    (year, value)
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated_at', ?)",
+                (datetime.now().isoformat(),)
+            )
+
+        self.generation += 1
+        logging.info(f"Migrazione completata: {len(offers)} offerte importate in {self.db_path}")
+        return len(offers)
+
+
+class _Transaction:
+    """Context manager per una transazione BEGIN IMMEDIATE con commit/rollback"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+if __name__ == '__main__':
+    # Migrazione manuale: python -m models.store [cartella_dati]
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    OfferStore(os.path.join(folder, STORE_FILENAME)).migrate_from_json(folder)
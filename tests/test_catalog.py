@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import shutil
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from models import catalog as catalog_module
+from models.catalog import OfferCatalog
+from models.offer_index import OfferIndex
+from models.store import OfferStore, STORE_FILENAME
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    # Controllo degli mtime anche dove inotify è disponibile: refresh(force=True) è deterministico
+    monkeypatch.setattr(catalog_module, 'INotify', None)
+    data_folder = str(tmp_path / 'data')
+    os.makedirs(data_folder)
+    store = OfferStore(os.path.join(data_folder, STORE_FILENAME))
+    return OfferCatalog(store, data_folder, index=OfferIndex(data_folder))
+
+
+def write_offer(catalog, offer_id, offer_number, customer='ACME'):
+    offer = {'id': offer_id, 'offer_number': offer_number, 'customer': customer,
+             'status': 'in_attesa', 'tabs': []}
+    json_path = catalog.json_path_for(offer)
+    os.makedirs(os.path.dirname(json_path), exist_ok=True)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(offer, f)
+    return json_path
+
+
+def test_external_add_and_delete_update_store_and_index(catalog):
+    catalog.refresh(force=True)
+    json_path = write_offer(catalog, 'a', '2025-0001')
+    catalog.refresh(force=True)
+    assert catalog.get('a') is not None
+    assert catalog.store.get_offer('a') is not None
+    assert catalog.index.lookup('a')[2] == json_path
+
+    shutil.rmtree(os.path.dirname(json_path))
+    catalog.refresh(force=True)
+    assert catalog.get('a') is None
+    assert catalog.store.get_offer('a') is None
+    assert catalog.index.lookup('a') is None
+    assert catalog.index.id_for_number('2025-0001') is None
+
+
+def test_external_rename_moves_the_index_entry(catalog):
+    old_path = write_offer(catalog, 'a', '2025-0001')
+    catalog.refresh(force=True)
+
+    new_path = write_offer(catalog, 'a', '2025-0002')
+    shutil.rmtree(os.path.dirname(old_path))
+    catalog.refresh(force=True)
+
+    assert catalog.index.lookup('a')[2] == new_path
+    assert catalog.index.id_for_number('2025-0002') == 'a'
+    assert catalog.index.id_for_number('2025-0001') is None
+    assert catalog.store.get_offer('a')['offer_number'] == '2025-0002'
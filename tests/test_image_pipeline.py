@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from PIL import Image
+
+from utils import image_pipeline
+
+
+def make_image(path, size=(400, 300)):
+    Image.new('RGB', size, (200, 30, 30)).save(path)
+    return str(path)
+
+
+def test_variant_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_pipeline, 'MAX_CACHED_VARIANTS', 3)
+    monkeypatch.setattr(image_pipeline, '_variants', type(image_pipeline._variants)())
+    path = make_image(tmp_path / 'foto.png')
+
+    for width in range(10, 60, 10):
+        image_pipeline.prepare_image(path, width, width)
+    assert len(image_pipeline._variants) == 3
+
+    # La variante scartata dalla memoria viene ritrovata su disco
+    variant_path, width, height = image_pipeline.prepare_image(path, 10, 10)
+    assert os.path.exists(variant_path) and (width, height) == (10, 7.5)
+
+
+def test_different_images_are_prepared_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_pipeline, '_variants', type(image_pipeline._variants)())
+    # Due immagini su lock di preparazione diversi
+    stripes, paths = set(), []
+    for i in range(64):
+        path = str(tmp_path / f"foto{i}.png")
+        stripe = hash(path) % len(image_pipeline._build_locks)
+        if stripe not in stripes:
+            stripes.add(stripe)
+            paths.append(make_image(path))
+        if len(paths) == 2:
+            break
+
+    started = threading.Barrier(2, timeout=5)
+    build_variant = image_pipeline._build_variant
+
+    def build_together(*args):
+        # Si blocca se la preparazione di un'immagine impedisce quella dell'altra
+        started.wait()
+        return build_variant(*args)
+
+    monkeypatch.setattr(image_pipeline, '_build_variant', build_together)
+    results = []
+    threads = [threading.Thread(target=lambda p=p: results.append(image_pipeline.prepare_image(p, 50, 50)))
+               for p in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 2
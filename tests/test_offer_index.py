@@ -0,0 +1,61 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from models import offer_index
+from models.offer_index import OfferIndex
+
+
+def make_offer(offer_id, offer_number, customer='Cliente'):
+    return {'id': offer_id, 'offer_number': offer_number, 'customer': customer,
+            'offer_description': 'Offerta', 'tabs': []}
+
+
+def test_journal_is_replayed_on_load(tmp_path):
+    index = OfferIndex(str(tmp_path))
+    index.upsert(make_offer('a', '2025-0001'))
+    index.upsert(make_offer('b', '2025-0002'))
+    index.upsert(make_offer('a', '2025-0003'))   # numero cambiato
+    index.remove('b')
+
+    reloaded = OfferIndex(str(tmp_path))
+    assert [entry['id'] for entry in reloaded.entries()] == ['a']
+    assert reloaded.id_for_number('2025-0003') == 'a'
+    assert reloaded.id_for_number('2025-0001') is None
+    assert reloaded.id_for_number('2025-0002') is None
+    assert reloaded.lookup('a') == ('Cliente', '2025-0003',
+                                    os.path.join(str(tmp_path), 'CLIENTE', '2025-0003', 'dati_offerta.json'))
+
+
+def test_compaction_moves_the_journal_into_the_snapshot(tmp_path):
+    index = OfferIndex(str(tmp_path), journal_threshold=10 ** 9)
+    for i in range(5):
+        index.upsert(make_offer(f"id{i}", f"2025-{i:04d}"))
+    index.compact()
+    assert os.path.getsize(index.journal_file) == 0
+
+    index.remove('id0')
+    reloaded = OfferIndex(str(tmp_path))
+    assert sorted(entry['id'] for entry in reloaded.entries()) == ['id1', 'id2', 'id3', 'id4']
+
+
+def test_index_is_published_only_when_fully_loaded(tmp_path, monkeypatch):
+    writer = OfferIndex(str(tmp_path))
+    for i in range(3):
+        writer.upsert(make_offer(f"id{i}", f"2025-{i:04d}"))
+
+    index = OfferIndex(str(tmp_path))
+    apply_record = offer_index._apply_record
+    seen = []
+
+    def checking_apply(by_id, by_number, record):
+        # Le letture senza lock durante il caricamento non trovano un indice parziale
+        seen.append(index._by_id)
+        return apply_record(by_id, by_number, record)
+
+    monkeypatch.setattr(offer_index, '_apply_record', checking_apply)
+    assert index.get('id2') is not None
+    assert seen and all(by_id is None for by_id in seen)
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from models.pdf_queue import PdfJobQueue
+from models.store import OfferStore, STORE_FILENAME
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OfferStore(str(tmp_path / STORE_FILENAME))
+    for offer_id in ('a', 'b'):
+        store.save_offer({'id': offer_id, 'offer_number': f"2025-{offer_id}", 'customer': 'Cliente',
+                          'status': 'in_attesa', 'tabs': []})
+    return store
+
+
+def test_enqueue_reuses_the_queued_job(store):
+    first = store.enqueue_pdf_job('a')
+    assert store.enqueue_pdf_job('a') == first
+    assert store.enqueue_pdf_job('b') != first
+
+
+def test_claim_skips_offers_already_running(store):
+    store.enqueue_pdf_job('a')
+    job = store.claim_pdf_job()
+    assert job['offer_id'] == 'a' and job['attempts'] == 1
+
+    # Nuovo lavoro per la stessa offerta: resta in coda finché il primo non termina
+    second = store.enqueue_pdf_job('a')
+    store.enqueue_pdf_job('b')
+    assert store.claim_pdf_job()['offer_id'] == 'b'
+    assert store.claim_pdf_job() is None
+
+    store.finish_pdf_job(job['id'])
+    assert store.claim_pdf_job()['id'] == second
+
+
+def test_finish_keeps_only_the_latest_job(store):
+    assert store.claim_pdf_job() is None and store.get_pdf_job('a') is None
+
+    store.enqueue_pdf_job('a')
+    first = store.claim_pdf_job()
+    store.finish_pdf_job(first['id'], error='errore')
+    assert store.get_pdf_job('a')['status'] == 'failed'
+
+    store.enqueue_pdf_job('a')
+    second = store.claim_pdf_job()
+    store.finish_pdf_job(second['id'])
+    count = store._connect().execute("SELECT COUNT(*) FROM pdf_jobs WHERE offer_id = 'a'").fetchone()[0]
+    assert count == 1 and store.get_pdf_job('a')['status'] == 'done'
+
+
+def test_interrupted_jobs_are_requeued_until_max_attempts(store):
+    store.enqueue_pdf_job('a')
+    store.claim_pdf_job()
+    assert store.requeue_pdf_jobs(max_attempts=2) == 1
+    store.claim_pdf_job()
+    # Secondo tentativo interrotto: il lavoro viene segnato come fallito
+    assert store.requeue_pdf_jobs(max_attempts=2) == 0
+    assert store.get_pdf_job('a')['status'] == 'failed'
+
+
+def test_queue_renders_and_records_failures(store):
+    rendered = []
+
+    def render(offer_id):
+        if offer_id == 'b':
+            raise ValueError('immagine mancante')
+        rendered.append(offer_id)
+
+    queue = PdfJobQueue(store, render)
+    queue.enqueue('a')
+    queue.enqueue('b')
+    while queue._process_next():
+        pass
+
+    assert rendered == ['a']
+    assert store.get_pdf_job('a')['status'] == 'done'
+    assert store.get_pdf_job('b')['status'] == 'failed'
+    assert store.get_pdf_job('b')['error'] == 'immagine mancante'
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from models.preview_sweeper import PreviewSweeper
+from utils import preview_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(preview_cache, '_previews', type(preview_cache._previews)())
+    monkeypatch.setattr(preview_cache, '_sizes', {'bytes': 0})
+    monkeypatch.setattr(preview_cache, '_limits', dict(preview_cache._limits))
+    monkeypatch.setattr(preview_cache, '_stats', dict.fromkeys(preview_cache._stats, 0))
+
+
+def test_pages_of_a_session_keep_their_own_preview():
+    a = preview_cache.store_preview('s1', 'pagina-a', b'A', fingerprint='fa', total=10)
+    b = preview_cache.store_preview('s1', 'pagina-b', b'B', fingerprint='fb', total=20)
+    assert preview_cache.load_preview(a, 's1') == b'A'
+    assert preview_cache.load_preview(a, 's2') is None
+
+    # Una nuova anteprima sostituisce solo quella della stessa pagina
+    a2 = preview_cache.store_preview('s1', 'pagina-a', b'A2', fingerprint='fa2', total=30)
+    assert preview_cache.load_preview(a, 's1') is None
+    assert preview_cache.find_preview('s1', 'pagina-a', 'fa2') == a2
+    assert preview_cache.find_preview('s1', 'pagina-a', 'fa') is None
+    assert preview_cache.last_total('s1', 'pagina-a') == 30
+
+    preview_cache.discard_previews('s1', 'pagina-a')
+    assert preview_cache.load_preview(a2, 's1') is None
+    assert preview_cache.load_preview(b, 's1') == b'B'
+    preview_cache.discard_previews('s1')
+    assert preview_cache.stats()['count'] == 0
+
+
+def test_total_quota_evicts_least_recently_used():
+    preview_cache.set_limits(max_bytes=30, session_max_bytes=100)
+    first = preview_cache.store_preview('s1', 'p', b'x' * 10)
+    second = preview_cache.store_preview('s2', 'p', b'x' * 10)
+    third = preview_cache.store_preview('s3', 'p', b'x' * 10)
+    preview_cache.load_preview(first, 's1')   # la prima torna la più recente
+
+    preview_cache.store_preview('s4', 'p', b'x' * 10)
+    assert preview_cache.load_preview(second, 's2') is None
+    assert preview_cache.load_preview(first, 's1') is not None
+    assert preview_cache.load_preview(third, 's3') is not None
+    assert preview_cache.stats()['bytes'] == 30
+
+
+def test_session_quota_only_evicts_that_session():
+    preview_cache.set_limits(max_bytes=1000, session_max_bytes=25)
+    other = preview_cache.store_preview('s2', 'p', b'x' * 20)
+    old = preview_cache.store_preview('s1', 'p1', b'x' * 10)
+    preview_cache.store_preview('s1', 'p2', b'x' * 10)
+    preview_cache.store_preview('s1', 'p3', b'x' * 10)
+    assert preview_cache.load_preview(old, 's1') is None
+    assert preview_cache.load_preview(other, 's2') is not None
+
+
+def test_sweeper_limits_apply_to_previews_already_in_memory():
+    for session_id in ('s1', 's2', 's3'):
+        preview_cache.store_preview(session_id, 'p', b'x' * 100)
+    sweeper = PreviewSweeper(quota_bytes=150, session_quota_bytes=100)
+    assert preview_cache.stats()['bytes'] == 100
+    assert sweeper.sweep() == 0
+
+
+def test_sweep_discards_expired_previews():
+    token = preview_cache.store_preview('s1', 'p', b'x' * 10)
+    assert preview_cache.sweep(max_age=3600) == (0, 0)
+    # Scadenza negativa: ogni anteprima risulta inutilizzata da troppo tempo
+    assert preview_cache.sweep(max_age=-1) == (1, 10)
+    assert preview_cache.load_preview(token, 's1') is None
+
+
+def test_sweeper_applies_quotas_to_staged_files(tmp_path):
+    for session_id, count in (('s1', 3), ('s2', 1)):
+        folder = tmp_path / session_id
+        folder.mkdir()
+        for i in range(count):
+            path = folder / f"{i}.png"
+            path.write_bytes(b'x' * 10)
+            # Date recenti ma in ordine: 0.png è il file usato meno di recente
+            now = preview_cache.time.time() - 10 + i
+            os.utime(path, (now, now))
+
+    sweeper = PreviewSweeper([str(tmp_path)], quota_bytes=1000, session_quota_bytes=20)
+    assert sweeper.sweep() == 10
+    assert sorted(os.listdir(tmp_path / 's1')) == ['1.png', '2.png']
+    assert os.listdir(tmp_path / 's2') == ['0.png']
@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import importlib
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Client dell'applicazione avviata su una copia senza dati (data/ vuota)"""
+    for name in ('app.py', 'auth.py'):
+        shutil.copy(os.path.join(REPO_ROOT, name), tmp_path)
+    for name in ('models', 'utils', 'templates'):
+        shutil.copytree(os.path.join(REPO_ROOT, name), tmp_path / name,
+                        ignore=shutil.ignore_patterns('__pycache__'))
+    shutil.copytree(os.path.join(REPO_ROOT, 'static', 'img'), tmp_path / 'static' / 'img')
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for module in [m for m in sys.modules if m in ('app', 'auth') or m.split('.')[0] in ('models', 'utils')]:
+        monkeypatch.delitem(sys.modules, module)
+    app_module = importlib.import_module('app')
+
+    app_module.app.config['TESTING'] = True
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
+
+
+def single_product_fields(index, name):
+    return {
+        f'tab_{index}type_': 'single_product',
+        f'product_{index}name_': name,
+        f'unit_{index}price_': '100',
+        f'quantity_{index}': '1',
+    }
+
+
+def test_preview_tab_uses_form_index_after_skipped_tab(client):
+    form = {'customer': 'Cliente', 'offer_number': '2025-0001', 'preview_page': 'p1'}
+    form.update(single_product_fields(0, 'Forno'))
+    form.update(single_product_fields(1, ''))   # senza nome: saltata da process_form_final
+    form.update(single_product_fields(2, 'Lavastoviglie'))
+
+    # Prima anteprima completa: copertina, due schede, condizioni
+    response = client.post('/preview_pdf', data=form)
+    assert response.json['pages'] is None
+
+    # La scheda tab_2 è la seconda impaginata: pagina 3 (il totale non cambia)
+    response = client.post('/preview_pdf', data=dict(form, preview_tab='2'))
+    assert response.json['pages'] == [3]
+
+    # La scheda saltata non ha pagine: anteprima completa
+    response = client.post('/preview_pdf', data=dict(form, preview_tab='1'))
+    assert response.json['pages'] is None
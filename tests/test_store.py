@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import sqlite3
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from models.store import OfferStore, STORE_FILENAME, SCHEMA_VERSION, split_offer_number
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OfferStore(str(tmp_path / STORE_FILENAME))
+
+
+def make_offer(offer_id, offer_number, status='in_attesa', customer='Cliente', price=100):
+    return {
+        'id': offer_id,
+        'offer_number': offer_number,
+        'date': '01/01/2025',
+        'customer': customer,
+        'status': status,
+        'offer_description': f"Offerta {offer_number}",
+        'tabs': [{'type': 'single_product', 'product_name': 'Forno',
+                  'unit_price': str(price), 'quantity': '1'}],
+    }
+
+
+def test_save_read_and_delete_offer(store):
+    offer = make_offer('a', '2025-0001', price=1234)
+    offer['tabs'].append({'type': 'multi_product',
+                          'products': [['Piano', 'P1', '10', '2', ''], ['Cappa', 'C1', '5', '1', '']]})
+    store.save_offer(offer)
+    assert store.get_offer('a') == offer
+    assert store.offer_ids() == ['a']
+
+    rows, _ = store.list_summaries_page()
+    assert rows[0]['total_price'] == 1260.0   # 1234 + 25, arrotondato alla decina come nel PDF
+    assert rows[0]['product_count'] == 3
+
+    store.delete_offer('a')
+    assert store.get_offer('a') is None
+    assert store._connect().execute("SELECT COUNT(*) FROM tabs").fetchone()[0] == 0
+
+
+def test_offer_ids_filters(store):
+    store.save_offers([make_offer('a', '2024-0001', customer='Rossi'),
+                       make_offer('b', '2025-0001', status='accettata', customer='Bianchi'),
+                       make_offer('c', '2025-0002', customer='Rossini')])
+    assert store.offer_ids() == ['a', 'b', 'c']
+    assert store.offer_ids(year=2025) == ['b', 'c']
+    assert store.offer_ids(status='accettata') == ['b']
+    assert store.offer_ids(customer='ross') == ['a', 'c']
+
+
+def test_next_offer_number_is_per_year(store):
+    assert store.next_offer_number('2025') == '2025-0001'
+    assert store.next_offer_number('2025') == '2025-0002'
+    assert store.next_offer_number('2026') == '2026-0001'
+
+
+def test_status_counts_follow_inserts_updates_and_deletes(store):
+    store.save_offers([make_offer('a', '2025-0001', price=100),
+                       make_offer('b', '2025-0002', price=200),
+                       make_offer('c', '2025-0003', status='accettata', price=50)])
+    assert store.status_counts() == {'in_attesa': {'count': 2, 'total': 300.0},
+                                     'accettata': {'count': 1, 'total': 50.0}}
+
+    store.save_offer(make_offer('a', '2025-0001', status='accettata', price=120))
+    store.delete_offer('b')
+    assert store.status_counts() == {'accettata': {'count': 2, 'total': 170.0}}
+
+
+def test_search_matches_prefixes_of_every_term(store):
+    store.save_offers([make_offer('a', '2025-0001', customer='Ristorante Da Mario'),
+                       make_offer('b', '2025-0002', customer='Pizzeria Marione', status='accettata'),
+                       make_offer('c', '2025-0003', customer='Bar Centrale')])
+    assert {row['id'] for row in store.search('mario')} == {'a', 'b'}
+    assert [row['id'] for row in store.search('rist mar')] == ['a']
+    assert [row['id'] for row in store.search('mario', status='accettata')] == ['b']
+    assert store.search('forno centr')[0]['id'] == 'c'
+    assert store.search('inesistente') == []
+
+    # L'indice segue le modifiche e le eliminazioni
+    store.save_offer(make_offer('c', '2025-0003', customer='Bar Stazione'))
+    store.delete_offer('a')
+    assert store.search('centrale') == []
+    assert [row['id'] for row in store.search('mario')] == ['b']
+
+
+def test_version_1_store_is_upgraded_in_place(tmp_path):
+    """Archivio creato dalla prima versione (senza user_version né riepiloghi)"""
+    db_path = str(tmp_path / STORE_FILENAME)
+    offer = make_offer('a', '2025-0001', status='accettata', price=99)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE offers (id TEXT PRIMARY KEY, offer_number TEXT NOT NULL, year TEXT NOT NULL,
+                             seq INTEGER NOT NULL, date TEXT, customer TEXT, customer_email TEXT,
+                             status TEXT, data TEXT NOT NULL, updated_at TEXT);
+        CREATE INDEX idx_offers_order ON offers(year, seq);
+        CREATE INDEX idx_offers_number ON offers(offer_number);
+        CREATE TABLE tabs (offer_id TEXT NOT NULL REFERENCES offers(id) ON DELETE CASCADE,
+                           position INTEGER NOT NULL, type TEXT, data TEXT NOT NULL,
+                           PRIMARY KEY (offer_id, position));
+        CREATE TABLE counter (year TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    header = {k: v for k, v in offer.items() if k != 'tabs'}
+    conn.execute("INSERT INTO offers (id, offer_number, year, seq, customer, status, data)"
+                 " VALUES ('a', '2025-0001', '2025', 1, 'Cliente', 'accettata', ?)", (json.dumps(header),))
+    conn.execute("INSERT INTO tabs VALUES ('a', 0, 'single_product', ?)", (json.dumps(offer['tabs'][0]),))
+    conn.commit()
+    conn.close()
+
+    store = OfferStore(db_path)
+    conn = store._connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    index_columns = [row['name'] for row in conn.execute("PRAGMA index_info(idx_offers_order)")]
+    assert index_columns == ['year', 'seq', 'id']
+
+    rows, _ = store.list_summaries_page()
+    assert rows[0]['total_price'] == 100.0 and rows[0]['product_count'] == 1
+    assert store.status_counts() == {'accettata': {'count': 1, 'total': 100.0}}
+    assert [row['id'] for row in store.search('forno')] == ['a']
+    assert store.enqueue_pdf_job('a') == 1
+
+    # Una seconda apertura non rifà l'aggiornamento
+    conn.execute("UPDATE offers SET total_price = 1 WHERE id = 'a'")
+    OfferStore(db_path)
+    assert conn.execute("SELECT total_price FROM offers").fetchone()[0] == 1
+
+
+def test_migrate_from_json(tmp_path):
+    data_folder = tmp_path / 'data'
+    for offer in (make_offer('a', '2025-0007', customer='Rossi'), make_offer('b', '2024-0003')):
+        folder = data_folder / offer['customer'].upper() / offer['offer_number']
+        folder.mkdir(parents=True)
+        (folder / 'dati_offerta.json').write_text(json.dumps(offer), encoding='utf-8')
+    (data_folder / 'counter.json').write_text(json.dumps({'2025': 5}), encoding='utf-8')
+
+    store = OfferStore(str(data_folder / STORE_FILENAME))
+    assert not store.is_migrated()
+    assert store.migrate_from_json(str(data_folder)) == 2
+    assert store.is_migrated()
+    assert store.get_offer('a')['customer'] == 'Rossi'
+    # Il contatore riparte dal numero più alto tra counter.json e le offerte
+    assert store.next_offer_number('2025') == '2025-0008'
+    assert store.next_offer_number('2024') == '2024-0004'
+
+
+@pytest.fixture
+def populated_store(store):
+    offers = []
+    for year in ('2024', '2025'):
+        for seq in range(1, 41):
+            status = 'accettata' if seq % 3 == 0 else 'in_attesa'
+            offers.append(make_offer(f"{year}-{seq:03d}", f"{year}-{seq:04d}", status=status))
+    # Numeri ripetuti (stesso numero, ID diversi) e un numero non standard
+    offers += [make_offer('dup-a', '2025-0007'), make_offer('dup-b', '2025-0007', status='accettata'),
+               make_offer('manuale', 'PROVA')]
+    store.save_offers(offers)
+    return store, offers
+
+
+def expected_order(offers, status=None):
+    """ID dal più recente, come ORDER BY year DESC, seq DESC, id DESC"""
+    selected = [o for o in offers if status in (None, o['status'])]
+    selected.sort(key=lambda o: split_offer_number(o['offer_number']) + (o['id'],), reverse=True)
+    return [o['id'] for o in selected]
+
+
+def walk_pages(store, status, limit):
+    """Scorre tutte le pagine in avanti, poi all'indietro dall'ultima"""
+    forward, pages = [], []
+    rows, has_more = store.list_summaries_page(status=status, limit=limit)
+    while True:
+        pages.append(rows)
+        forward += [row['id'] for row in rows]
+        if not has_more:
+            break
+        last = rows[-1]
+        rows, has_more = store.list_summaries_page(
+            status=status, after=(last['offer_number'], last['id']), limit=limit)
+
+    backward = [row['id'] for row in pages[-1]]
+    rows = pages[-1]
+    for expected_page in reversed(pages[:-1]):
+        first = rows[0]
+        rows, _ = store.list_summaries_page(
+            status=status, before=(first['offer_number'], first['id']), limit=limit)
+        assert rows == expected_page
+        backward = [row['id'] for row in rows] + backward
+    return forward, backward
+
+
+@pytest.mark.parametrize('status', [None, 'in_attesa', 'accettata'])
+@pytest.mark.parametrize('limit', [1, 7, 20])
+def test_keyset_pages_cover_every_offer_once(populated_store, status, limit):
+    store, offers = populated_store
+    forward, backward = walk_pages(store, status, limit)
+    assert forward == expected_order(offers, status)
+    assert backward == forward
+
+
+def test_keyset_cursor_without_id_skips_the_whole_number(populated_store):
+    store, offers = populated_store
+    rows, _ = store.list_summaries_page(after=('2025-0008', None), limit=3)
+    assert [row['id'] for row in rows] == ['dup-b', 'dup-a', '2025-007']
+    rows, _ = store.list_summaries_page(before=('2025-0007', None), limit=1)
+    assert [row['id'] for row in rows] == ['2025-008']
+
+
+@pytest.mark.parametrize('status', [None, 'accettata'])
+@pytest.mark.parametrize('cursor', ['after', 'before'])
+def test_keyset_page_is_an_index_search(populated_store, status, cursor):
+    store, _ = populated_store
+    conn = store._connect()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        store.list_summaries_page(status=status, limit=5, **{cursor: ('2025-0010', '2025-010')})
+    finally:
+        conn.set_trace_callback(None)
+
+    select = next(sql for sql in statements if sql.startswith('SELECT'))
+    detail = ' '.join(row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + select))
+    # Il cursore delimita la ricerca su tutte le colonne dell'indice, non solo sull'anno
+    assert 'SCAN' not in detail and '(year,seq,id)' in detail
@@ -0,0 +1,47 @@
+import io
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from werkzeug.datastructures import FileStorage
+
+from utils.upload_staging import stage_upload, save_upload
+
+
+def upload(content=b'immagine', filename='foto.PNG'):
+    return FileStorage(stream=io.BytesIO(content), filename=filename)
+
+
+def test_stage_upload_writes_each_image_once(tmp_path):
+    path = stage_upload(upload(), str(tmp_path), 'sessione')
+    assert os.path.dirname(path) == str(tmp_path / 'sessione')
+    assert path.endswith('.png')
+    assert stage_upload(upload(), str(tmp_path), 'sessione') == path
+    assert stage_upload(upload(b'altra'), str(tmp_path), 'sessione') != path
+
+
+def test_restaging_refreshes_only_the_access_time(tmp_path):
+    path = stage_upload(upload(), str(tmp_path), 'sessione')
+    os.utime(path, ns=(1_000_000_000, 2_000_000_000))
+
+    stage_upload(upload(), str(tmp_path), 'sessione')
+    st = os.stat(path)
+    # La data di modifica identifica le varianti di stampa e i frammenti in cache
+    assert st.st_mtime_ns == 2_000_000_000
+    assert st.st_atime_ns > 1_000_000_000
+
+
+def test_save_upload_promotes_the_staged_copy(tmp_path):
+    staged = stage_upload(upload(), str(tmp_path), 'sessione')
+    dest = str(tmp_path / 'offerta.png')
+
+    assert save_upload(upload(), dest, str(tmp_path), 'sessione') is True
+    assert not os.path.exists(staged)
+    with open(dest, 'rb') as f:
+        assert f.read() == b'immagine'
+
+    # Senza copia in staging il file ricevuto viene salvato normalmente
+    assert save_upload(upload(b'nuova'), str(tmp_path / 'altra.png'), str(tmp_path), 'sessione') is False
@@ -0,0 +1,85 @@
+import os
+import threading
+from collections import OrderedDict
+
+from reportlab.lib.utils import ImageReader
+
+# Numero massimo di immagini decodificate tenute in memoria (loghi + immagini prodotto)
+MAX_CACHED_IMAGES = 64
+
+_lock = threading.Lock()
+_images = OrderedDict()   # (percorso, mtime) -> ImageReader già decodificato
+_sizes = {}               # (percorso, mtime, max_w, max_h) -> (larghezza, altezza)
+
+
+def fit_size(img_width, img_height, max_width, max_height):
+    """
+    Calcola le dimensioni di disegno di un'immagine entro un riquadro, mantenendo le proporzioni
+
+    Le immagini più piccole del riquadro restano alla loro dimensione naturale.
+
+    Returns:
+        tuple: (larghezza, altezza)
+    """
+    if img_width > max_width or img_height > max_height:
+        aspect_ratio = img_width / img_height
+        if img_width > img_height:
+            return max_width, max_width / aspect_ratio
+        return max_height * aspect_ratio, max_height
+    return img_width, img_height
+
+
+def _load(key):
+    """Restituisce l'immagine per (percorso, mtime), decodificandola se assente; da chiamare con _lock"""
+    img = _images.get(key)
+    if img is not None:
+        _images.move_to_end(key)
+        return img
+
+    img = ImageReader(key[0])
+    # Forza la decodifica ora, così i documenti successivi riusano i pixel già pronti
+    img.getRGBData()
+    _images[key] = img
+    while len(_images) > MAX_CACHED_IMAGES:
+        old_key, _ = _images.popitem(last=False)
+        for size_key in [k for k in _sizes if k[:2] == old_key]:
+            del _sizes[size_key]
+    return img
+
+
+def get_image(path):
+    """
+    Restituisce l'ImageReader di un file, decodificato una sola volta per processo
+
+    La chiave include l'mtime: se il file viene sostituito l'immagine viene riletta.
+
+    Raises:
+        OSError: se il file non esiste o non è leggibile
+    """
+    key = (path, os.stat(path).st_mtime_ns)
+    with _lock:
+        return _load(key)
+
+
+def get_fitted_image(path, max_width, max_height):
+    """
+    Restituisce un'immagine in cache con le dimensioni adattate al riquadro indicato
+
+    Returns:
+        tuple: (ImageReader, larghezza, altezza)
+    """
+    key = (path, os.stat(path).st_mtime_ns)
+    with _lock:
+        img = _load(key)
+        size_key = key + (max_width, max_height)
+        size = _sizes.get(size_key)
+        if size is None:
+            size = _sizes[size_key] = fit_size(*img.getSize(), max_width, max_height)
+    return (img,) + size
+
+
+def clear():
+    """Svuota la cache (utile se le immagini vengono modificate in blocco)"""
+    with _lock:
+        _images.clear()
+        _sizes.clear()
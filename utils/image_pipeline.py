@@ -0,0 +1,178 @@
+import io
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from utils.image_cache import fit_size, get_image, get_fitted_image
+
+# Risoluzione di stampa delle varianti: oltre questa i pixel non si vedono sulla carta
+PRINT_DPI = 200
+
+# Qualità delle varianti JPEG; le immagini con pochi colori restano sempre PNG (Flate)
+JPEG_QUALITY = 85
+MAX_PNG_COLORS = 256
+
+# Sottocartella, accanto all'originale, con varianti e metadati
+VARIANTS_FOLDER = "_print"
+
+# Numero massimo di varianti ricordate in memoria (i file restano su disco)
+MAX_CACHED_VARIANTS = 256
+
+_lock = threading.Lock()
+_variants = OrderedDict()   # (percorso, mtime, max_w, max_h) -> (percorso variante, larghezza, altezza)
+
+# Lock per immagine (a strisce, in numero fisso): due thread non preparano la
+# stessa immagine né riscrivono insieme i suoi metadati, le altre procedono
+_build_locks = [threading.Lock() for _ in range(16)]
+
+
+def _sidecar_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, VARIANTS_FOLDER, name + ".json")
+
+
+def _read_sidecar(path, mtime_ns):
+    """Metadati dell'originale salvati accanto alle varianti, se ancora validi"""
+    try:
+        with open(_sidecar_path(path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('source_mtime_ns') == mtime_ns else None
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _flatten(img):
+    """Converte in RGB componendo l'eventuale trasparenza su fondo bianco"""
+    if img.mode in ('P', 'LA') or (img.mode == 'RGB' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+    if img.mode == 'RGBA':
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def _build_variant(path, meta, max_width, max_height):
+    """Crea la variante di stampa per il riquadro indicato e la registra nei metadati"""
+    width, height = fit_size(meta['width'], meta['height'], max_width, max_height)
+    # Pixel necessari alla risoluzione di stampa, mai più dell'originale
+    scale = min(1.0, width * PRINT_DPI / 72 / meta['width'], height * PRINT_DPI / 72 / meta['height'])
+    size = (max(1, round(meta['width'] * scale)), max(1, round(meta['height'] * scale)))
+
+    with Image.open(path) as img:
+        img = _flatten(img)
+        if size != img.size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        # PNG (Flate, senza perdita) per loghi e disegni; per le foto il JPEG
+        # se risulta più piccolo
+        encoded = io.BytesIO()
+        img.save(encoded, 'PNG', optimize=True)
+        ext = '.png'
+        if img.getcolors(MAX_PNG_COLORS) is None:
+            jpeg = io.BytesIO()
+            img.save(jpeg, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            if jpeg.tell() < encoded.tell():
+                encoded, ext = jpeg, '.jpg'
+
+    folder, name = os.path.split(path)
+    box = f"{max_width}x{max_height}"
+    variant_name = f"{os.path.splitext(name)[0]}.{box}{ext}"
+    variant_path = os.path.join(folder, VARIANTS_FOLDER, variant_name)
+    tmp_path = f"{variant_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded.getvalue())
+    os.replace(tmp_path, variant_path)
+
+    meta['variants'][box] = {'file': variant_name, 'width': size[0], 'height': size[1]}
+    logging.info(f"Immagine {name}: variante {box} {size[0]}x{size[1]} {ext[1:].upper()}")
+    return variant_path, width, height
+
+
+def _cached_variant(key):
+    """Variante già nota in memoria (segnata come usata di recente), o None"""
+    with _lock:
+        result = _variants.get(key)
+        if result is not None:
+            _variants.move_to_end(key)
+        return result
+
+
+def prepare_image(path, max_width, max_height):
+    """
+    Restituisce la variante di stampa di un'immagine per un riquadro, creandola se manca
+
+    La variante è ridimensionata alla risoluzione di stampa (PRINT_DPI), con la
+    trasparenza composta su bianco; dimensioni dell'originale e varianti sono
+    salvate in un file JSON, così l'originale non viene più decodificato.
+
+    Args:
+        path (str): Percorso dell'immagine originale
+        max_width (float): Larghezza massima sulla pagina (pt)
+        max_height (float): Altezza massima sulla pagina (pt)
+
+    Returns:
+        tuple: (percorso variante, larghezza, altezza) con le dimensioni di disegno in pt
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    key = (path, mtime_ns, max_width, max_height)
+    result = _cached_variant(key)
+    if result is not None:
+        return result
+
+    # Decodifica e codifica fuori da _lock: gli altri thread usano le varianti pronte
+    with _build_locks[hash(path) % len(_build_locks)]:
+        result = _cached_variant(key)
+        if result is not None:
+            return result
+
+        meta = _read_sidecar(path, mtime_ns)
+        if meta is None:
+            with Image.open(path) as img:
+                width, height = img.size
+            meta = {'source_mtime_ns': mtime_ns, 'width': width, 'height': height, 'variants': {}}
+
+        box = f"{max_width}x{max_height}"
+        variant = meta['variants'].get(box)
+        variant_path = variant and os.path.join(os.path.dirname(path), VARIANTS_FOLDER, variant['file'])
+        if variant_path and os.path.exists(variant_path):
+            result = (variant_path,) + fit_size(meta['width'], meta['height'], max_width, max_height)
+        else:
+            os.makedirs(os.path.join(os.path.dirname(path), VARIANTS_FOLDER), exist_ok=True)
+            result = _build_variant(path, meta, max_width, max_height)
+            _write_json(_sidecar_path(path), meta)
+
+        with _lock:
+            _variants[key] = result
+            while len(_variants) > MAX_CACHED_VARIANTS:
+                _variants.popitem(last=False)
+        return result
+
+
+def get_print_image(path, max_width, max_height):
+    """
+    Immagine da disegnare nel PDF: la variante di stampa, decodificata una volta per processo
+
+    Se la variante non può essere creata si usa l'originale.
+
+    Returns:
+        tuple: (ImageReader, larghezza, altezza)
+    """
+    try:
+        variant_path, width, height = prepare_image(path, max_width, max_height)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logging.info(f"Variante di stampa non disponibile per {path}: {e}")
+        return get_fitted_image(path, max_width, max_height)
+    return get_image(variant_path), width, height
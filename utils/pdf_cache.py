@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Campi dell'offerta che finiscono nel PDF (stato, ID e date di sistema no)
+RENDER_FIELDS = ('offer_number', 'date', 'customer', 'customer_email', 'address',
+                 'offer_description', 'tabs')
+
+# Da incrementare quando cambia l'impaginazione: invalida tutti i PDF già generati
+LAYOUT_VERSION = 1
+
+# Estensione del file con l'impronta, salvato accanto al PDF
+FINGERPRINT_SUFFIX = ".sha256"
+
+# Numero massimo di frammenti (pagine di una scheda già impaginate) tenuti in memoria
+MAX_FRAGMENTS = 256
+
+# Blocchi letti per calcolare l'hash del contenuto di un PDF
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_fragments = OrderedDict()   # chiave -> operazioni di disegno registrate
+_content_hashes = {}         # percorso PDF -> (dimensione, mtime, hash del contenuto)
+_stats = {'hits': 0, 'misses': 0, 'fragment_hits': 0, 'fragment_misses': 0}
+
+
+def _digest(payload, asset_paths):
+    """Hash SHA-256 di un JSON canonico, con dimensione e data di modifica dei file usati"""
+    assets = []
+    for path in asset_paths:
+        try:
+            st = os.stat(path)
+            assets.append([path, st.st_size, st.st_mtime_ns])
+        except OSError:
+            assets.append([path, None, None])
+
+    payload = dict(payload, layout=LAYOUT_VERSION, assets=assets)
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def render_fingerprint(offerta, asset_paths=()):
+    """
+    Calcola l'impronta di tutto ciò che determina il contenuto del PDF
+
+    Args:
+        offerta (dict): Dati dell'offerta
+        asset_paths (iterable): File usati nel PDF (loghi, immagini prodotto);
+            contribuiscono con dimensione e data di modifica
+
+    Returns:
+        str: Hash SHA-256 esadecimale
+    """
+    return _digest({'offer': {field: offerta.get(field) for field in RENDER_FIELDS}}, asset_paths)
+
+
+def is_current(pdf_path, fingerprint):
+    """
+    Indica se il PDF esiste ed è stato generato con la stessa impronta
+
+    Aggiorna il contatore di riscontri/mancati usato da stats().
+    """
+    try:
+        with open(pdf_path + FINGERPRINT_SUFFIX, 'r') as f:
+            current = f.read().strip() == fingerprint and os.path.exists(pdf_path)
+    except OSError:
+        current = False
+    with _lock:
+        _stats['hits' if current else 'misses'] += 1
+    return current
+
+
+def store_fingerprint(pdf_path, fingerprint):
+    """Salva l'impronta del PDF appena generato"""
+    tmp_path = f"{pdf_path}{FINGERPRINT_SUFFIX}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(fingerprint)
+    os.replace(tmp_path, pdf_path + FINGERPRINT_SUFFIX)
+
+
+def content_hash(pdf_path):
+    """
+    Hash SHA-256 del contenuto del PDF, usato come ETag e negli URL versionati
+
+    Il file viene riletto solo quando cambiano dimensione o data di modifica
+    (ogni rigenerazione lo sostituisce con os.replace).
+
+    Raises:
+        OSError: Se il PDF non esiste
+    """
+    st = os.stat(pdf_path)
+    with _lock:
+        cached = _content_hashes.get(pdf_path)
+    if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return cached[2]
+
+    sha = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _lock:
+        _content_hashes[pdf_path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def fragment_key(tab, first_page, asset_paths=()):
+    """
+    Chiave del frammento PDF di una scheda
+
+    Il numero della prima pagina fa parte della chiave perché è stampato
+    nel piè di pagina.
+
+    Returns:
+        str: Hash SHA-256 esadecimale
+    """
+    return _digest({'tab': tab, 'first_page': first_page}, asset_paths)
+
+
+def load_fragment(key):
+    """Restituisce le operazioni di disegno in cache per la chiave (o None)"""
+    with _lock:
+        ops = _fragments.get(key)
+        if ops is not None:
+            _fragments.move_to_end(key)
+        _stats['fragment_hits' if ops is not None else 'fragment_misses'] += 1
+    return ops
+
+
+def store_fragment(key, ops):
+    """Salva le operazioni di disegno di una scheda, scartando le meno usate oltre MAX_FRAGMENTS"""
+    with _lock:
+        _fragments[key] = ops
+        _fragments.move_to_end(key)
+        while len(_fragments) > MAX_FRAGMENTS:
+            _fragments.popitem(last=False)
+
+
+def stats():
+    """
+    Statistiche della cache dei PDF per questo processo
+
+    Returns:
+        dict: hits, misses e hit_ratio dei PDF completi (None se non ci sono
+        richieste) e gli stessi valori per i frammenti delle schede
+    """
+    with _lock:
+        counters = dict(_stats)
+
+    def ratio(hits, misses):
+        return round(hits / (hits + misses), 3) if hits + misses else None
+
+    return {
+        'hits': counters['hits'],
+        'misses': counters['misses'],
+        'hit_ratio': ratio(counters['hits'], counters['misses']),
+        'fragments': {
+            'hits': counters['fragment_hits'],
+            'misses': counters['fragment_misses'],
+            'hit_ratio': ratio(counters['fragment_hits'], counters['fragment_misses']),
+        },
+    }
@@ -1,88 +1,122 @@
+import io
 import os
+import copy
+import threading
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import Paragraph
 from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.utils import ImageReader
-import datetime
 from utils.format_utils import format_price
-
-def generate_pdf(offerta, app_root):
-    """Genera il PDF con i dati delle schede."""
-    # Assicuriamoci che tabs esista
-    if 'tabs' not in offerta or not isinstance(offerta['tabs'], list):
-        offerta['tabs'] = []
-    
-    # Inizializza il prezzo totale dell'offerta
-    total_offer_price = 0
-    
-    # Percorsi delle risorse
-    static_folder = os.path.join(app_root, 'static')
-    data_folder = os.path.join(app_root, 'data')
-    
-    # Crea le cartelle necessarie
-    customer_folder = os.path.join(data_folder, offerta['customer'].upper())
-    offer_folder = os.path.join(customer_folder, offerta['offer_number'])
-    os.makedirs(offer_folder, exist_ok=True)
-    
-    # Percorso del file PDF da generare
-    output_path = os.path.join(offer_folder, f"offerta_{offerta['offer_number']}.pdf")
-    
-    # Inizializza il canvas PDF
-    c = canvas.Canvas(output_path, pagesize=A4)
+from utils.image_pipeline import get_print_image
+from utils.text_layout import wrap_paragraph, fit_paragraph
+from utils import pdf_cache
+from models.offerta import Offerta
+
+# Loghi dell'intestazione (in static/img)
+LOGO_FILES = ('logo_valtservice.png', 'logo_zanussi.png')
+
+# Riquadro massimo (pt) dell'immagine nella pagina prodotto
+PRODUCT_IMAGE_BOX = (200, 150)
+
+# Nomi delle form XObject con la grafica fissa ripetuta su ogni pagina
+HEADER_FORM = "intestazione"
+FOOTER_FORM = "pie_di_pagina"
+
+# Coordinate verticali del piè di pagina (misurate dall'alto della pagina)
+FOOTER_OFFSET = 740
+
+# Stile personalizzato per i paragrafi
+CUSTOM_STYLE = ParagraphStyle(
+    name="CustomStyle",
+    fontSize=12,
+    leading=20,
+    spaceAfter=10,
+    fontName="Times-Roman",
+)
+
+# Descrizione in copertina: 14 pt se sta sotto DESCRIPTION_MAX_HEIGHT, altrimenti 12 pt
+DESCRIPTION_STYLE = ParagraphStyle(
+    name="DescriptionStyle",
+    fontSize=14,
+    fontName="Times-Roman",
+    leading=20
+)
+DESCRIPTION_FONT_SIZES = (14, 12)
+DESCRIPTION_MAX_HEIGHT = 200
+
+def define_page_templates(c, static_folder):
+    """
+    Registra intestazione e piè di pagina come form XObject del documento.
+
+    Loghi, linea separatrice e testi del piè di pagina vengono scritti una sola
+    volta nel PDF; ogni pagina li richiama con c.doForm(HEADER_FORM) e
+    c.doForm(FOOTER_FORM) invece di ridisegnarli.
+    """
     width, height = A4
-    
-    # Stile personalizzato per i paragrafi
-    custom_style = ParagraphStyle(
-        name="CustomStyle",
-        fontSize=12,
-        leading=20,
-        spaceAfter=10,
-        fontName="Times-Roman",
-    )
-    
-    # Carica e posiziona i logo
-    logo_valtservice_path = os.path.join(static_folder, 'img', 'logo_valtservice.png')
-    logo_zanussi_path = os.path.join(static_folder, 'img', 'logo_zanussi.png')
-    
+    logo_valtservice_path, logo_zanussi_path = (os.path.join(static_folder, 'img', name) for name in LOGO_FILES)
+
+    c.beginForm(HEADER_FORM)
     try:
-        img = ImageReader(logo_valtservice_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 200, 100
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width = max_width
-                new_height = new_width / aspect_ratio
-            else:
-                new_height = max_height
-                new_width = new_height * aspect_ratio
-        else:
-            new_width, new_height = img_width, img_height
+        img, new_width, new_height = get_print_image(logo_valtservice_path, 200, 100)
         c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
     except Exception as e:
         print("Logo non caricato:", e)
-    
+
     try:
-        img = ImageReader(logo_zanussi_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 80, 50
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width2 = max_width
-                new_height2 = new_width2 / aspect_ratio
-            else:
-                new_height2 = max_height
-                new_width2 = new_height2 * aspect_ratio
-        else:
-            new_width2, new_height2 = img_width, img_height
+        img, new_width2, new_height2 = get_print_image(logo_zanussi_path, 80, 50)
         c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
     except Exception as e:
         print("Logo Zanussi non caricato:", e)
-    
+
     # Linea separatrice dopo i loghi
+    c.setLineWidth(1)
+    c.setStrokeColorRGB(0, 0, 0, alpha=1)
     c.line(50, height - 105, width - 50, height - 105)
+    c.endForm()
+
+    c.beginForm(FOOTER_FORM)
+    c.setFillColorRGB(0, 0, 0, alpha=1)
+    c.setFont("Times-Roman", 9)
+    diff = FOOTER_OFFSET
+    c.drawString(50, height - diff, "Valtservice")
+    c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
+    c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
+    c.drawString(450, height - diff, "Filiale di Sondrio:")
+    c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
+    c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
+    c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
+    c.drawString(450, height - diff - 40, "info@valtservice.com")
+    c.setFont("Times-Roman", 7)
+    c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
+    c.endForm()
+
+def resolve_image_path(image_path, app_root):
+    """Path completo di un'immagine prodotto in base all'origine del path (/static/... o assoluto)"""
+    if image_path.startswith('/static'):
+        return os.path.join(app_root, image_path.lstrip('/'))
+    return image_path
+
+def offer_asset_paths(offerta, app_root):
+    """File letti durante l'impaginazione dell'offerta: loghi e immagini prodotto"""
+    paths = [os.path.join(app_root, 'static', 'img', name) for name in LOGO_FILES]
+    for tab in offerta.get('tabs') or []:
+        if isinstance(tab, dict) and tab.get('type') != 'multi_product' and tab.get('product_image_path'):
+            paths.append(resolve_image_path(tab['product_image_path'], app_root))
+    return paths
+
+def draw_page_number(c):
+    """Disegna il numero di pagina centrato in basso"""
+    width, height = A4
+    c.saveState()
+    c.setFont('Times-Roman', 9)
+    page_num = c.getPageNumber()
+    text = f"Pagina {page_num}" 
+    c.drawCentredString(width/2.0, height-FOOTER_OFFSET-80, text)
+    c.restoreState()
+
+def draw_cover_page(c, offerta):
+    """Disegna la pagina di copertina (cliente, oggetto e descrizione dell'offerta)"""
+    width, height = A4
+    c.doForm(HEADER_FORM)
     
     # Informazioni di base dell'offerta
     c.setFont("Times-Roman", 12)
@@ -126,35 +160,11 @@ def generate_pdf(offerta, app_root):
 
     description_text = offerta['offer_description']
 
-    # Prima verifica l'altezza con font 14
-    test_style = ParagraphStyle(
-        name="TestStyle",
-        fontSize=14,
-        fontName="Times-Roman",
-        leading=20
-    )
-    test_para = Paragraph(description_text, test_style)
+    # Font scelto in base all'altezza (misure in cache tra anteprime e PDF definitivo)
     available_width = width - 100
-    _, test_para_height = test_para.wrap(available_width, height - 410)
-
-    # Scegli il font in base all'altezza
-    if test_para_height < 200:
-        # Usa il font 14 se il testo è corto
-        font_size = 14
-    else:
-        # Altrimenti usa il font 12
-        font_size = 12
-
-    # Ora crea il paragrafo con il font scelto
-    final_style = ParagraphStyle(
-        name="DescriptionStyle",
-        fontSize=font_size,
-        fontName="Times-Roman",
-        leading=20
-    )
-    para = Paragraph(description_text, final_style)
-    _, para_height = para.wrap(available_width, height - 410)
-    para.drawOn(c, 50, height - 410 - para_height)
+    para, para_height = fit_paragraph(description_text, DESCRIPTION_STYLE, available_width,
+                                      DESCRIPTION_MAX_HEIGHT, DESCRIPTION_FONT_SIZES)
+    draw_paragraph(c, para, 50, height - 410 - para_height)
 
     # Calcola la posizione del testo finale basata sulla fine del paragrafo
     # La posizione finale del paragrafo è (height - 410 - para_height)
@@ -188,1024 +198,277 @@ def generate_pdf(offerta, app_root):
     
     
     # Footer
-    c.setFont("Times-Roman", 9)
-    diff = 740
-    c.drawString(50, height - diff, "Valtservice")
-    c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-    c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-    c.drawString(450, height - diff, "Filiale di Sondrio:")
-    c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-    c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-    c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-    c.drawString(450, height - diff - 40, "info@valtservice.com")
-    c.setFont("Times-Roman", 7)
-    c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
+    c.doForm(FOOTER_FORM)
     
     # numero di pagina 1
     c.setFont("Times-Roman", 9)
-    c.drawString(width/2, height - diff - 80, "Pagina 1")
-
-    def draw_page_number(canvas, doc):
-        """Disegna il numero di pagina centrato in basso"""
-        canvas.saveState()
-        canvas.setFont('Times-Roman', 9)
-        page_num = canvas.getPageNumber()
-        text = f"Pagina {page_num}" 
-        canvas.drawCentredString(width/2.0, height-diff-80, text)
-        canvas.restoreState()
-
-    # Processa i tab
-    for tab in offerta.get('tabs', []):
-        if tab["type"] == "multi_product":
-            products = tab.get('products', [])
-            max_items_per_page = tab.get('max_items_per_page', 3)
-            tab_total_price = 0
-
-            for i in range(0, len(products), max_items_per_page):
-                c.showPage()
-
-                # Intestazione nuova pagina
-                try:
-                    img = ImageReader(logo_valtservice_path)
-                    img_width, img_height = img.getSize()
-                    aspect_ratio = img_width / img_height
-                    max_width, max_height = 200, 100
-                    if img_width > max_width or img_height > max_height:
-                        if img_width > img_height:
-                            new_width = max_width
-                            new_height = new_width / aspect_ratio
-                        else:
-                            new_height = max_height
-                            new_width = new_height * aspect_ratio
-                    else:
-                        new_width, new_height = img_width, img_height
-                    c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-                except Exception as e:
-                    print("Errore caricamento logo_valtservice:", e)
-
-                try:
-                    img = ImageReader(logo_zanussi_path)
-                    img_width, img_height = img.getSize()
-                    aspect_ratio = img_width / img_height
-                    max_width, max_height = 80, 50
-                    if img_width > max_width or img_height > max_height:
-                        if img_width > img_height:
-                            new_width2 = max_width
-                            new_height2 = new_width2 / aspect_ratio
-                        else:
-                            new_height2 = max_height
-                            new_width2 = new_height2 * aspect_ratio
-                    else:
-                        new_width2, new_height2 = img_width, img_height
-                    c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-                except Exception as e:
-                    print("Errore caricamento logo_zanussi:", e)
-
-                c.setLineWidth(1)
-                c.setStrokeColorRGB(0, 0, 0, alpha=1)
-                c.line(50, height - 105, width - 50, height - 105)
-
-                page_products = products[i:i + max_items_per_page]
-                y_position = height - 150
-                for product in page_products:
-                    nome, _, prezzo_unitario, quantita, descrizione = product
-
-                    try:
-                        prezzo_unitario = float(prezzo_unitario)
-                        quantita = float(quantita)
-                        tab_total_price += prezzo_unitario * quantita
-                    except ValueError:
-                        prezzo_unitario = 0
-                        quantita = 0
-
-                    c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
-                    c.rect(50, y_position - 20, width - 100, 20, fill=1, stroke=0)
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.setFont("Times-Bold", 12)
-                    c.drawString(60, y_position - 15, f"NOME PRODOTTO: {nome}")
-                    c.line(50, y_position - 20, width - 50, y_position - 20)
-                    c.line(50, y_position, width - 50, y_position)
-
-                    y_position -= 40
-                    c.setFont("Times-Bold", 12)
-                    c.drawString(50, y_position, "DESCRIZIONE:")
-                    description_paragraph = Paragraph(descrizione, custom_style)
-                    available_width = width - 100
-                    _, para_height = description_paragraph.wrap(available_width, y_position - 15)
-                    description_paragraph.drawOn(c, 50, y_position - 5 - para_height)
-                    y_position -= 35 + para_height
-
-                    c.setFont("Times-Bold", 12)
-                    c.drawString(50, y_position, f"PREZZO UNITARIO: {format_price(prezzo_unitario)} €")
-                    c.drawString(300, y_position, f"QUANTITA': {quantita:.0f}")
-                    y_position -= 40
-
-                c.setFont("Times-Bold", 14)
-                c.drawString(50, height - 630, f"PREZZO FORNITURA: {format_price(tab_total_price)} €")
-                
-                # Aggiorna il prezzo totale dell'offerta
-                total_offer_price += tab_total_price
-
-                c.setDash(3, 2)
-                c.line(50, height - 655, width - 50, height - 655)
-                c.line(50, height - 660, width - 50, height - 660)
-                c.setDash()
-                
-                # Footer
-                c.setFont("Times-Roman", 9)
-                diff = 740
-                c.drawString(50, height - diff, "Valtservice")
-                c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-                c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-                c.drawString(450, height - diff, "Filiale di Sondrio:")
-                c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-                c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-                c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-                c.drawString(450, height - diff - 40, "info@valtservice.com")
-                c.setFont("Times-Roman", 7)
-                c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
-
-                draw_page_number(c, None)
+    c.drawString(width/2, height - FOOTER_OFFSET - 80, "Pagina 1")
+    c.showPage()
 
+def draw_tab_pages(c, tab, app_root):
+    """Disegna le pagine di una scheda, chiudendo ogni pagina"""
+    if tab["type"] == "multi_product":
+        draw_multi_product_pages(c, tab)
+    else:
+        draw_product_page(c, tab, app_root)
+
+class _FragmentRecorder:
+    """
+    Canvas che inoltra le chiamate al canvas reale registrandole.
+
+    La registrazione delle pagine di una scheda (il frammento) può poi essere
+    ripetuta su un altro documento senza ricalcolare l'impaginazione: testi,
+    prezzi formattati e paragrafi già spezzati in righe.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.ops = []
+
+    def __getattr__(self, name):
+        attr = getattr(self.canvas, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return attr(*args, **kwargs)
+        return call
+
+def draw_paragraph(c, para, x, y):
+    """Disegna un paragrafo già misurato; in registrazione viene salvato il paragrafo"""
+    if isinstance(c, _FragmentRecorder):
+        c.ops.append((None, (para, x, y), {}))
+        c = c.canvas
+    # Copia: drawOn imposta il canvas sul paragrafo, condiviso tra documenti e worker
+    copy.copy(para).drawOn(c, x, y)
+
+def draw_tab_fragment(c, tab, app_root):
+    """
+    Disegna le pagine di una scheda riusando il frammento in cache se la scheda non è cambiata
+
+    La chiave comprende il contenuto della scheda, le immagini usate e il
+    numero della prima pagina (stampato nel piè di pagina).
+    """
+    key = pdf_cache.fragment_key(tab, c.getPageNumber(), offer_asset_paths({'tabs': [tab]}, app_root))
+    ops = pdf_cache.load_fragment(key)
+    if ops is None:
+        recorder = _FragmentRecorder(c)
+        draw_tab_pages(recorder, tab, app_root)
+        pdf_cache.store_fragment(key, recorder.ops)
+        return
+
+    for name, args, kwargs in ops:
+        if name is None:
+            draw_paragraph(c, *args)
         else:
-            # Pagina per prodotto singolo
-            c.showPage()
+            getattr(c, name)(*args, **kwargs)
 
-            try:
-                img = ImageReader(logo_valtservice_path)
-                img_width, img_height = img.getSize()
-                aspect_ratio = img_width / img_height
-                max_width, max_height = 200, 100
-                if img_width > max_width or img_height > max_height:
-                    if img_width > img_height:
-                        new_width = max_width
-                        new_height = new_width / aspect_ratio
-                    else:
-                        new_height = max_height
-                        new_width = new_height * aspect_ratio
-                else:
-                    new_width, new_height = img_width, img_height
-                c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-            except Exception as e:
-                print("Errore caricamento logo_valtservice:", e)
+def draw_multi_product_pages(c, tab):
+    """Disegna le pagine di una scheda multi-prodotto, max_items_per_page prodotti per pagina"""
+    width, height = A4
+    products = tab.get('products', [])
+    max_items_per_page = tab.get('max_items_per_page', 3)
+    tab_total_price = 0
 
-            try:
-                img = ImageReader(logo_zanussi_path)
-                img_width, img_height = img.getSize()
-                aspect_ratio = img_width / img_height
-                max_width, max_height = 80, 50
-                if img_width > max_width or img_height > max_height:
-                    if img_width > img_height:
-                        new_width2 = max_width
-                        new_height2 = new_width2 / aspect_ratio
-                    else:
-                        new_height2 = max_height
-                        new_width2 = new_height2 * aspect_ratio
-                else:
-                    new_width2, new_height2 = img_width, img_height
-                c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-            except Exception as e:
-                print("Errore caricamento logo_zanussi:", e)
-
-            product_code = tab.get('product_code', '')
-            product_name = tab.get('product_name', '')
-            description = tab.get('description', '')
-            power = tab.get('power_w', '')
-            volts = tab.get('volts', '')
-            size = tab.get('size', '')
-            pos = tab.get('posizione', '')
+    for i in range(0, len(products), max_items_per_page):
+        # Intestazione nuova pagina
+        c.doForm(HEADER_FORM)
 
-            try:
-                unit_price = float(tab.get('unit_price', 0))
-            except ValueError:
-                unit_price = 0
+        page_products = products[i:i + max_items_per_page]
+        y_position = height - 150
+        for product in page_products:
+            nome, _, prezzo_unitario, quantita, descrizione = product
 
             try:
-                quantity = float(tab.get('quantity', 0))
+                prezzo_unitario = float(prezzo_unitario)
+                quantita = float(quantita)
+                tab_total_price += prezzo_unitario * quantita
             except ValueError:
-                quantity = 0
+                prezzo_unitario = 0
+                quantita = 0
 
-            prezzo_list = unit_price * quantity
-
-
-            c.line(50, height - 105, width - 50, height - 105)
-        
-            c.setLineWidth(1)
-            c.setDash(6, 4)
-            c.line(50, height - 675, width - 50, height - 675)
-            c.line(50, height - 680, width - 50, height - 680)
-            c.setDash()
-
-            new_width = 0  # Default in caso non ci sia immagine
-            
-            if tab.get('product_image_path'):
-                try:
-                    # Path completo in base all'origine del path
-                    if tab['product_image_path'].startswith('/static'):
-                        img_path = os.path.join(app_root, tab['product_image_path'].lstrip('/'))
-                    else:
-                        img_path = tab['product_image_path']
-                    
-                    img = ImageReader(img_path)
-                    img_width, img_height = img.getSize()
-                    aspect_ratio = img_width / img_height
-                    
-                    max_width, max_height = 200, 150
-                    if img_width > max_width or img_height > max_height:
-                        if img_width > img_height:
-                            new_width = max_width
-                            new_height = new_width / aspect_ratio
-                        else:
-                            new_height = max_height
-                            new_width = new_height * aspect_ratio
-                    else:
-                        new_width, new_height = img_width, img_height
-                    
-                    x_pos, y_pos = 50, height - 320  
-                    c.drawImage(img, x_pos, y_pos, width=new_width, height=new_height)
-                except Exception as e:
-                    print(f"Could not load the product image: {e}")
-                    new_width = 0
-
-            fix = 180
-            sp = 25
+            c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
+            c.rect(50, y_position - 20, width - 100, 20, fill=1, stroke=0)
+            c.setFillColorRGB(0, 0, 0, alpha=1)
             c.setFont("Times-Bold", 12)
+            c.drawString(60, y_position - 15, f"NOME PRODOTTO: {nome}")
+            c.line(50, y_position - 20, width - 50, y_position - 20)
+            c.line(50, y_position, width - 50, y_position)
 
-            text = [
-                f"NOME PRODOTTO: {product_name}",
-                f"CARATTERISTICHE TECNICHE",
-                f"TENSIONE:                                     {volts}",
-                f"POTENZA:                                      {power}",
-                f"DIMENSIONI [LxPxH]:                {size}",
-                f"PREZZO UNITARIO:                   {format_price(unit_price)} €",
-                f"QUANTITA':                                   {quantity}",
-                f"POS: {pos}"
-            ]
-
-            for i in range(len(text)):
-                if i == 0:
-                    c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=0)
-                    c.rect(50, height - 150, width - 100, 20, fill=1, stroke=1)
-                    c.setLineWidth(1)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=1)
-                    c.line(50, height - 130, width - 50, height - 130)
-                    c.line(50, height - 150, width - 50, height - 150)
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.drawString(60, height - 145, text[i])
-                    c.setFont("Times-Roman", 12)
-                    c.drawString(50, height - 125, text[7])
-                elif i == 1:  # This now handles the "CARATTERISTICHE TECNICHE" section
-                    c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=0)
-                    c.rect(60 + new_width, height - (fix + 3), width - (new_width + 110), 20, fill=1, stroke=1)
-
-                    c.setLineWidth(1)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=1)
-                    c.line(60 + new_width, height - (fix - 17), width - 50, height - (fix - 17))
-                    c.line(60 + new_width, height - (fix + 3), width - 50, height - (fix + 3))
-
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.drawString(80 + new_width, height - (fix - 2), text[1])
-
-                    fix = fix + sp
-
-                elif i not in (0, 1, 7):
-                    c.setFont("Times-Roman", 12)
-                    c.setLineWidth(0.5)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=0.6)
-                    c.line(60 + new_width, height - (fix - 17), width - 50, height - (fix - 17))
-                    c.line(60 + new_width, height - (fix + 3), width - 50, height - (fix + 3))
-
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.drawString(80 + new_width, height - (fix - 2), text[i])
-
-                    fix = fix + sp
-
-            fix = 350
-            c.setFont("Times-Roman",12)
-            spazio = 10
-            c.setStrokeColorRGB(0, 0, 0, alpha=1)
-            product_description_text = f"{description}"
-            para = Paragraph(product_description_text, custom_style)
+            y_position -= 40
+            c.setFont("Times-Bold", 12)
+            c.drawString(50, y_position, "DESCRIZIONE:")
             available_width = width - 100
-            available_height = height - (fix + spazio + 23)
-            _, para_height3 = para.wrap(available_width, available_height)
-            para.drawOn(c, 50, height - (fix + spazio + 15) - para_height3)
-            c.setFont("Times-Bold",12)
-            c.setFillColorRGB(0, 0, 0, alpha=1)
-            c.drawString(50, height - (fix+spazio), f"DESCRIZIONE PRODOTTO")
-
-            y_position = height - 590
-            c.setFont("Times-Bold", 14)
-            if tab.get('discount_flag'):
-                c.setFillColorRGB(0, 0, 0, alpha=1)
-                c.drawString(60, y_position, f"PREZZO DI LISTINO:")
-
-                c.drawString(250, y_position, f"€ {format_price(prezzo_list)} iva ESCLUSA")
-                y_position -= 20
-                c.drawString(60, y_position, f"SCONTO")
-                c.drawString(250, y_position, f"{tab.get('discount', '0')} %")
-                y_position -= 20
-                try:
-                    discount = float(tab.get('discount', 0))
-                except ValueError:
-                    discount = 0
-                c.drawString(60, y_position, f"PREZZO SCONTATO:")
-                c.drawString(250, y_position, f"€ {format_price(prezzo_list - (discount / 100) * prezzo_list)} iva ESCLUSA")
-                # Aggiorna il prezzo totale dell'offerta
-                total_offer_price += (prezzo_list - (discount / 100) * prezzo_list)
-            else:
-                y_position1 = y_position - 40
-                c.setFillColorRGB(0, 0, 0, alpha=1)
-                c.drawString(60, y_position1, f"PREZZO SCONTATO:")
-                c.drawString(250, y_position1, f"€ {format_price(prezzo_list)} iva ESCLUSA")    
-                # Aggiorna il prezzo totale dell'offerta
-                total_offer_price += prezzo_list
-    
-            # Footer
-            c.setFont("Times-Roman", 9)
-            diff = 740
-            c.drawString(50, height - diff, "Valtservice")
-            c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-            c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-            c.drawString(450, height - diff, "Filiale di Sondrio:")
-            c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-            c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-            c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-            c.drawString(450, height - diff - 40, "info@valtservice.com")
-            c.setFont("Times-Roman", 7)
-            c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
-
-            draw_page_number(c, None)
-    
-    # Aggiungi pagina finale (condizioni)
-    c.showPage()
-    c.setFont("Times-Roman", 16)
-    
-    # Intestazione
-    try:
-        img = ImageReader(logo_valtservice_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 200, 100
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width = max_width
-                new_height = new_width / aspect_ratio
-            else:
-                new_height = max_height
-                new_width = new_height * aspect_ratio
-        else:
-            new_width, new_height = img_width, img_height
-        c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-    except Exception as e:
-        print("Logo non caricato:", e)
-    
-    try:
-        img = ImageReader(logo_zanussi_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 80, 50
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width2 = max_width
-                new_height2 = new_width2 / aspect_ratio
-            else:
-                new_height2 = max_height
-                new_width2 = new_height2 * aspect_ratio
-        else:
-            new_width2, new_height2 = img_width, img_height
-        c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-    except Exception as e:
-        print("Logo Zanussi non caricato:", e)
+            description_paragraph, para_height = wrap_paragraph(descrizione, CUSTOM_STYLE, available_width)
+            draw_paragraph(c, description_paragraph, 50, y_position - 5 - para_height)
+            y_position -= 35 + para_height
 
-    c.line(50, height - 105, width - 50, height - 105)
-
-    # Condizioni dell'offerta
-    c.setFont("Times-Roman", 12)
-    y_position = 650
-    sp = 35
-    c.drawString(60, y_position, "Garanzia:")
-    c.drawString(60, y_position-sp, "Validità Offerta:")
-    c.drawString(60, y_position-2*sp, "Termini di consegna:")
-    c.drawString(60, y_position-3*sp, "Spedizione :")
-    c.drawString(60, y_position-4*sp, "Pagamento:")
-    c.drawString(60, y_position-5*sp, "Oneri Bancari:")
-    c.drawString(60, y_position-6*sp, "Imballo:")
-    c.drawString(60, y_position-7*sp, "Montaggio:")
-    c.drawString(60,y_position-8*sp, "Allacciamenti:")
-    c.drawString(60, y_position-9*sp, "Riserve:")
-    c.drawString(60, y_position-10*sp, "IVA:")
-
-    c.drawString(250, y_position, "12 mesi su ricambi e manodopera")
-    c.drawString(250, y_position-sp, "30 gg")
-    c.drawString(250, y_position-2*sp, "Da convenire")
-    c.drawString(250, y_position-3*sp, "ns carico")
-    c.drawString(250, y_position-4*sp, "Da convenire")
-    c.drawString(250, y_position-5*sp, "A Vs. carico")
-    c.drawString(250, y_position-6*sp, "Standard, già compreso nel prezzo delle apparecchiature,")
-    c.drawString(250, y_position-6*sp-10, "Smaltimento a Vs. carico.")
-    c.drawString(250, y_position-7*sp, "Incluso, da Centri Servizi Tecnici ELECTROLUX SERVICE")
-    c.drawString(250, y_position-8*sp, "Elettrici ed idraulici esclusi")
-    c.drawString(250, y_position-9*sp, "Riserva di proprietà ai sensi dell'art. 1523 del Codice Civile.")
-    c.drawString(250, y_position-10*sp, "I prezzi indicati in offerta sono da considerarsi al netto IVA")
-    
-    c.setFont("Times-Bold", 14)
-    c.drawString(50,height-620, f"PREZZO TOTALE OFFERTA : {format_price(round(total_offer_price/10)*10)} €")
-
-    # Linea tratteggiata finale
-    c.setDash(3, 2)
-    c.line(50, height - 655, width - 50, height - 655)
-    c.line(50, height - 660, width - 50, height - 660)
-    c.setDash()
+            c.setFont("Times-Bold", 12)
+            c.drawString(50, y_position, f"PREZZO UNITARIO: {format_price(prezzo_unitario)} €")
+            c.drawString(300, y_position, f"QUANTITA': {quantita:.0f}")
+            y_position -= 40
 
-    # Footer
-    diff = 740
-    c.setFont("Times-Roman", 9)
-    c.drawString(50, height - diff, "Valtservice")
-    c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-    c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-    c.drawString(450, height - diff, "Filiale di Sondrio:")
-    c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-    c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-    c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-    c.drawString(450, height - diff - 40, "info@valtservice.com")
-    c.setFont("Times-Roman", 7)
-    c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
+        c.setFont("Times-Bold", 14)
+        c.drawString(50, height - 630, f"PREZZO FORNITURA: {format_price(tab_total_price)} €")
 
-    draw_page_number(c, None)
+        c.setDash(3, 2)
+        c.line(50, height - 655, width - 50, height - 655)
+        c.line(50, height - 660, width - 50, height - 660)
+        c.setDash()
+        
+        # Footer
+        c.doForm(FOOTER_FORM)
 
-    # Salva il PDF
-    c.save()
-    
-    return output_path
+        draw_page_number(c)
+        c.showPage()
 
-def generate_pdf_preview(offerta, app_root, output_path):
-    """Genera un PDF di anteprima con i dati delle schede senza creare cartelle cliente."""
-    # Assicuriamoci che tabs esista
-    if 'tabs' not in offerta or not isinstance(offerta['tabs'], list):
-        offerta['tabs'] = []
-    
-    # Inizializza il prezzo totale dell'offerta
-    total_offer_price = 0
-    
-    # Percorsi delle risorse
-    static_folder = os.path.join(app_root, 'static')
-    
-    # Inizializza il canvas PDF direttamente con il percorso di output
-    c = canvas.Canvas(output_path, pagesize=A4)
+def draw_product_page(c, tab, app_root):
+    """Disegna la pagina di una scheda prodotto singolo"""
     width, height = A4
-    
-    # Stile personalizzato per i paragrafi
-    custom_style = ParagraphStyle(
-        name="CustomStyle",
-        fontSize=12,
-        leading=20,
-        spaceAfter=10,
-        fontName="Times-Roman",
-    )
-    
-    # Carica e posiziona i logo
-    logo_valtservice_path = os.path.join(static_folder, 'img', 'logo_valtservice.png')
-    logo_zanussi_path = os.path.join(static_folder, 'img', 'logo_zanussi.png')
-    
-    try:
-        img = ImageReader(logo_valtservice_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 200, 100
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width = max_width
-                new_height = new_width / aspect_ratio
-            else:
-                new_height = max_height
-                new_width = new_height * aspect_ratio
-        else:
-            new_width, new_height = img_width, img_height
-        c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-    except Exception as e:
-        print("Logo non caricato:", e)
-    
-    try:
-        img = ImageReader(logo_zanussi_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 80, 50
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width2 = max_width
-                new_height2 = new_width2 / aspect_ratio
-            else:
-                new_height2 = max_height
-                new_width2 = new_height2 * aspect_ratio
-        else:
-            new_width2, new_height2 = img_width, img_height
-        c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-    except Exception as e:
-        print("Logo non caricato:", e)
+    c.doForm(HEADER_FORM)
 
-    # Linea separatrice dopo i loghi
-    c.line(50, height - 105, width - 50, height - 105)
-    
-    # Informazioni di base dell'offerta
-    c.setFont("Times-Roman", 12)
-    c.drawString(50, height - 140, f"Offerta N: {offerta['offer_number']} - Data: {offerta['date']}")
-    
-    # Informazioni cliente
-    text_width = c.stringWidth("Spett.le", "Times-Roman", 14)
-    c.drawString(((width - text_width) / 2), height - 200, "Spett.le")
-    c.setFont("Times-Bold", 14)
-    text = offerta['customer']
-    text_width = c.stringWidth(text, "Times-Bold", 14)
-    c.drawString(((width - text_width) / 2), height - 220, text)
-    
-    c.setFont("Times-Roman", 14)
-    text = offerta['customer_email']
-    email_width = c.stringWidth(text, "Times-Roman", 14)
-    c.drawString(((width - email_width) / 2), height - 260, text)
-    
-    c.setFont("Times-Roman", 14)
-    text = offerta['address']
-    text_width = c.stringWidth(text, "Times-Roman", 14)
-    c.drawString(((width - text_width) / 2), height - 240, text)
-    
-    # Linea tratteggiata
-    c.setDash(3, 2)
-    c.line(50, height - 320, width - 50, height - 320)
-    c.line(50, height - 325, width - 50, height - 325)
-    c.setDash()
-    
-    # Oggetto dell'offerta
-    c.setFont("Times-Bold", 14)
-    c.drawString(50, height - 360, "OGGETTO OFFERTA:")
-    text_width = c.stringWidth("OGGETTO OFFERTA: ", "Times-Bold", 14)
-    c.setFont("Times-Roman", 14)
-    c.drawString(text_width + 50, height - 360, "Abbiamo il piacere di presentare la ns. Offerta per la fornitura ")
-    c.drawString(text_width + 50, height - 375, "di attrezzature per cucina.")
-    
-    # Descrizione offerta
-    c.setFont("Times-Bold", 14)
-    c.drawString(50, height - 400, "DESCRIZIONE OFFERTA:")
-
-    description_text = offerta['offer_description']
-
-    # Prima verifica l'altezza con font 14
-    test_style = ParagraphStyle(
-        name="TestStyle",
-        fontSize=14,
-        fontName="Times-Roman",
-        leading=20
-    )
-    test_para = Paragraph(description_text, test_style)
-    available_width = width - 100
-    _, test_para_height = test_para.wrap(available_width, height - 410)
-
-    # Scegli il font in base all'altezza
-    if test_para_height < 200:
-        # Usa il font 14 se il testo è corto
-        font_size = 14
-    else:
-        # Altrimenti usa il font 12
-        font_size = 12
-
-    # Ora crea il paragrafo con il font scelto
-    final_style = ParagraphStyle(
-        name="DescriptionStyle",
-        fontSize=font_size,
-        fontName="Times-Roman",
-        leading=20
-    )
-    para = Paragraph(description_text, final_style)
-    _, para_height = para.wrap(available_width, height - 410)
-    para.drawOn(c, 50, height - 410 - para_height)
+    product_code = tab.get('product_code', '')
+    product_name = tab.get('product_name', '')
+    description = tab.get('description', '')
+    power = tab.get('power_w', '')
+    volts = tab.get('volts', '')
+    size = tab.get('size', '')
+    pos = tab.get('posizione', '')
 
-    # Calcola la posizione del testo finale basata sulla fine del paragrafo
-    # La posizione finale del paragrafo è (height - 410 - para_height)
-    # Aggiungiamo un po' di spazio (30 unità) prima del testo finale
-    text_y_position = height - 410 - para_height - 30
-
-    if text_y_position > (height - 610):
-        # Testo finale
-        c.setFont("Times-Roman", 12)
-        c.drawString(50, height - 620, "Per ulteriori dettagli e specifiche consultare l'interno dell'offerta.")
-        c.drawString(50, height - 640, "Augurando buon lavoro, porgiamo cordiali saluti.")
-
-        # Linea tratteggiata finale
-        c.setDash(3, 2)
-        c.line(50, height - 655, width - 50, height - 655)
-        c.line(50, height - 660, width - 50, height - 660)
-        c.setDash()
+    try:
+        unit_price = float(tab.get('unit_price', 0))
+    except ValueError:
+        unit_price = 0
 
-    else:
-        # Testo finale (posizionato dinamicamente)
-        c.setFont("Times-Roman", 12)
-        c.drawString(50, text_y_position + 10, "Per ulteriori dettagli e specifiche consultare l'interno dell'offerta.")
-        c.drawString(50, text_y_position - 5, "Augurando buon lavoro, porgiamo cordiali saluti.")
-            
-        # Linea tratteggiata finale (posizionata dinamicamente)
-        c.setDash(3, 2)
-        c.line(50, text_y_position - 20, width - 50, text_y_position - 20)
-        c.line(50, text_y_position - 25, width - 50, text_y_position - 25)
-        c.setDash()
+    try:
+        quantity = float(tab.get('quantity', 0))
+    except ValueError:
+        quantity = 0
 
-    
-    
-    # Footer
-    c.setFont("Times-Roman", 9)
-    diff = 740
-    c.drawString(50, height - diff, "Valtservice")
-    c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-    c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-    c.drawString(450, height - diff, "Filiale di Sondrio:")
-    c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-    c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-    c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-    c.drawString(450, height - diff - 40, "info@valtservice.com")
-    c.setFont("Times-Roman", 7)
-    c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
-    
-    # numero di pagina 1
-    c.setFont("Times-Roman", 9)
-    c.drawString(width/2, height - diff - 80, "Pagina 1")
+    prezzo_list = unit_price * quantity
 
-    def draw_page_number(canvas, doc):
-        """Disegna il numero di pagina centrato in basso"""
-        canvas.saveState()
-        canvas.setFont('Times-Roman', 9)
-        page_num = canvas.getPageNumber()
-        text = f"Pagina {page_num}" 
-        canvas.drawCentredString(width/2.0, height-diff-80, text)
-        canvas.restoreState()
+    c.setLineWidth(1)
+    c.setDash(6, 4)
+    c.line(50, height - 675, width - 50, height - 675)
+    c.line(50, height - 680, width - 50, height - 680)
+    c.setDash()
 
-    # Processa i tab
-    for tab in offerta.get('tabs', []):
-        if tab["type"] == "multi_product":
-            products = tab.get('products', [])
-            max_items_per_page = tab.get('max_items_per_page', 3)
-            tab_total_price = 0
-
-            for i in range(0, len(products), max_items_per_page):
-                c.showPage()
-
-                # Intestazione nuova pagina
-                try:
-                    img = ImageReader(logo_valtservice_path)
-                    img_width, img_height = img.getSize()
-                    aspect_ratio = img_width / img_height
-                    max_width, max_height = 200, 100
-                    if img_width > max_width or img_height > max_height:
-                        if img_width > img_height:
-                            new_width = max_width
-                            new_height = new_width / aspect_ratio
-                        else:
-                            new_height = max_height
-                            new_width = new_height * aspect_ratio
-                    else:
-                        new_width, new_height = img_width, img_height
-                    c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-                except Exception as e:
-                    print("Errore caricamento logo_valtservice:", e)
-
-                try:
-                    img = ImageReader(logo_zanussi_path)
-                    img_width, img_height = img.getSize()
-                    aspect_ratio = img_width / img_height
-                    max_width, max_height = 80, 50
-                    if img_width > max_width or img_height > max_height:
-                        if img_width > img_height:
-                            new_width2 = max_width
-                            new_height2 = new_width2 / aspect_ratio
-                        else:
-                            new_height2 = max_height
-                            new_width2 = new_height2 * aspect_ratio
-                    else:
-                        new_width2, new_height2 = img_width, img_height
-                    c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-                except Exception as e:
-                    print("Errore caricamento logo_zanussi:", e)
-
-                c.setLineWidth(1)
-                c.setStrokeColorRGB(0, 0, 0, alpha=1)
-                c.line(50, height - 105, width - 50, height - 105)
-
-                page_products = products[i:i + max_items_per_page]
-                y_position = height - 150
-                for product in page_products:
-                    nome, _, prezzo_unitario, quantita, descrizione = product
-
-                    try:
-                        prezzo_unitario = float(prezzo_unitario)
-                        quantita = float(quantita)
-                        tab_total_price += prezzo_unitario * quantita
-                    except ValueError:
-                        prezzo_unitario = 0
-                        quantita = 0
-
-                    c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
-                    c.rect(50, y_position - 20, width - 100, 20, fill=1, stroke=0)
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.setFont("Times-Bold", 12)
-                    c.drawString(60, y_position - 15, f"NOME PRODOTTO: {nome}")
-                    c.line(50, y_position - 20, width - 50, y_position - 20)
-                    c.line(50, y_position, width - 50, y_position)
-
-                    y_position -= 40
-                    c.setFont("Times-Bold", 12)
-                    c.drawString(50, y_position, "DESCRIZIONE:")
-                    description_paragraph = Paragraph(descrizione, custom_style)
-                    available_width = width - 100
-                    _, para_height = description_paragraph.wrap(available_width, y_position - 15)
-                    description_paragraph.drawOn(c, 50, y_position - 5 - para_height)
-                    y_position -= 35 + para_height
-
-                    c.setFont("Times-Bold", 12)
-                    c.drawString(50, y_position, f"PREZZO UNITARIO: {format_price(prezzo_unitario)} €")
-                    c.drawString(300, y_position, f"QUANTITA': {quantita:.0f}")
-                    y_position -= 40
-
-                c.setFont("Times-Bold", 14)
-                c.drawString(50, height - 630, f"PREZZO FORNITURA: {format_price(tab_total_price)} €")
-                
-                # Aggiorna il prezzo totale dell'offerta
-                total_offer_price += tab_total_price
-
-                c.setDash(3, 2)
-                c.line(50, height - 655, width - 50, height - 655)
-                c.line(50, height - 660, width - 50, height - 660)
-                c.setDash()
-                
-                # Footer
-                c.setFont("Times-Roman", 9)
-                diff = 740
-                c.drawString(50, height - diff, "Valtservice")
-                c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-                c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-                c.drawString(450, height - diff, "Filiale di Sondrio:")
-                c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-                c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-                c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-                c.drawString(450, height - diff - 40, "info@valtservice.com")
-                c.setFont("Times-Roman", 7)
-                c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
-
-                draw_page_number(c, None)
+    new_width = 0  # Default in caso non ci sia immagine
+    
+    if tab.get('product_image_path'):
+        try:
+            img_path = resolve_image_path(tab['product_image_path'], app_root)
+            img, new_width, new_height = get_print_image(img_path, *PRODUCT_IMAGE_BOX)
+            x_pos, y_pos = 50, height - 320
+            c.drawImage(img, x_pos, y_pos, width=new_width, height=new_height)
+        except Exception as e:
+            print(f"Could not load the product image: {e}")
+            new_width = 0
+
+    fix = 180
+    sp = 25
+    c.setFont("Times-Bold", 12)
+
+    text = [
+        f"NOME PRODOTTO: {product_name}",
+        f"CARATTERISTICHE TECNICHE",
+        f"TENSIONE:                                     {volts}",
+        f"POTENZA:                                      {power}",
+        f"DIMENSIONI [LxPxH]:                {size}",
+        f"PREZZO UNITARIO:                   {format_price(unit_price)} €",
+        f"QUANTITA':                                   {quantity}",
+        f"POS: {pos}"
+    ]
+
+    for i in range(len(text)):
+        if i == 0:
+            c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
+            c.setStrokeColorRGB(0, 0, 0, alpha=0)
+            c.rect(50, height - 150, width - 100, 20, fill=1, stroke=1)
+            c.setLineWidth(1)
+            c.setStrokeColorRGB(0, 0, 0, alpha=1)
+            c.line(50, height - 130, width - 50, height - 130)
+            c.line(50, height - 150, width - 50, height - 150)
+            c.setFillColorRGB(0, 0, 0, alpha=1)
+            c.drawString(60, height - 145, text[i])
+            c.setFont("Times-Roman", 12)
+            c.drawString(50, height - 125, text[7])
+        elif i == 1:  # This now handles the "CARATTERISTICHE TECNICHE" section
+            c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
+            c.setStrokeColorRGB(0, 0, 0, alpha=0)
+            c.rect(60 + new_width, height - (fix + 3), width - (new_width + 110), 20, fill=1, stroke=1)
 
-        else:
-            # Pagina per prodotto singolo
-            c.showPage()
+            c.setLineWidth(1)
+            c.setStrokeColorRGB(0, 0, 0, alpha=1)
+            c.line(60 + new_width, height - (fix - 17), width - 50, height - (fix - 17))
+            c.line(60 + new_width, height - (fix + 3), width - 50, height - (fix + 3))
 
-            try:
-                img = ImageReader(logo_valtservice_path)
-                img_width, img_height = img.getSize()
-                aspect_ratio = img_width / img_height
-                max_width, max_height = 200, 100
-                if img_width > max_width or img_height > max_height:
-                    if img_width > img_height:
-                        new_width = max_width
-                        new_height = new_width / aspect_ratio
-                    else:
-                        new_height = max_height
-                        new_width = new_height * aspect_ratio
-                else:
-                    new_width, new_height = img_width, img_height
-                c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-            except Exception as e:
-                print("Errore caricamento logo_valtservice:", e)
+            c.setFillColorRGB(0, 0, 0, alpha=1)
+            c.drawString(80 + new_width, height - (fix - 2), text[1])
 
-            try:
-                img = ImageReader(logo_zanussi_path)
-                img_width, img_height = img.getSize()
-                aspect_ratio = img_width / img_height
-                max_width, max_height = 80, 50
-                if img_width > max_width or img_height > max_height:
-                    if img_width > img_height:
-                        new_width2 = max_width
-                        new_height2 = new_width2 / aspect_ratio
-                    else:
-                        new_height2 = max_height
-                        new_width2 = new_height2 * aspect_ratio
-                else:
-                    new_width2, new_height2 = img_width, img_height
-                c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-            except Exception as e:
-                print("Errore caricamento logo_zanussi:", e)
-
-            product_code = tab.get('product_code', '')
-            product_name = tab.get('product_name', '')
-            description = tab.get('description', '')
-            power = tab.get('power_w', '')
-            volts = tab.get('volts', '')
-            size = tab.get('size', '')
-            pos = tab.get('posizione', '')
+            fix = fix + sp
 
-            try:
-                unit_price = float(tab.get('unit_price', 0))
-            except ValueError:
-                unit_price = 0
+        elif i not in (0, 1, 7):
+            c.setFont("Times-Roman", 12)
+            c.setLineWidth(0.5)
+            c.setStrokeColorRGB(0, 0, 0, alpha=0.6)
+            c.line(60 + new_width, height - (fix - 17), width - 50, height - (fix - 17))
+            c.line(60 + new_width, height - (fix + 3), width - 50, height - (fix + 3))
 
-            try:
-                quantity = float(tab.get('quantity', 0))
-            except ValueError:
-                quantity = 0
+            c.setFillColorRGB(0, 0, 0, alpha=1)
+            c.drawString(80 + new_width, height - (fix - 2), text[i])
 
-            prezzo_list = unit_price * quantity
+            fix = fix + sp
 
+    fix = 350
+    c.setFont("Times-Roman",12)
+    spazio = 10
+    c.setStrokeColorRGB(0, 0, 0, alpha=1)
+    product_description_text = f"{description}"
+    available_width = width - 100
+    para, para_height3 = wrap_paragraph(product_description_text, CUSTOM_STYLE, available_width)
+    draw_paragraph(c, para, 50, height - (fix + spazio + 15) - para_height3)
+    c.setFont("Times-Bold",12)
+    c.setFillColorRGB(0, 0, 0, alpha=1)
+    c.drawString(50, height - (fix+spazio), f"DESCRIZIONE PRODOTTO")
 
-            c.line(50, height - 105, width - 50, height - 105)
-        
-            c.setLineWidth(1)
-            c.setDash(6, 4)
-            c.line(50, height - 675, width - 50, height - 675)
-            c.line(50, height - 680, width - 50, height - 680)
-            c.setDash()
+    y_position = height - 590
+    c.setFont("Times-Bold", 14)
+    if tab.get('discount_flag'):
+        c.setFillColorRGB(0, 0, 0, alpha=1)
+        c.drawString(60, y_position, f"PREZZO DI LISTINO:")
+
+        c.drawString(250, y_position, f"€ {format_price(prezzo_list)} iva ESCLUSA")
+        y_position -= 20
+        c.drawString(60, y_position, f"SCONTO")
+        c.drawString(250, y_position, f"{tab.get('discount', '0')} %")
+        y_position -= 20
+        try:
+            discount = float(tab.get('discount', 0))
+        except ValueError:
+            discount = 0
+        c.drawString(60, y_position, f"PREZZO SCONTATO:")
+        c.drawString(250, y_position, f"€ {format_price(prezzo_list - (discount / 100) * prezzo_list)} iva ESCLUSA")
+    else:
+        y_position1 = y_position - 40
+        c.setFillColorRGB(0, 0, 0, alpha=1)
+        c.drawString(60, y_position1, f"PREZZO SCONTATO:")
+        c.drawString(250, y_position1, f"€ {format_price(prezzo_list)} iva ESCLUSA")    
 
-            new_width = 0  # Default in caso non ci sia immagine
-            
-            if tab.get('product_image_path'):
-                try:
-                    # Path completo in base all'origine del path
-                    if tab['product_image_path'].startswith('/static'):
-                        img_path = os.path.join(app_root, tab['product_image_path'].lstrip('/'))
-                    else:
-                        img_path = tab['product_image_path']
-                    
-                    img = ImageReader(img_path)
-                    img_width, img_height = img.getSize()
-                    aspect_ratio = img_width / img_height
-                    
-                    max_width, max_height = 200, 150
-                    if img_width > max_width or img_height > max_height:
-                        if img_width > img_height:
-                            new_width = max_width
-                            new_height = new_width / aspect_ratio
-                        else:
-                            new_height = max_height
-                            new_width = new_height * aspect_ratio
-                    else:
-                        new_width, new_height = img_width, img_height
-                    
-                    x_pos, y_pos = 50, height - 320  
-                    c.drawImage(img, x_pos, y_pos, width=new_width, height=new_height)
-                except Exception as e:
-                    print(f"Could not load the product image: {e}")
-                    new_width = 0
-
-            fix = 180
-            sp = 25
-            c.setFont("Times-Bold", 12)
+    # Footer
+    c.doForm(FOOTER_FORM)
 
-            text = [
-                f"NOME PRODOTTO: {product_name}",
-                f"CARATTERISTICHE TECNICHE",
-                f"TENSIONE:                                     {volts}",
-                f"POTENZA:                                      {power}",
-                f"DIMENSIONI [LxPxH]:                {size}",
-                f"PREZZO UNITARIO:                   {format_price(unit_price)} €",
-                f"QUANTITA':                                   {quantity}",
-                f"POS: {pos}"
-            ]
-
-            for i in range(len(text)):
-                if i == 0:
-                    c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=0)
-                    c.rect(50, height - 150, width - 100, 20, fill=1, stroke=1)
-                    c.setLineWidth(1)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=1)
-                    c.line(50, height - 130, width - 50, height - 130)
-                    c.line(50, height - 150, width - 50, height - 150)
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.drawString(60, height - 145, text[i])
-                    c.setFont("Times-Roman", 12)
-                    c.drawString(50, height - 125, text[7])
-                elif i == 1:  # This now handles the "CARATTERISTICHE TECNICHE" section
-                    c.setFillColorRGB(128 / 256, 128 / 256, 128 / 256, alpha=0.3)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=0)
-                    c.rect(60 + new_width, height - (fix + 3), width - (new_width + 110), 20, fill=1, stroke=1)
-
-                    c.setLineWidth(1)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=1)
-                    c.line(60 + new_width, height - (fix - 17), width - 50, height - (fix - 17))
-                    c.line(60 + new_width, height - (fix + 3), width - 50, height - (fix + 3))
-
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.drawString(80 + new_width, height - (fix - 2), text[1])
-
-                    fix = fix + sp
-
-                elif i not in (0, 1, 7):
-                    c.setFont("Times-Roman", 12)
-                    c.setLineWidth(0.5)
-                    c.setStrokeColorRGB(0, 0, 0, alpha=0.6)
-                    c.line(60 + new_width, height - (fix - 17), width - 50, height - (fix - 17))
-                    c.line(60 + new_width, height - (fix + 3), width - 50, height - (fix + 3))
-
-                    c.setFillColorRGB(0, 0, 0, alpha=1)
-                    c.drawString(80 + new_width, height - (fix - 2), text[i])
-
-                    fix = fix + sp
-
-            fix = 350
-            c.setFont("Times-Roman",12)
-            spazio = 10
-            c.setStrokeColorRGB(0, 0, 0, alpha=1)
-            product_description_text = f"{description}"
-            para = Paragraph(product_description_text, custom_style)
-            available_width = width - 100
-            available_height = height - (fix + spazio + 23)
-            _, para_height3 = para.wrap(available_width, available_height)
-            para.drawOn(c, 50, height - (fix + spazio + 15) - para_height3)
-            c.setFont("Times-Bold",12)
-            c.setFillColorRGB(0, 0, 0, alpha=1)
-            c.drawString(50, height - (fix+spazio), f"DESCRIZIONE PRODOTTO")
-
-            y_position = height - 590
-            c.setFont("Times-Bold", 14)
-            if tab.get('discount_flag'):
-                c.setFillColorRGB(0, 0, 0, alpha=1)
-                c.drawString(60, y_position, f"PREZZO DI LISTINO:")
-
-                c.drawString(250, y_position, f"€ {format_price(prezzo_list)} iva ESCLUSA")
-                y_position -= 20
-                c.drawString(60, y_position, f"SCONTO")
-                c.drawString(250, y_position, f"{tab.get('discount', '0')} %")
-                y_position -= 20
-                try:
-                    discount = float(tab.get('discount', 0))
-                except ValueError:
-                    discount = 0
-                c.drawString(60, y_position, f"PREZZO SCONTATO:")
-                c.drawString(250, y_position, f"€ {format_price(prezzo_list - (discount / 100) * prezzo_list)} iva ESCLUSA")
-                # Aggiorna il prezzo totale dell'offerta
-                total_offer_price += (prezzo_list - (discount / 100) * prezzo_list)
-            else:
-                y_position1 = y_position - 40
-                c.setFillColorRGB(0, 0, 0, alpha=1)
-                c.drawString(60, y_position1, f"PREZZO SCONTATO:")
-                c.drawString(250, y_position1, f"€ {format_price(prezzo_list)} iva ESCLUSA")    
-                # Aggiorna il prezzo totale dell'offerta
-                total_offer_price += prezzo_list
-    
-            # Footer
-            c.setFont("Times-Roman", 9)
-            diff = 740
-            c.drawString(50, height - diff, "Valtservice")
-            c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-            c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-            c.drawString(450, height - diff, "Filiale di Sondrio:")
-            c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-            c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-            c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-            c.drawString(450, height - diff - 40, "info@valtservice.com")
-            c.setFont("Times-Roman", 7)
-            c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
-
-            draw_page_number(c, None)
-    
-    # Aggiungi pagina finale (condizioni)
+    draw_page_number(c)
     c.showPage()
+
+def draw_conditions_page(c, total_offer_price):
+    """Disegna la pagina finale con le condizioni e il prezzo totale dell'offerta"""
+    width, height = A4
     c.setFont("Times-Roman", 16)
     
     # Intestazione
-    try:
-        img = ImageReader(logo_valtservice_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 200, 100
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width = max_width
-                new_height = new_width / aspect_ratio
-            else:
-                new_height = max_height
-                new_width = new_height * aspect_ratio
-        else:
-            new_width, new_height = img_width, img_height
-        c.drawImage(img, 50, height - new_height - 20, width=new_width, height=new_height)
-    except Exception as e:
-        print("Logo non caricato:", e)
-    
-    try:
-        img = ImageReader(logo_zanussi_path)
-        img_width, img_height = img.getSize()
-        aspect_ratio = img_width / img_height
-        max_width, max_height = 80, 50
-        if img_width > max_width or img_height > max_height:
-            if img_width > img_height:
-                new_width2 = max_width
-                new_height2 = new_width2 / aspect_ratio
-            else:
-                new_height2 = max_height
-                new_width2 = new_height2 * aspect_ratio
-        else:
-            new_width2, new_height2 = img_width, img_height
-        c.drawImage(img, 460, height - new_height2 - 20, width=new_width2, height=new_height2)
-    except Exception as e:
-        print("Logo Zanussi non caricato:", e)
-
-    c.line(50, height - 105, width - 50, height - 105)
+    c.doForm(HEADER_FORM)
 
     # Condizioni dell'offerta
     c.setFont("Times-Roman", 12)
@@ -1237,7 +500,7 @@ def generate_pdf_preview(offerta, app_root, output_path):
     c.drawString(250, y_position-10*sp, "I prezzi indicati in offerta sono da considerarsi al netto IVA")
     
     c.setFont("Times-Bold", 14)
-    c.drawString(50,height-620, f"PREZZO TOTALE OFFERTA : {format_price(round(total_offer_price/10)*10)} €")
+    c.drawString(50,height-620, f"PREZZO TOTALE OFFERTA : {format_price(total_offer_price)} €")
 
     # Linea tratteggiata finale
     c.setDash(3, 2)
@@ -1246,22 +509,135 @@ def generate_pdf_preview(offerta, app_root, output_path):
     c.setDash()
 
     # Footer
-    diff = 740
-    c.setFont("Times-Roman", 9)
-    c.drawString(50, height - diff, "Valtservice")
-    c.drawString(50, height - diff - 20, "Part. Iva:.00872020144")
-    c.drawString(50, height - diff - 30, "Iscrizione R.E.A.SO - 65776")
-    c.drawString(450, height - diff, "Filiale di Sondrio:")
-    c.drawString(450, height - diff - 10, "Via  Valeriana, 103/A")
-    c.drawString(450, height - diff - 20, "23019 TRAONA (SO)")
-    c.drawString(450, height - diff - 30, "Tel. (+39) 0342590138")
-    c.drawString(450, height - diff - 40, "info@valtservice.com")
-    c.setFont("Times-Roman", 7)
-    c.drawString(50, height - diff - 60, "I modelli e le specifiche tecniche dei prodotti indicati possono subire variazioni senza preavviso.")
+    c.doForm(FOOTER_FORM)
+
+    draw_page_number(c)
+
+def tab_page_count(tab):
+    """Pagine occupate da una scheda (calcolate senza impaginarla)"""
+    if tab.get('type') == 'multi_product':
+        products = tab.get('products', [])
+        max_items_per_page = tab.get('max_items_per_page', 3)
+        return -(-len(products) // max_items_per_page)
+    return 1
+
+def offer_page_layout(tabs):
+    """
+    Numerazione delle pagine dell'offerta: copertina, schede e condizioni
+
+    Returns:
+        tuple: (lista di (prima pagina, numero di pagine) per scheda, pagina delle condizioni)
+    """
+    tab_pages = []
+    next_page = 2   # pagina 1: copertina
+    for tab in tabs:
+        count = tab_page_count(tab)
+        tab_pages.append((next_page, count))
+        next_page += count
+    return tab_pages, next_page
+
+def render_offer(offerta, app_root, output, max_tabs=None, pages=None):
+    """
+    Motore di impaginazione unico dell'offerta
+
+    Args:
+        offerta (dict): Dati dell'offerta
+        app_root (str): Cartella dell'applicazione (per static/ e immagini)
+        output: Destinazione del PDF: percorso di file oppure oggetto file-like
+            aperto in scrittura binaria (es. io.BytesIO)
+        max_tabs (int): Numero massimo di schede da impaginare (None = tutte);
+            il prezzo totale resta quello dell'intera offerta
+        pages (set): Numeri delle pagine da impaginare (None = tutte); le schede
+            sono impaginate per intero se almeno una delle loro pagine è richiesta,
+            con la stessa numerazione del documento completo
+
+    Returns:
+        La destinazione ricevuta (output)
+    """
+    # Assicuriamoci che tabs esista
+    if 'tabs' not in offerta or not isinstance(offerta['tabs'], list):
+        offerta['tabs'] = []
+    
+    # Totale dell'offerta calcolato con le stesse regole usate al salvataggio
+    total_offer_price = Offerta(tabs=offerta['tabs']).get_totals()['total_offer_price']
+    
+    # Inizializza il canvas PDF
+    c = canvas.Canvas(output, pagesize=A4)
+    
+    # Intestazione (loghi) e piè di pagina, disegnati una sola volta per documento
+    define_page_templates(c, os.path.join(app_root, 'static'))
+    
+    tabs = offerta['tabs'] if max_tabs is None else offerta['tabs'][:max_tabs]
+    tab_pages, conditions_page = offer_page_layout(tabs)
+
+    if pages is None or 1 in pages:
+        draw_cover_page(c, offerta)
 
-    draw_page_number(c, None)
+    # Processa i tab
+    for tab, (first_page, count) in zip(tabs, tab_pages):
+        if pages is None or not pages.isdisjoint(range(first_page, first_page + count)):
+            # Le pagine saltate non vengono emesse: il numero stampato nel piè di
+            # pagina resta quello del documento completo
+            c._pageNumber = first_page
+            draw_tab_fragment(c, tab, app_root)
+    
+    # Aggiungi pagina finale (condizioni)
+    if pages is None or conditions_page in pages:
+        c._pageNumber = conditions_page
+        draw_conditions_page(c, total_offer_price)
 
     # Salva il PDF
     c.save()
     
-    return output_path
\ No newline at end of file
+    return output
+
+def render_offer_bytes(offerta, app_root, max_tabs=None, pages=None):
+    """
+    Impagina l'offerta interamente in memoria, senza scrivere su disco
+
+    Returns:
+        bytes: Contenuto del PDF
+    """
+    buffer = io.BytesIO()
+    render_offer(offerta, app_root, buffer, max_tabs=max_tabs, pages=pages)
+    return buffer.getvalue()
+
+def get_offer_pdf_path(offerta, app_root):
+    """Percorso del PDF di un'offerta: data/<CLIENTE>/<NUMERO>/offerta_<NUMERO>.pdf"""
+    offer_folder = os.path.join(app_root, 'data', offerta['customer'].upper(), offerta['offer_number'])
+    return os.path.join(offer_folder, f"offerta_{offerta['offer_number']}.pdf")
+
+def generate_pdf(offerta, app_root, force=False):
+    """
+    Genera il PDF con i dati delle schede nella cartella dell'offerta.
+
+    Se il PDF esistente è stato generato dagli stessi dati e dalle stesse
+    immagini (impronta salvata accanto al PDF) la generazione viene saltata.
+
+    Args:
+        offerta (dict): Dati dell'offerta
+        app_root (str): Cartella dell'applicazione
+        force (bool): Rigenera anche se il PDF è aggiornato
+
+    Returns:
+        str: Percorso del PDF
+    """
+    output_path = get_offer_pdf_path(offerta, app_root)
+    fingerprint = pdf_cache.render_fingerprint(offerta, offer_asset_paths(offerta, app_root))
+    if not force and pdf_cache.is_current(output_path, fingerprint):
+        return output_path
+    
+    # Crea le cartelle necessarie
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    # Scrive su un file temporaneo: chi scarica non vede mai un PDF a metà
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    render_offer(offerta, app_root, tmp_path)
+    os.replace(tmp_path, output_path)
+    pdf_cache.store_fingerprint(output_path, fingerprint)
+    
+    return output_path
+
+def generate_pdf_preview(offerta, app_root, output_path):
+    """Genera un PDF di anteprima con i dati delle schede senza creare cartelle cliente."""
+    return render_offer(offerta, app_root, output_path)
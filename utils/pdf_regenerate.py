@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from models.store import OfferStore, STORE_FILENAME
+from utils import pdf_cache
+from utils.pdf_generator import generate_pdf, get_offer_pdf_path, offer_asset_paths
+
+# File di avanzamento (nella cartella dati): prima riga le opzioni, poi un ID per riga
+PROGRESS_FILENAME = "_rigenerazione_pdf.txt"
+
+# Secondi tra due righe di avanzamento
+PROGRESS_INTERVAL = 2
+
+
+def _regenerate(offerta, app_root, force):
+    """
+    Rigenera il PDF di un'offerta (eseguita nei processi del pool)
+
+    Returns:
+        tuple: (ID offerta, errore o None)
+    """
+    try:
+        generate_pdf(offerta, app_root, force=force)
+        return offerta['id'], None
+    except Exception as e:
+        return offerta['id'], str(e) or e.__class__.__name__
+
+
+def _is_current(offerta, app_root):
+    """Indica se il PDF dell'offerta corrisponde già ai dati (come in generate_pdf)"""
+    fingerprint = pdf_cache.render_fingerprint(offerta, offer_asset_paths(offerta, app_root))
+    return pdf_cache.is_current(get_offer_pdf_path(offerta, app_root), fingerprint)
+
+
+def _load_progress(progress_path, options):
+    """ID già completati da un'esecuzione interrotta con le stesse opzioni"""
+    try:
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            if not header or json.loads(header) != options:
+                return set()
+            return {line.strip() for line in f if line.strip()}
+    except (OSError, ValueError):
+        return set()
+
+
+def regenerate_all(app_root, year=None, status=None, customer=None, force=False,
+                   workers=None, dry_run=False, restart=False):
+    """
+    Rigenera in parallelo i PDF delle offerte dell'archivio
+
+    Senza force vengono rigenerati solo i PDF non aggiornati (impronta diversa,
+    ad esempio dopo un cambio di LAYOUT_VERSION). L'avanzamento viene salvato
+    in PROGRESS_FILENAME: rilanciando con le stesse opzioni dopo un'interruzione
+    le offerte già completate vengono saltate.
+
+    Args:
+        app_root (str): Cartella dell'applicazione (con data/ e static/)
+        year, status, customer: Filtri sulle offerte (vedi OfferStore.offer_ids)
+        force (bool): Rigenera anche i PDF aggiornati
+        workers (int): Numero di processi (default: numero di CPU)
+        dry_run (bool): Mostra cosa verrebbe rigenerato senza scrivere nulla
+        restart (bool): Ignora l'avanzamento salvato e riparte da capo
+
+    Returns:
+        dict: Conteggi total, skipped, regenerated, failed
+    """
+    data_folder = os.path.join(app_root, 'data')
+    store = OfferStore(os.path.join(data_folder, STORE_FILENAME))
+    offer_ids = store.offer_ids(year=year, status=status, customer=customer)
+
+    options = {'year': year, 'status': status, 'customer': customer, 'force': force}
+    progress_path = os.path.join(data_folder, PROGRESS_FILENAME)
+    done = set() if restart else _load_progress(progress_path, options)
+
+    pending = []
+    for offer_id in offer_ids:
+        if offer_id in done:
+            continue
+        offerta = store.get_offer(offer_id)
+        if offerta is None or (not force and _is_current(offerta, app_root)):
+            continue
+        pending.append(offerta)
+
+    counts = {'total': len(offer_ids), 'skipped': len(offer_ids) - len(pending),
+              'regenerated': 0, 'failed': 0}
+    if done:
+        logging.info(f"Ripresa dall'esecuzione interrotta: {len(done)} offerte già completate")
+    logging.info(f"{len(offer_ids)} offerte selezionate, {len(pending)} PDF da rigenerare")
+
+    if dry_run:
+        for offerta in pending:
+            logging.info(f"  {offerta.get('offer_number')} - {offerta.get('customer')}")
+        return counts
+    if not pending:
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+        return counts
+
+    if not done:
+        with open(progress_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(options) + "\n")
+
+    started = last_report = time.monotonic()
+    with open(progress_path, 'a', encoding='utf-8') as progress, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_regenerate, offerta, app_root, force) for offerta in pending]
+        for completed, future in enumerate(as_completed(futures), 1):
+            offer_id, error = future.result()
+            if error:
+                counts['failed'] += 1
+                logging.info(f"Offerta {offer_id}: rigenerazione fallita: {error}")
+            else:
+                counts['regenerated'] += 1
+                progress.write(offer_id + "\n")
+                progress.flush()
+
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL or completed == len(pending):
+                last_report = now
+                rate = completed / max(now - started, 1e-6)
+                eta = (len(pending) - completed) / rate
+                logging.info(f"{completed}/{len(pending)} ({completed * 100 // len(pending)}%)"
+                             f" - {rate:.1f} PDF/s - {eta:.0f} s rimanenti")
+
+    # Esecuzione completata: il prossimo avvio riparte da capo
+    if not counts['failed']:
+        os.remove(progress_path)
+    elapsed = time.monotonic() - started
+    logging.info(f"Rigenerati {counts['regenerated']} PDF in {elapsed:.1f} s"
+                 f" ({counts['regenerated'] / max(elapsed, 1e-6):.1f} PDF/s),"
+                 f" {counts['failed']} errori, {counts['skipped']} saltati")
+    return counts
+
+
+if __name__ == '__main__':
+    # Rigenerazione massiva: python -m utils.pdf_regenerate [--year 2025] [--status accettata] ...
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Rigenera i PDF delle offerte in parallelo")
+    parser.add_argument('--year', help="Solo le offerte di questo anno")
+    parser.add_argument('--status', help="Solo le offerte con questo stato (in_attesa, accettata)")
+    parser.add_argument('--customer', help="Solo i clienti il cui nome contiene questo testo")
+    parser.add_argument('--workers', type=int, help="Numero di processi (default: numero di CPU)")
+    parser.add_argument('--force', action='store_true',
+                        help="Rigenera anche i PDF già aggiornati (es. dopo un cambio di intestazione)")
+    parser.add_argument('--dry-run', action='store_true', help="Elenca i PDF da rigenerare senza scriverli")
+    parser.add_argument('--restart', action='store_true', help="Ignora l'avanzamento di un'esecuzione interrotta")
+    args = parser.parse_args()
+
+    counts = regenerate_all(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        year=args.year, status=args.status, customer=args.customer, force=args.force,
+        workers=args.workers, dry_run=args.dry_run, restart=args.restart,
+    )
+    raise SystemExit(1 if counts['failed'] else 0)
@@ -0,0 +1,185 @@
+import json
+import time
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+# Numero massimo di anteprime in memoria; i limiti in byte li imposta set_limits
+MAX_PREVIEWS = 64
+
+_lock = threading.Lock()
+_previews = OrderedDict()   # token -> {session, page, fingerprint, data, total, used}, dalla meno recente
+_sizes = {'bytes': 0}
+_limits = {'bytes': 64 * 1024 * 1024, 'session_bytes': 16 * 1024 * 1024}
+_stats = {'hits': 0, 'misses': 0, 'evicted': 0, 'unchanged': 0}
+
+
+def _discard(token):
+    """Rimuove un'anteprima e restituisce i byte liberati (da chiamare con _lock acquisito)"""
+    size = len(_previews.pop(token)['data'])
+    _sizes['bytes'] -= size
+    return size
+
+
+def _enforce_limits(keep=None):
+    """
+    Scarta le anteprime meno recenti finché numero, spazio totale e spazio per
+    sessione rientrano nei limiti (da chiamare con _lock acquisito)
+
+    Args:
+        keep (str): Token da non scartare (l'anteprima appena salvata)
+
+    Returns:
+        tuple: (anteprime scartate, byte liberati)
+    """
+    session_bytes = {}
+    for entry in _previews.values():
+        session_bytes[entry['session']] = session_bytes.get(entry['session'], 0) + len(entry['data'])
+
+    removed = reclaimed = 0
+    for token, entry in list(_previews.items()):
+        over_total = len(_previews) > MAX_PREVIEWS or _sizes['bytes'] > _limits['bytes']
+        over_session = session_bytes[entry['session']] > _limits['session_bytes']
+        if token == keep or not (over_total or over_session):
+            continue
+        size = _discard(token)
+        session_bytes[entry['session']] -= size
+        removed += 1
+        reclaimed += size
+    _stats['evicted'] += removed
+    return removed, reclaimed
+
+
+def _touch(token):
+    """Segna l'anteprima come appena usata (da chiamare con _lock acquisito)"""
+    _previews[token]['used'] = time.monotonic()
+    _previews.move_to_end(token)
+
+
+def set_limits(max_bytes, session_max_bytes):
+    """Imposta lo spazio massimo delle anteprime in memoria, totale e per sessione"""
+    with _lock:
+        _limits['bytes'] = max_bytes
+        _limits['session_bytes'] = session_max_bytes
+        _enforce_limits()
+
+
+def form_fingerprint(form, files):
+    """
+    Impronta del modulo dell'anteprima: campi normalizzati e hash dei file caricati
+
+    Args:
+        form (MultiDict): Campi del modulo (request.form)
+        files (MultiDict): File caricati (request.files); gli stream vengono
+            riportati all'inizio dopo la lettura
+
+    Returns:
+        str: Hash SHA-256 esadecimale
+    """
+    fields = sorted((key, value.strip()) for key, value in form.items(multi=True))
+    uploads = []
+    for key, storage in files.items(multi=True):
+        sha = hashlib.sha256(storage.stream.read())
+        storage.stream.seek(0)
+        uploads.append((key, storage.filename, sha.hexdigest()))
+    canonical = json.dumps([fields, sorted(uploads)], separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _owned_by(entry, session_id, page_id):
+    return entry['session'] == session_id and entry['page'] == page_id
+
+
+def find_preview(session_id, page_id, fingerprint):
+    """Token dell'anteprima della pagina generata dallo stesso modulo, o None"""
+    with _lock:
+        for token, entry in _previews.items():
+            if _owned_by(entry, session_id, page_id) and entry['fingerprint'] == fingerprint:
+                _touch(token)
+                _stats['unchanged'] += 1
+                return token
+    return None
+
+
+def last_total(session_id, page_id):
+    """Prezzo totale dell'ultima anteprima della pagina (None se non ce ne sono)"""
+    with _lock:
+        for entry in reversed(_previews.values()):
+            if _owned_by(entry, session_id, page_id):
+                return entry['total']
+    return None
+
+
+def store_preview(session_id, page_id, data, fingerprint=None, total=None):
+    """
+    Salva in memoria il PDF di anteprima di una pagina del modulo
+
+    Le anteprime precedenti della stessa pagina vengono scartate: l'iframe
+    mostra sempre solo l'ultima. Le altre pagine aperte nella stessa sessione
+    (altre schede del browser) mantengono le loro.
+
+    Args:
+        session_id (str): Identificativo della sessione proprietaria
+        page_id (str): Identificativo della pagina del modulo (generato dal browser)
+        data (bytes): Contenuto del PDF
+        fingerprint (str): Impronta del modulo (vedi form_fingerprint)
+        total (float): Prezzo totale dell'offerta nell'anteprima
+
+    Returns:
+        str: Token opaco con cui recuperare l'anteprima
+    """
+    token = secrets.token_urlsafe(16)
+    with _lock:
+        for old in [t for t, entry in _previews.items() if _owned_by(entry, session_id, page_id)]:
+            _discard(old)
+        _previews[token] = {'session': session_id, 'page': page_id, 'fingerprint': fingerprint, 'data': data,
+                            'total': total, 'used': time.monotonic()}
+        _sizes['bytes'] += len(data)
+        _enforce_limits(keep=token)
+    return token
+
+
+def load_preview(token, session_id):
+    """Contenuto dell'anteprima se esiste ed è della sessione indicata, altrimenti None"""
+    with _lock:
+        entry = _previews.get(token)
+        found = entry is not None and entry['session'] == session_id
+        _stats['hits' if found else 'misses'] += 1
+        if not found:
+            return None
+        _touch(token)
+        return entry['data']
+
+
+def discard_previews(session_id, page_id=None):
+    """Scarta le anteprime di una pagina (alla sua chiusura) o di tutta la sessione (logout)"""
+    with _lock:
+        for token in [t for t, entry in _previews.items()
+                      if entry['session'] == session_id and page_id in (None, entry['page'])]:
+            _discard(token)
+
+
+def sweep(max_age):
+    """
+    Scarta le anteprime inutilizzate da più di max_age secondi, poi le meno
+    recenti oltre i limiti di set_limits
+
+    Returns:
+        tuple: (anteprime scartate, byte liberati)
+    """
+    removed = reclaimed = 0
+    with _lock:
+        expired_before = time.monotonic() - max_age
+        for token in [t for t, entry in _previews.items() if entry['used'] < expired_before]:
+            reclaimed += _discard(token)
+            removed += 1
+        _stats['evicted'] += removed
+        over_removed, over_reclaimed = _enforce_limits()
+    return removed + over_removed, reclaimed + over_reclaimed
+
+
+def stats():
+    """Numero e dimensione delle anteprime in memoria, riscontri, scarti e moduli invariati"""
+    with _lock:
+        return dict(_stats, count=len(_previews), bytes=_sizes['bytes'])
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+from reportlab.platypus import Paragraph
+from reportlab.lib.styles import ParagraphStyle
+
+# Numero massimo di paragrafi impaginati tenuti in memoria
+MAX_LAYOUTS = 1024
+
+_lock = threading.Lock()
+_layouts = OrderedDict()   # (testo, stile, larghezza) -> (Paragraph già spezzato in righe, altezza)
+_sized_styles = {}         # (nome stile, dimensione) -> ParagraphStyle
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _style_key(style):
+    return (style.name, style.fontName, style.fontSize, style.leading)
+
+
+def wrap_paragraph(text, style, width):
+    """
+    Restituisce il paragrafo spezzato in righe per la larghezza indicata e la sua altezza
+
+    Il risultato è condiviso tra i documenti (anteprime e PDF definitivo dello
+    stesso testo): va disegnato con una copia, vedi draw_paragraph.
+
+    Args:
+        text (str): Testo del paragrafo (markup reportlab)
+        style (ParagraphStyle): Stile del paragrafo
+        width (float): Larghezza disponibile
+
+    Returns:
+        tuple: (Paragraph, altezza)
+    """
+    key = (text, _style_key(style), width)
+    with _lock:
+        layout = _layouts.get(key)
+        if layout is not None:
+            _layouts.move_to_end(key)
+            _stats['hits'] += 1
+            return layout
+        _stats['misses'] += 1
+
+    para = Paragraph(text, style)
+    # L'altezza disponibile non cambia la divisione in righe
+    _, height = para.wrap(width, 0)
+    layout = (para, height)
+    with _lock:
+        _layouts[key] = layout
+        while len(_layouts) > MAX_LAYOUTS:
+            _layouts.popitem(last=False)
+    return layout
+
+
+def sized_style(style, font_size):
+    """Variante dello stile con un'altra dimensione del carattere (creata una volta)"""
+    if style.fontSize == font_size:
+        return style
+    key = (style.name, font_size)
+    with _lock:
+        sized = _sized_styles.get(key)
+        if sized is None:
+            sized = _sized_styles[key] = ParagraphStyle(
+                name=f"{style.name}{font_size}", parent=style, fontSize=font_size)
+    return sized
+
+
+def fit_paragraph(text, style, width, max_height, font_sizes):
+    """
+    Sceglie la prima dimensione del carattere con cui il paragrafo resta sotto max_height
+
+    Le misure passano dalla cache, quindi la stessa descrizione in anteprime
+    successive non viene più impaginata.
+
+    Args:
+        font_sizes (iterable): Dimensioni da provare, dalla preferita; se nessuna
+            rientra si usa l'ultima
+
+    Returns:
+        tuple: (Paragraph, altezza)
+    """
+    for font_size in font_sizes:
+        para, height = wrap_paragraph(text, sized_style(style, font_size), width)
+        if height < max_height:
+            break
+    return para, height
+
+
+def stats():
+    """Riscontri e mancati della cache di impaginazione dei paragrafi"""
+    with _lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 3) if total else None,
+        'size': len(_layouts),
+    }
@@ -0,0 +1,77 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+
+# Cartella (in data/) con le immagini caricate dalle anteprime, una sottocartella per sessione
+STAGING_FOLDER = "_staging"
+
+
+def upload_digest(storage):
+    """Hash SHA-256 del contenuto di un file caricato (lo stream torna all'inizio)"""
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: storage.stream.read(64 * 1024), b''):
+        sha.update(chunk)
+    storage.stream.seek(0)
+    return sha.hexdigest()
+
+
+def staged_path(staging_root, session_id, digest, filename):
+    """Percorso dell'immagine in staging: <sessione>/<hash>.<estensione>"""
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(staging_root, session_id, digest + ext)
+
+
+def stage_upload(storage, staging_root, session_id):
+    """
+    Salva un'immagine dell'anteprima nell'area temporanea, indirizzata per contenuto
+
+    La stessa immagine inviata a ogni aggiornamento dell'anteprima viene
+    scritta una sola volta; i file inutilizzati vengono rimossi da PreviewSweeper.
+
+    Args:
+        storage (FileStorage): File caricato
+        staging_root (str): Cartella di staging
+        session_id (str): Sessione dell'anteprima
+
+    Returns:
+        str: Percorso assoluto dell'immagine in staging
+    """
+    path = staged_path(staging_root, session_id, upload_digest(storage), storage.filename)
+    if os.path.exists(path):
+        # Ancora in uso: la scadenza riparte da ora. Si aggiorna solo l'ultimo
+        # accesso: la data di modifica identifica le varianti già preparate
+        st = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    storage.save(tmp_path)
+    os.replace(tmp_path, path)
+    logging.info(f"Immagine dell'anteprima in staging: {path}")
+    return path
+
+
+def save_upload(storage, dest_path, staging_root, session_id=None):
+    """
+    Salva definitivamente un'immagine caricata con l'offerta
+
+    Se la stessa immagine è già in staging per la sessione (anteprima) il file
+    viene spostato invece di essere riscritto.
+
+    Returns:
+        bool: True se l'immagine è stata promossa dallo staging
+    """
+    if session_id:
+        path = staged_path(staging_root, session_id, upload_digest(storage), storage.filename)
+        try:
+            os.replace(path, dest_path)
+            logging.info(f"Immagine promossa dallo staging: {dest_path}")
+            return True
+        except OSError:
+            # Non in staging (o su un altro disco): si salva il file ricevuto
+            pass
+    storage.save(dest_path)
+    return False
@@ -1,7 +1,7 @@
 import os
 import logging
 import logging.config
-from app import app as application
+from app import app as application, start_background_workers
 from waitress import serve
 
 # Definisci una funzione per configurare il logging
@@ -55,8 +55,12 @@ if __name__ == '__main__':
         logging.info(f"Avvio server in modalità produzione sulla porta {port}")
         threads = 4  # Limitato per NAS con risorse limitate
         logging.info(f"Server configurato con {threads} threads")
+        start_background_workers()
         serve(application, host='0.0.0.0', port=port, threads=threads)
     else:
         # Usa il server di sviluppo Flask
         logging.info(f"Avvio server in modalità sviluppo sulla porta {port}")
+        # Con il reloader di Flask le richieste le serve solo il processo figlio
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_workers()
         application.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file